@@ -0,0 +1,79 @@
+"""
+Replays a GET of a URL, and reports the modulestore calls made to respond to it.
+"""
+import json
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import Resolver404, resolve
+from django.test.client import RequestFactory
+
+from request_cache.middleware import RequestCache
+from xmodule.modulestore.profiler import profile_modulestore
+
+
+class Command(BaseCommand):
+    """
+    Calls the view of a URL with a GET request (without running the middleware), and prints
+    the number and duration of the modulestore calls it made, and any repeated or fanned out
+    (N+1) reads among them.
+
+    Example usage:
+        $ ./manage.py lms profile_modulestore /courses/course-v1:edX+DemoX+Demo_Course/courseware/ \\
+              --username staff --settings=devstack
+    """
+    args = '<url>'
+    help = 'Reports the modulestore calls made to respond to a GET of a URL.'
+
+    def add_arguments(self, parser):
+        """
+        Entry point for subclassed commands to add custom arguments.
+        """
+        parser.add_argument(
+            '--username',
+            help='The user making the request (anonymous by default).',
+        )
+        parser.add_argument(
+            '--json',
+            help='Print the full report, with each call, as json.',
+            action='store_true',
+            default=False,
+        )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('A URL must be specified.')
+
+        request = RequestFactory().get(args[0])
+        try:
+            match = resolve(request.path)
+        except Resolver404:
+            raise CommandError(u'No view found for {}.'.format(request.path))
+
+        if options.get('username'):
+            try:
+                request.user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(u'No user named {}.'.format(options['username']))
+        else:
+            request.user = AnonymousUser()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+
+        request_cache = RequestCache()
+        request_cache.process_request(request)
+        try:
+            with profile_modulestore() as profiler:
+                response = match.func(request, *match.args, **match.kwargs)
+                if not getattr(response, 'is_rendered', True):
+                    response.render()
+        finally:
+            request_cache.clear_request_cache()
+
+        self.stdout.write(u'{} {}'.format(response.status_code, request.get_full_path()))
+        if options.get('json'):
+            self.stdout.write(json.dumps(profiler.report(), indent=2, sort_keys=True))
+        else:
+            for line in profiler.summary_lines():
+                self.stdout.write(line)
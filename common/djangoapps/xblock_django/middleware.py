@@ -0,0 +1,38 @@
+"""
+Middleware for debugging the modulestore usage of requests.
+"""
+import logging
+
+from xmodule.modulestore.profiler import ModuleStoreProfiler
+
+log = logging.getLogger(__name__)
+
+
+class ModuleStoreProfilerMiddleware(object):
+    """
+    Profiles the modulestore calls made by each request, and logs the number of calls and
+    their duration, and any repeated or fanned out (N+1) reads among them. The full report
+    is available to later middleware as ``request.modulestore_profiler.report()``.
+
+    This is meant for debugging, as recording each call slows requests down. To use it, add
+    it to MIDDLEWARE_CLASSES, right after 'request_cache.middleware.RequestCache'.
+    """
+    def process_request(self, request):
+        """
+        Start profiling the request.
+        """
+        request.modulestore_profiler = ModuleStoreProfiler().start()
+
+    def process_response(self, request, response):
+        """
+        Stop profiling the request and log the summary of its modulestore calls.
+        """
+        profiler = getattr(request, 'modulestore_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            summary = profiler.summary_lines()
+            if profiler.repeated_reads() or profiler.fanned_out_reads():
+                log.warning(u'Modulestore calls for %s:\n%s', request.path, u'\n'.join(summary))
+            else:
+                log.info(u'Modulestore calls for %s:\n%s', request.path, u'\n'.join(summary))
+        return response
@@ -0,0 +1,46 @@
+"""
+Tests for the ModuleStoreProfilerMiddleware.
+"""
+from django.http import HttpResponse
+from django.test import TestCase
+from django.test.client import RequestFactory
+from mock import patch
+
+from xblock_django.middleware import ModuleStoreProfilerMiddleware
+from xmodule.modulestore.profiler import MONGO, get_profiler, profiled
+
+
+class ModuleStoreProfilerMiddlewareTestCase(TestCase):
+    """
+    Tests for the ModuleStoreProfilerMiddleware.
+    """
+    def setUp(self):
+        super(ModuleStoreProfilerMiddlewareTestCase, self).setUp()
+        self.middleware = ModuleStoreProfilerMiddleware()
+        self.request = RequestFactory().get('/courses')
+
+    def _process(self, keys):
+        """
+        Process the request, making a read for each of ``keys``.
+        """
+        self.middleware.process_request(self.request)
+        self.assertIs(get_profiler(), self.request.modulestore_profiler)
+        for key in keys:
+            with profiled(MONGO, 'find_one', key):
+                pass
+        response = HttpResponse()
+        self.assertIs(self.middleware.process_response(self.request, response), response)
+        self.assertIsNone(get_profiler())
+
+    @patch('xblock_django.middleware.log')
+    def test_log_calls(self, mock_log):
+        self._process(['a', 'b'])
+        self.assertEqual(len(self.request.modulestore_profiler.calls), 2)
+        self.assertTrue(mock_log.info.called)
+        self.assertFalse(mock_log.warning.called)
+
+    @patch('xblock_django.middleware.log')
+    def test_log_repeated_reads(self, mock_log):
+        self._process(['a', 'a'])
+        self.assertTrue(mock_log.warning.called)
+        self.assertIn(u'repeated read: 2 x mongo.find_one(a)', mock_log.warning.call_args[0][2])
@@ -4,9 +4,11 @@ Parser and evaluator for FormulaResponse and NumericalResponse
 Uses pyparsing to parse. Main function as of now is evaluator().
 """
 
+from collections import OrderedDict
 import math
 import operator
 import numbers
+from threading import Lock
 import numpy
 import scipy.constants
 import functions
@@ -93,7 +95,16 @@ def lower_dict(input_dict):
 
 # The following few functions define evaluation actions, which are run on lists
 # of results from each parse component. They convert the strings and (previously
-# calculated) numbers into the number that component represents.
+# calculated) numbers into the number that component represents. When the
+# variables are given as arrays of samples (see `evaluator_vectorized`), the
+# calculated values are numpy arrays and the actions work elementwise.
+
+def is_value(token):
+    """
+    Return whether `token` is a calculated value (rather than an operator).
+    """
+    return isinstance(token, (numbers.Number, numpy.ndarray))
+
 
 def super_float(text):
     """
@@ -122,7 +133,7 @@ def eval_atom(parse_result):
     In the case of parenthesis, ignore them.
     """
     # Find first number in the list
-    result = next(k for k in parse_result if isinstance(k, numbers.Number))
+    result = next(k for k in parse_result if is_value(k))
     return result
 
 
@@ -136,7 +147,7 @@ def eval_power(parse_result):
     # `reduce` will go from left to right; reverse the list.
     parse_result = reversed(
         [k for k in parse_result
-         if isinstance(k, numbers.Number)]  # Ignore the '^' marks.
+         if is_value(k)]  # Ignore the '^' marks.
     )
     # Having reversed it, raise `b` to the power of `a`.
     power = reduce(lambda a, b: b ** a, parse_result)
@@ -151,14 +162,20 @@ def eval_parallel(parse_result):
       out = 1 / (1/in1 + 1/in2 + ...)
     e.g. [ 1, 2 ] -> 2/3
 
-    Return NaN if there is a zero among the inputs.
+    Return NaN if there is a zero among the inputs (for arrays of samples,
+    NaN in the samples with a zero input).
     """
     if len(parse_result) == 1:
         return parse_result[0]
-    if 0 in parse_result:
+    values = [e for e in parse_result if is_value(e)]
+    if any(isinstance(e, numpy.ndarray) for e in values):
+        has_zero = reduce(numpy.logical_or, [numpy.equal(e, 0) for e in values])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            result = 1. / sum(1. / e for e in values)
+        return numpy.where(has_zero, float('nan'), result)
+    if 0 in values:
         return float('nan')
-    reciprocals = [1. / e for e in parse_result
-                   if isinstance(e, numbers.Number)]
+    reciprocals = [1. / e for e in values]
     return 1. / sum(reciprocals)
 
 
@@ -173,12 +190,12 @@ def eval_sum(parse_result):
     total = 0.0
     current_op = operator.add
     for token in parse_result:
-        if token == '+':
+        if is_value(token):
+            total = current_op(total, token)
+        elif token == '+':
             current_op = operator.add
         elif token == '-':
             current_op = operator.sub
-        else:
-            total = current_op(total, token)
     return total
 
 
@@ -191,12 +208,12 @@ def eval_product(parse_result):
     prod = 1.0
     current_op = operator.mul
     for token in parse_result:
-        if token == '*':
+        if is_value(token):
+            prod = current_op(prod, token)
+        elif token == '*':
             current_op = operator.mul
         elif token == '/':
             current_op = operator.truediv
-        else:
-            prod = current_op(prod, token)
     return prod
 
 
@@ -258,6 +275,33 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     return math_interpreter.reduce_tree(evaluate_actions)
 
 
+def evaluator_vectorized(variables, functions, math_expr, num_samples, case_sensitive=False):
+    """
+    Evaluate an expression for many samples of its variables in one pass.
+
+    -Variables are passed as a dictionary from string to a sequence of
+     `num_samples` values, one for each sample.
+    -Unary functions are passed as a dictionary from string to function. They
+     are called with numpy arrays, so should work elementwise.
+    Return a numpy array of `num_samples` results.
+
+    A sample that would make `evaluator` raise (e.g. a division by zero or an
+    overflow) makes this raise instead of producing a different value, and so
+    does a function that only accepts single numbers (e.g. `factorial`). In
+    those cases evaluate the samples one at a time with `evaluator`.
+    """
+    arrays = {name: numpy.asarray(values) for name, values in variables.iteritems()}
+    with numpy.errstate(divide='raise', over='raise', invalid='raise'):
+        result = numpy.asarray(evaluator(arrays, functions, math_expr, case_sensitive))
+
+    if result.ndim == 0:
+        # The expression doesn't depend on the samples.
+        return numpy.full(num_samples, result, dtype=result.dtype)
+    if result.shape != (num_samples,):
+        raise ValueError(u"Expected {} results, got shape {}".format(num_samples, result.shape))
+    return result
+
+
 class ParseAugmenter(object):
     """
     Holds the data for a particular parse.
@@ -278,35 +322,28 @@ class ParseAugmenter(object):
         self.variables_used = set()
         self.functions_used = set()
 
-        def vpa(tokens):
-            """
-            When a variable is recognized, store it in `variables_used`.
-            """
-            varname = tokens[0][0]
-            self.variables_used.add(varname)
-
-        def fpa(tokens):
-            """
-            When a function is recognized, store it in `functions_used`.
-            """
-            varname = tokens[0][0]
-            self.functions_used.add(varname)
+    # The grammar is the same for every expression, so it is built once and
+    # shared. Parse trees are never modified after parsing, so they are
+    # cached (along with the names they use) by expression.
+    # Maximum number of distinct expressions whose parse trees are kept.
+    PARSE_CACHE_SIZE = 1000
 
-        self.variable_parse_action = vpa
-        self.function_parse_action = fpa
+    _grammar = None
+    _parse_cache = OrderedDict()
+    _parse_cache_lock = Lock()
 
-    def parse_algebra(self):
+    @classmethod
+    def get_grammar(cls):
         """
-        Parse an algebraic expression into a tree.
-
-        Store a `pyparsing.ParseResult` in `self.tree` with proper groupings to
-        reflect parenthesis and order of operations. Leave all operators in the
-        tree and do not parse any strings of numbers into their float versions.
+        Return the pyparsing grammar for algebraic expressions.
 
-        Adding the groups and result names makes the `repr()` of the result
-        really gross. For debugging, use something like
-          print OBJ.tree.asXML()
+        The tree it produces has proper groupings to reflect parenthesis and
+        order of operations. It leaves all operators in the tree and does not
+        parse any strings of numbers into their float versions.
         """
+        if cls._grammar is not None:
+            return cls._grammar
+
         # 0.33 or 7 or .34 or 16.
         number_part = Word(nums)
         inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
@@ -333,11 +370,9 @@ class ParseAugmenter(object):
         # and may contain numbers afterward.
         inner_varname = Word(alphas + "_", alphanums + "_")
         varname = Group(inner_varname)("variable")
-        varname.setParseAction(self.variable_parse_action)
 
         # Same thing for functions.
         function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
-        function.setParseAction(self.function_parse_action)
 
         atom = number | function | varname | "(" + expr + ")"
         atom = Group(atom)("atom")
@@ -357,7 +392,55 @@ class ParseAugmenter(object):
 
         # Finish the recursion.
         expr << sum_term  # pylint: disable=pointless-statement
-        self.tree = (expr + stringEnd).parseString(self.math_expr)[0]
+        cls._grammar = expr + stringEnd
+        return cls._grammar
+
+    def parse_algebra(self):
+        """
+        Parse an algebraic expression into a tree.
+
+        Store a `pyparsing.ParseResult` in `self.tree` with proper groupings to
+        reflect parenthesis and order of operations (see `get_grammar`), and
+        the names of the variables and functions it uses in `variables_used`
+        and `functions_used`.
+
+        Adding the groups and result names makes the `repr()` of the result
+        really gross. For debugging, use something like
+          print OBJ.tree.asXML()
+        """
+        with self._parse_cache_lock:
+            parsed = self._parse_cache.pop(self.math_expr, None)
+
+        if parsed is None:
+            tree = self.get_grammar().parseString(self.math_expr)[0]
+            variables_used, functions_used = set(), set()
+            self._find_names(tree, variables_used, functions_used)
+            parsed = (tree, frozenset(variables_used), frozenset(functions_used))
+
+        with self._parse_cache_lock:
+            self._parse_cache[self.math_expr] = parsed
+            while len(self._parse_cache) > self.PARSE_CACHE_SIZE:
+                self._parse_cache.popitem(last=False)
+
+        self.tree = parsed[0]
+        self.variables_used = set(parsed[1])
+        self.functions_used = set(parsed[2])
+
+    @classmethod
+    def _find_names(cls, node, variables_used, functions_used):
+        """
+        Add the names of the variables and functions used in the tree under
+        `node` to the given sets.
+        """
+        if not isinstance(node, ParseResults):
+            return
+        node_name = node.getName()
+        if node_name == 'variable':
+            variables_used.add(node[0])
+        elif node_name == 'function':
+            functions_used.add(node[0])
+        for child in node:
+            cls._find_names(child, variables_used, functions_used)
 
     def reduce_tree(self, handle_actions, terminal_converter=None):
         """
@@ -559,3 +559,68 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({'r1': 5}, {}, "r1+r2")
         with self.assertRaisesRegexp(calc.UndefinedVariable, 'r1 r3'):
             calc.evaluator(variables, {}, "r1*r3", case_sensitive=True)
+
+    def test_repeated_evaluation(self):
+        """
+        Check that an expression evaluates with new variable bindings each
+        time, even though its parse tree is reused
+        """
+        for value in range(5):
+            self.assertEqual(calc.evaluator({'x': value}, {'f': lambda y: y * y}, "2*x+f(x)"), 2 * value + value ** 2)
+
+    def test_vectorized_evaluation(self):
+        """
+        Check that evaluating samples in one pass matches evaluating them
+        one at a time
+        """
+        samples = {'x': [-3.0, 0.5, 2.0, 7.0], 'y': [1.0, 0.0, 2.0, 3.0]}
+        for expr in ["x+2*y", "-x-y/2", "sin(x)*sec(y)^2", "x^y", "2k||x", "x||y", "x*i"]:
+            results = calc.evaluator_vectorized(samples, {}, expr, 4)
+            for index, result in enumerate(results):
+                variables = {'x': samples['x'][index], 'y': samples['y'][index]}
+                expected = calc.evaluator(variables, {}, expr)
+                if numpy.isnan(expected):
+                    self.assertTrue(numpy.isnan(result))
+                else:
+                    self.assertAlmostEqual(result, expected)
+
+        # Constant expressions give a result for each sample.
+        self.assertEqual(list(calc.evaluator_vectorized(samples, {}, "3", 4)), [3.0] * 4)
+
+    def test_vectorized_evaluation_errors(self):
+        """
+        Samples that would raise when evaluated alone, and functions that
+        take only single numbers, make the vectorized evaluation raise
+        """
+        samples = {'x': [1.0, 2.0], 'y': [2.0, 2.0]}
+        with self.assertRaises(FloatingPointError):
+            calc.evaluator_vectorized(samples, {}, "1/(x-y)", 2)
+        with self.assertRaises(TypeError):
+            calc.evaluator_vectorized(samples, {}, "fact(x)", 2)
+        with self.assertRaises(calc.UndefinedVariable):
+            calc.evaluator_vectorized(samples, {}, "x+z", 2)
+
+
+class ParseAugmenterTest(unittest.TestCase):
+    """
+    Run tests for the reuse of the grammar and parse trees by ParseAugmenter
+    """
+    def test_parse_tree_reused(self):
+        first = calc.ParseAugmenter("x^2 + sin(y)")
+        first.parse_algebra()
+        second = calc.ParseAugmenter("x^2 + sin(y)", case_sensitive=True)
+        second.parse_algebra()
+
+        self.assertIs(first.tree, second.tree)
+        self.assertEqual(second.variables_used, {'x', 'y'})
+        self.assertEqual(second.functions_used, {'sin'})
+
+    def test_parse_cache_bounded(self):
+        original_size = calc.ParseAugmenter.PARSE_CACHE_SIZE
+        calc.ParseAugmenter.PARSE_CACHE_SIZE = 2
+        try:
+            for expression in ("1+a", "1+b", "1+c"):
+                calc.ParseAugmenter(expression).parse_algebra()
+            self.assertEqual(list(calc.ParseAugmenter._parse_cache), ["1+b", "1+c"])  # pylint: disable=protected-access
+        finally:
+            calc.ParseAugmenter.PARSE_CACHE_SIZE = original_size
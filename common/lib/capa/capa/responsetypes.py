@@ -37,13 +37,13 @@ from shapely.geometry import Point, MultiPoint
 import dogstats_wrapper as dog_stats_api
 
 # specific library imports
-from calc import evaluator, UndefinedVariable
+from calc import evaluator, evaluator_vectorized, UndefinedVariable
 from . import correctmap
 from .registry import TagRegistry
 from datetime import datetime
 from pytz import UTC
 from .util import (
-    compare_with_tolerance, contextualize_text, convert_files_to_filenames,
+    compare_with_tolerance, compare_samples_with_tolerance, contextualize_text, convert_files_to_filenames,
     is_list_of_files, find_with_default, default_tolerance, get_inner_html_from_xpath
 )
 from lxml import etree
@@ -3251,6 +3251,30 @@ class FormulaResponse(LoncapaResponse):
                 )
         return out
 
+    def evaluate_samples(self, answer, var_dict_list):
+        """
+        Like `tupleize_answers`, but evaluate the answer for all the test cases
+        in one vectorized pass, and return a numpy array of results.
+
+        Answers that can't be evaluated that way (e.g. ones using `factorial`,
+        or that divide by zero for some test case) are evaluated one test case
+        at a time by `tupleize_answers`, which also reports any invalid input.
+        """
+        variables = {}
+        for var_dict in var_dict_list:
+            for var, value in var_dict.iteritems():
+                variables.setdefault(var, []).append(value)
+        try:
+            return evaluator_vectorized(
+                variables,
+                dict(),
+                answer,
+                len(var_dict_list),
+                case_sensitive=self.case_sensitive,
+            )
+        except Exception:  # pylint: disable=broad-except
+            return numpy.array(self.tupleize_answers(answer, var_dict_list))
+
     def randomize_variables(self, samples):
         """
         Returns a list of dictionaries mapping variables to random values in range,
@@ -3280,11 +3304,10 @@ class FormulaResponse(LoncapaResponse):
         "correct" or "incorrect".
         """
         var_dict_list = self.randomize_variables(samples)
-        student_result = self.tupleize_answers(given, var_dict_list)
-        instructor_result = self.tupleize_answers(expected, var_dict_list)
+        student_result = self.evaluate_samples(given, var_dict_list)
+        instructor_result = self.evaluate_samples(expected, var_dict_list)
 
-        correct = all(compare_with_tolerance(student, instructor, self.tolerance)
-                      for student, instructor in zip(student_result, instructor_result))
+        correct = compare_samples_with_tolerance(student_result, instructor_result, self.tolerance).all()
         if correct:
             return "correct"
         else:
@@ -3303,7 +3326,7 @@ class FormulaResponse(LoncapaResponse):
         """
         var_dict_list = self.randomize_variables(self.samples)
         try:
-            self.tupleize_answers(answer, var_dict_list)
+            self.evaluate_samples(answer, var_dict_list)
             return True
         except StudentInputError:
             return False
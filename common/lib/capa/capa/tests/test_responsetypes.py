@@ -577,6 +577,19 @@ class FormulaResponseTest(ResponseTest):
         input_dict = {'1_2_1': '1/0'}
         self.assertRaises(StudentInputError, problem.grade_answers, input_dict)
 
+    def test_grade_single_value_functions(self):
+        """
+        Test grading answers using functions that can't be evaluated for all
+        the samples at once
+        """
+        sample_dict = {'x': (3, 3)}
+        problem = self.build_problem(sample_dict=sample_dict,
+                                     num_samples=10,
+                                     tolerance=0.01,
+                                     answer="6")
+        self.assert_grade(problem, "fact(x)", "correct")
+        self.assert_grade(problem, "fact(x) + 1", "incorrect")
+
     def test_validate_answer(self):
         """
         Makes sure that validate_answer works.
@@ -5,7 +5,9 @@ import unittest
 from lxml import etree
 
 from . import test_capa_system
-from capa.util import compare_with_tolerance, sanitize_html, get_inner_html_from_xpath
+from capa.util import (
+    compare_with_tolerance, compare_samples_with_tolerance, sanitize_html, get_inner_html_from_xpath
+)
 
 
 class UtilTest(unittest.TestCase):
@@ -106,6 +108,25 @@ class UtilTest(unittest.TestCase):
         result = compare_with_tolerance(111.0, complex(100.0, 0), '10%', True)
         self.assertTrue(result)
 
+    def test_compare_samples_with_tolerance(self):
+        infinity = float('Inf')
+        student = [100.0, 100.001, 101.0, infinity, float('nan'), 100.01]
+        instructor = [100.0, 100.0, 100.0, infinity, 100.0, complex(100.0, 0)]
+        for tolerance, relative_tolerance in [
+                ('0.001%', False), ('10%', False), ('0.5%', True), ('0.01', False), (0.01, False), (1.0, True)
+        ]:
+            result = compare_samples_with_tolerance(student, instructor, tolerance, relative_tolerance)
+            expected = [
+                compare_with_tolerance(student_result, instructor_result, tolerance, relative_tolerance)
+                for student_result, instructor_result in zip(student, instructor)
+            ]
+            self.assertEqual(list(result), expected)
+
+        # Results exactly on the boundary are compared as the single result
+        # comparison does
+        result = compare_samples_with_tolerance([100.001, 100.002], [100.0, 100.0], 0.001)
+        self.assertEqual(list(result), [True, False])
+
     def test_sanitize_html(self):
         """
         Test for html sanitization with bleach.
@@ -3,9 +3,11 @@ Utility functions for capa.
 """
 import bleach
 from decimal import Decimal
+import numbers
 
 from calc import evaluator
 from cmath import isinf, isnan
+import numpy
 import re
 from lxml import etree
 #-----------------------------------------------------------------------------
@@ -90,6 +92,68 @@ def compare_with_tolerance(student_complex, instructor_complex, tolerance=defaul
         return abs(student_complex - instructor_complex) <= tolerance
 
 
+def compare_samples_with_tolerance(student_results, instructor_results, tolerance=default_tolerance,
+                                   relative_tolerance=False):
+    """
+    Compare arrays of student and instructor results sample by sample, as
+    `compare_with_tolerance` does for single results, and return a numpy array
+    of booleans.
+
+    Most samples are decided in one vectorized pass. `compare_with_tolerance`
+    compares real results as Decimals of their string forms, so samples within
+    rounding distance of the tolerance boundary, samples with infinite or NaN
+    results, and unusual (e.g. complex) tolerances are left to it.
+    """
+    student_results = numpy.asarray(student_results)
+    instructor_results = numpy.asarray(instructor_results)
+
+    def compare_individually(indices):
+        """
+        Compare the samples at `indices` with `compare_with_tolerance`.
+        """
+        return [
+            compare_with_tolerance(
+                student_results[index].item(), instructor_results[index].item(), tolerance, relative_tolerance
+            )
+            for index in indices
+        ]
+
+    sample_tolerance = tolerance
+    percentage_of_instructor = False
+    if isinstance(tolerance, str):
+        if tolerance == default_tolerance:
+            relative_tolerance = True
+        if tolerance.endswith('%'):
+            sample_tolerance = evaluator(dict(), dict(), tolerance[:-1]) * 0.01
+            percentage_of_instructor = not relative_tolerance
+        else:
+            sample_tolerance = evaluator(dict(), dict(), tolerance)
+
+    if not isinstance(sample_tolerance, numbers.Real):
+        indices = range(student_results.size)
+        return numpy.array(compare_individually(indices), dtype=bool)
+
+    with numpy.errstate(all='ignore'):
+        magnitude = numpy.maximum(numpy.abs(student_results), numpy.abs(instructor_results))
+        if percentage_of_instructor:
+            sample_tolerance = sample_tolerance * numpy.abs(instructor_results)
+        elif relative_tolerance:
+            sample_tolerance = sample_tolerance * magnitude
+        difference = numpy.abs(student_results - instructor_results)
+
+        # String forms keep 12 significant digits, so the Decimal comparison
+        # can only disagree with this one within this margin of the boundary.
+        margin = 1e-10 * (magnitude + numpy.abs(sample_tolerance))
+        within = difference + margin <= sample_tolerance
+        undecided = ~(within | (difference - margin > sample_tolerance))
+        undecided |= ~(numpy.isfinite(student_results) & numpy.isfinite(instructor_results))
+        undecided |= ~numpy.isfinite(sample_tolerance)
+
+    indices = numpy.flatnonzero(undecided)
+    within[indices] = compare_individually(indices)
+    return within
+
+
 def contextualize_text(text, context):  # private
     """
     Takes a string with variables. E.g. $a+$b.
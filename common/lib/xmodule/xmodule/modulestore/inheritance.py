@@ -265,38 +265,53 @@ def own_metadata(module):
 class InheritingFieldData(KvsFieldData):
     """A `FieldData` implementation that can inherit value from parents to children."""
 
-    def __init__(self, inheritable_names, **kwargs):
+    def __init__(self, inheritable_names, get_inherited_settings=None, **kwargs):
         """
         `inheritable_names` is a list of names that can be inherited from
         parents.
 
+        `get_inherited_settings`, if given, is a function returning a dict
+        mapping the inheritable names set on the block's ancestors to the
+        json value set on the nearest one, which is used instead of walking
+        up the content tree. It may return None to have the tree walked.
+
         """
         super(InheritingFieldData, self).__init__(**kwargs)
         self.inheritable_names = set(inheritable_names)
+        self.get_inherited_settings = get_inherited_settings
 
     def default(self, block, name):
         """
         The default for an inheritable name is found on a parent.
         """
         if name in self.inheritable_names:
-            # Walk up the content tree to find the first ancestor
-            # that this field is set on. Use the field from the current
-            # block so that if it has a different default than the root
-            # node of the tree, the block's default will be used.
-            field = block.fields[name]
-            ancestor = block.get_parent()
-            while ancestor is not None:
-                if field.is_set_on(ancestor):
-                    return field.read_json(ancestor)
-                else:
-                    ancestor = ancestor.get_parent()
+            inherited_settings = None
+            if self.get_inherited_settings is not None:
+                inherited_settings = self.get_inherited_settings()
+
+            if inherited_settings is not None:
+                if name in inherited_settings:
+                    return inherited_settings[name]
+            else:
+                # Walk up the content tree to find the first ancestor
+                # that this field is set on. Use the field from the current
+                # block so that if it has a different default than the root
+                # node of the tree, the block's default will be used.
+                field = block.fields[name]
+                ancestor = block.get_parent()
+                while ancestor is not None:
+                    if field.is_set_on(ancestor):
+                        return field.read_json(ancestor)
+                    else:
+                        ancestor = ancestor.get_parent()
         return super(InheritingFieldData, self).default(block, name)
 
 
-def inheriting_field_data(kvs):
+def inheriting_field_data(kvs, get_inherited_settings=None):
     """Create an InheritanceFieldData that inherits the names in InheritanceMixin."""
     return InheritingFieldData(
         inheritable_names=InheritanceMixin.fields.keys(),
+        get_inherited_settings=get_inherited_settings,
         kvs=kvs,
     )
 
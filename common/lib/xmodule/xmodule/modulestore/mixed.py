@@ -20,6 +20,7 @@ from xmodule.assetstore import AssetMetadata
 from . import ModuleStoreWriteBase
 from . import ModuleStoreEnum
 from .exceptions import ItemNotFoundError, DuplicateCourseError
+from .profiler import profile_call
 from .draft_and_published import ModuleStoreDraftAndPublished
 from .split_migrator import SplitMigrator
 
@@ -218,6 +219,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
             return course_key
         return store.fill_in_run(course_key)
 
+    @profile_call
     def has_item(self, usage_key, **kwargs):
         """
         Does the course include the xblock who's id is reference?
@@ -225,6 +227,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(usage_key.course_key)
         return store.has_item(usage_key, **kwargs)
 
+    @profile_call
     @strip_key
     def get_item(self, usage_key, depth=0, **kwargs):
         """
@@ -233,6 +236,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(usage_key.course_key)
         return store.get_item(usage_key, depth, **kwargs)
 
+    @profile_call
     @strip_key
     def get_items(self, course_key, **kwargs):
         """
@@ -265,6 +269,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(course_key)
         return store.get_items(course_key, **kwargs)
 
+    @profile_call
     @strip_key
     def get_course_summaries(self, **kwargs):
         """
@@ -285,6 +290,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
                     course_summaries[course_id] = course_summary
         return course_summaries.values()
 
+    @profile_call
     @strip_key
     def get_courses(self, **kwargs):
         '''
@@ -300,6 +306,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
                     courses[course_id] = course
         return courses.values()
 
+    @profile_call
     @strip_key
     def get_libraries(self, **kwargs):
         """
@@ -342,6 +349,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(course_key)
         return store.make_course_usage_key(course_key)
 
+    @profile_call
     @strip_key
     def get_course(self, course_key, depth=0, **kwargs):
         """
@@ -357,6 +365,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         except ItemNotFoundError:
             return None
 
+    @profile_call
     @strip_key
     @contract(library_key='LibraryLocator')
     def get_library(self, library_key, depth=0, **kwargs):
@@ -375,6 +384,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         except ItemNotFoundError:
             return None
 
+    @profile_call
     @strip_key
     def has_course(self, course_id, ignore_case=False, **kwargs):
         """
@@ -391,6 +401,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(course_id)
         return store.has_course(course_id, ignore_case, **kwargs)
 
+    @profile_call
     def delete_course(self, course_key, user_id):
         """
         See xmodule.modulestore.__init__.ModuleStoreWrite.delete_course
@@ -434,6 +445,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(asset_metadata_list[0].asset_id.course_key)
         return store.save_asset_metadata_list(asset_metadata_list, user_id, import_only)
 
+    @profile_call
     @strip_key
     @contract(asset_key='AssetKey')
     def find_asset_metadata(self, asset_key, **kwargs):
@@ -449,6 +461,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(asset_key.course_key)
         return store.find_asset_metadata(asset_key, **kwargs)
 
+    @profile_call
     @strip_key
     @contract(course_key='CourseKey', asset_type='None | basestring', start=int, maxresults=int, sort='tuple|None')
     def get_all_asset_metadata(self, course_key, asset_type, start=0, maxresults=-1, sort=None, **kwargs):
@@ -548,6 +561,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(asset_key.course_key)
         return store.set_asset_metadata_attrs(asset_key, attr_dict, user_id)
 
+    @profile_call
     @strip_key
     def get_parent_location(self, location, **kwargs):
         """
@@ -556,6 +570,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(location.course_key)
         return store.get_parent_location(location, **kwargs)
 
+    @profile_call
     def get_block_original_usage(self, usage_key):
         """
         If a block was inherited into another structure using copy_from_template,
@@ -578,6 +593,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         """
         return self._get_modulestore_for_courselike(course_id).get_modulestore_type()
 
+    @profile_call
     @strip_key
     def get_orphans(self, course_key, **kwargs):
         """
@@ -598,6 +614,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
             errs.update(store.get_errored_courses())
         return errs
 
+    @profile_call
     @strip_key
     def create_course(self, org, course, run, user_id, **kwargs):
         """
@@ -627,6 +644,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
 
         return course
 
+    @profile_call
     @strip_key
     def create_library(self, org, library, user_id, fields, **kwargs):
         """
@@ -655,6 +673,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
 
         return library
 
+    @profile_call
     @strip_key
     def clone_course(self, source_course_id, dest_course_id, user_id, fields=None, **kwargs):
         """
@@ -686,6 +705,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
                 source_modulestore, dest_modulestore
             ))
 
+    @profile_call
     @strip_key
     def create_item(self, user_id, course_key, block_type, block_id=None, fields=None, **kwargs):
         """
@@ -706,6 +726,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         modulestore = self._verify_modulestore_support(course_key, 'create_item')
         return modulestore.create_item(user_id, course_key, block_type, block_id=block_id, fields=fields, **kwargs)
 
+    @profile_call
     @strip_key
     def create_child(self, user_id, parent_usage_key, block_type, block_id=None, fields=None, **kwargs):
         """
@@ -726,6 +747,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         modulestore = self._verify_modulestore_support(parent_usage_key.course_key, 'create_child')
         return modulestore.create_child(user_id, parent_usage_key, block_type, block_id=block_id, fields=fields, **kwargs)
 
+    @profile_call
     @strip_key
     def import_xblock(self, user_id, course_key, block_type, block_id, fields=None, runtime=None, **kwargs):
         """
@@ -736,6 +758,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(course_key, 'import_xblock')
         return store.import_xblock(user_id, course_key, block_type, block_id, fields, runtime)
 
+    @profile_call
     @strip_key
     def copy_from_template(self, source_keys, dest_key, user_id, **kwargs):
         """
@@ -744,6 +767,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(dest_key.course_key, 'copy_from_template')
         return store.copy_from_template(source_keys, dest_key, user_id)
 
+    @profile_call
     @strip_key
     def update_item(self, xblock, user_id, allow_not_found=False, **kwargs):
         """
@@ -753,6 +777,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(xblock.location.course_key, 'update_item')
         return store.update_item(xblock, user_id, allow_not_found, **kwargs)
 
+    @profile_call
     @strip_key
     def delete_item(self, location, user_id, **kwargs):
         """
@@ -761,6 +786,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(location.course_key, 'delete_item')
         return store.delete_item(location, user_id=user_id, **kwargs)
 
+    @profile_call
     def revert_to_published(self, location, user_id):
         """
         Reverts an item to its last published version (recursively traversing all of its descendants).
@@ -791,6 +817,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
             if hasattr(modulestore, '_drop_database'):
                 modulestore._drop_database()  # pylint: disable=protected-access
 
+    @profile_call
     @strip_key
     def create_xblock(self, runtime, course_key, block_type, block_id=None, fields=None, **kwargs):
         """
@@ -808,6 +835,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(course_key, 'create_xblock')
         return store.create_xblock(runtime, course_key, block_type, block_id, fields or {}, **kwargs)
 
+    @profile_call
     @strip_key
     def get_courses_for_wiki(self, wiki_slug, **kwargs):
         """
@@ -832,6 +860,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
             )
         )
 
+    @profile_call
     def has_published_version(self, xblock):
         """
         Returns whether this xblock is draft, public, or private.
@@ -846,6 +875,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(course_id)
         return store.has_published_version(xblock)
 
+    @profile_call
     @strip_key
     def publish(self, location, user_id, **kwargs):
         """
@@ -855,6 +885,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(location.course_key, 'publish')
         return store.publish(location, user_id, **kwargs)
 
+    @profile_call
     @strip_key
     def unpublish(self, location, user_id, **kwargs):
         """
@@ -864,6 +895,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(location.course_key, 'unpublish')
         return store.unpublish(location, user_id, **kwargs)
 
+    @profile_call
     def convert_to_draft(self, location, user_id):
         """
         Create a copy of the source and mark its revision as draft.
@@ -874,6 +906,7 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._verify_modulestore_support(location.course_key, 'convert_to_draft')
         return store.convert_to_draft(location, user_id)
 
+    @profile_call
     def has_changes(self, xblock):
         """
         Checks if the given block has unpublished changes
@@ -17,6 +17,7 @@ import sys
 import logging
 import copy
 import re
+from collections import defaultdict
 from uuid import uuid4
 
 from bson.son import SON
@@ -50,6 +51,7 @@ from xmodule.modulestore.draft_and_published import ModuleStoreDraftAndPublished
 from xmodule.modulestore.edit_info import EditInfoRuntimeMixin
 from xmodule.modulestore.exceptions import ItemNotFoundError, DuplicateCourseError, ReferentialIntegrityError
 from xmodule.modulestore.inheritance import InheritanceMixin, inherit_metadata, InheritanceKeyValueStore
+from xmodule.modulestore.profiler import MONGO, profiled
 from xmodule.modulestore.xml import CourseLocationManager
 from xmodule.modulestore.store_utilities import DETACHED_XBLOCK_TYPES
 from xmodule.services import SettingsService
@@ -547,9 +549,12 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
                  user_service=None,
                  signal_handler=None,
                  retry_wait_time=0.1,
+                 incremental_inheritance_refresh=False,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param incremental_inheritance_refresh: whether to patch the cached metadata inheritance tree
+            for the subtree of an updated item, rather than recomputing the whole tree.
         """
 
         super(MongoModuleStore, self).__init__(contentstore=contentstore, **kwargs)
@@ -594,6 +599,7 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
 
         self._course_run_cache = {}
         self.signal_handler = signal_handler
+        self.incremental_inheritance_refresh = incremental_inheritance_refresh
 
     def close_connections(self):
         """
@@ -672,6 +678,20 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
         '''
         # get all collections in the course, this query should not return any leaf nodes
         course_id = self.fill_in_run(course_id)
+        results_by_url, root = self._find_inheritance_records(course_id, self._inheritance_query(course_id))
+
+        # now traverse the tree and compute down the inherited metadata
+        metadata_to_inherit = {}
+        if root is not None:
+            self._compute_inherited_metadata(results_by_url, root, metadata_to_inherit)
+
+        return metadata_to_inherit
+
+    def _inheritance_query(self, course_id):
+        """
+        Return the query for the items in the course which may define inheritable data
+        (the ones which may have children).
+        """
         query = SON([
             ('_id.tag', 'i4x'),
             ('_id.org', course_id.org),
@@ -681,6 +701,14 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
         # if we're only dealing in the published branch, then only get published containers
         if self.get_branch_setting() == ModuleStoreEnum.Branch.published_only:
             query['_id.revision'] = None
+        return query
+
+    def _find_inheritance_records(self, course_id, query):
+        """
+        Return a dict mapping the location urls of the items matching ``query`` to their children
+        and inheritable metadata (merging the children of the draft and published versions of
+        each item), and the url of the course if it's among them.
+        """
         # we just want the Location, children, and inheritable metadata
         record_filter = {'_id': 1, 'definition.children': 1}
 
@@ -690,7 +718,8 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             record_filter['metadata.{0}'.format(field_name)] = 1
 
         # call out to the DB
-        resultset = self.collection.find(query, record_filter)
+        with profiled(MONGO, 'find_inheritance_records', query.get('_id.name'), course_id):
+            resultset = list(self.collection.find(query, record_filter))
 
         # it's ok to keep these as deprecated strings b/c the overall cache is indexed by course_key and this
         # is a dictionary relative to that course
@@ -717,38 +746,171 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             if location.category == 'course':
                 root = location_url
 
-        # now traverse the tree and compute down the inherited metadata
-        metadata_to_inherit = {}
+        return results_by_url, root
 
-        def _compute_inherited_metadata(url):
-            """
-            Helper method for computing inherited metadata for a specific location url
-            """
-            my_metadata = results_by_url[url].get('metadata', {})
-
-            # go through all the children and recurse, but only if we have
-            # in the result set. Remember results will not contain leaf nodes
-            for child in results_by_url[url].get('definition', {}).get('children', []):
-                if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
-                    metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
-                else:
-                    # this is likely a leaf node, so let's record what metadata we need to inherit
-                    metadata_to_inherit[child] = my_metadata.copy()
-                # WARNING: 'parent' is not part of inherited metadata, but
-                # we're piggybacking on this recursive traversal to grab
-                # and cache the child's parent, as a performance optimization.
-                # The 'parent' key will be popped out of the dictionary during
-                # CachingDescriptorSystem.load_item
-                metadata_to_inherit[child].setdefault('parent', {})[self.get_branch_setting()] = url
+    def _compute_inherited_metadata(self, results_by_url, url, metadata_to_inherit):
+        """
+        Helper method for computing inherited metadata for a specific location url
+        """
+        my_metadata = results_by_url[url].get('metadata', {})
 
-        if root is not None:
-            _compute_inherited_metadata(root)
+        # go through all the children and recurse, but only if we have
+        # in the result set. Remember results will not contain leaf nodes
+        for child in results_by_url[url].get('definition', {}).get('children', []):
+            if child in results_by_url:
+                new_child_metadata = copy.deepcopy(my_metadata)
+                new_child_metadata.update(results_by_url[child].get('metadata', {}))
+                results_by_url[child]['metadata'] = new_child_metadata
+                metadata_to_inherit[child] = new_child_metadata
+                self._compute_inherited_metadata(results_by_url, child, metadata_to_inherit)
+            else:
+                # this is likely a leaf node, so let's record what metadata we need to inherit
+                metadata_to_inherit[child] = my_metadata.copy()
+            # WARNING: 'parent' is not part of inherited metadata, but
+            # we're piggybacking on this recursive traversal to grab
+            # and cache the child's parent, as a performance optimization.
+            # The 'parent' key will be popped out of the dictionary during
+            # CachingDescriptorSystem.load_item
+            metadata_to_inherit[child].setdefault('parent', {})[self.get_branch_setting()] = url
 
-        return metadata_to_inherit
+    def _patch_metadata_inheritance_tree(self, course_id, location):
+        """
+        Return the cached metadata inheritance tree of the course, patched for an update of the
+        item at ``location`` by recomputing the inherited metadata of its subtree only.
+
+        The tree is read from the caching subsystem (not the request cache, which other
+        processes' updates don't reach), and only written back if nobody wrote it meanwhile.
+
+        Returns None if the tree isn't cached, isn't consistent with the item and its parent
+        in the db, or was written meanwhile, so that it has to be recomputed in full.
+        """
+        if self.metadata_inheritance_cache_subsystem is None:
+            return None
+        course_key = unicode(course_id)
+        version_key = self._metadata_inheritance_version_key(course_key)
+        version = self.metadata_inheritance_cache_subsystem.get(version_key)
+        tree = self.metadata_inheritance_cache_subsystem.get(course_key, {})
+        if version is None or not tree:
+            return None
+
+        if location.category not in BLOCK_TYPES_WITH_CHILDREN:
+            # leaves don't pass any metadata down, and what they inherit is their parent's
+            return tree
+
+        branch = self.get_branch_setting()
+        location = as_published(location)
+        url = unicode(location)
+        if location.category == 'course':
+            parent_url = None
+        elif url not in tree:
+            # the item isn't in the course (yet), so it doesn't pass any metadata down; its parent's
+            # update will patch it in when it's added as a child
+            return tree
+        else:
+            parent_url = tree[url].get('parent', {}).get(branch)
+            if parent_url is None:
+                return None
+
+        # get the item and its parent, to check that they're still related as the tree says
+        locations = [location]
+        if parent_url is not None:
+            parent_location = course_id.make_usage_key_from_deprecated_string(parent_url)
+            locations.append(parent_location)
+        records = self._find_inheritance_records_at(course_id, locations)
+        if url not in records:
+            return None
+        if parent_url is None:
+            inherited = {}
+        elif url not in records.get(parent_url, {}).get('definition', {}).get('children', []):
+            return None
+        elif parent_location.category == 'course':
+            inherited = records[parent_url].get('metadata', {})
+        elif parent_url in tree:
+            inherited = {key: value for key, value in tree[parent_url].iteritems() if key != 'parent'}
+        else:
+            return None
+
+        # get the containers in the item's subtree, a level at a time
+        my_record = records[url]
+        my_metadata = copy.deepcopy(inherited)
+        my_metadata.update(my_record.get('metadata', {}))
+        my_record['metadata'] = my_metadata
+        results_by_url = {url: my_record}
+        level = [url]
+        while level:
+            child_locations = [
+                child_location
+                for child_location in (
+                    course_id.make_usage_key_from_deprecated_string(child)
+                    for level_url in level
+                    for child in results_by_url[level_url].get('definition', {}).get('children', [])
+                    if child not in results_by_url
+                )
+                if child_location.category in BLOCK_TYPES_WITH_CHILDREN
+            ]
+            records = self._find_inheritance_records_at(course_id, child_locations)
+            results_by_url.update(records)
+            level = records.keys()
+
+        subtree_metadata = {}
+        self._compute_inherited_metadata(results_by_url, url, subtree_metadata)
+        if parent_url is not None:
+            my_metadata['parent'] = {branch: parent_url}
+            subtree_metadata[url] = my_metadata
+
+        # drop the items which were in the subtree (the children of its containers, and their
+        # descendants); the ones still in it are added back from subtree_metadata
+        children_by_parent = defaultdict(list)
+        for item_url, metadata in tree.iteritems():
+            children_by_parent[metadata.get('parent', {}).get(branch)].append(item_url)
+        dropped = set()
+        to_drop = [child for container_url in results_by_url for child in children_by_parent[container_url]]
+        while to_drop:
+            item_url = to_drop.pop()
+            if item_url not in dropped:
+                dropped.add(item_url)
+                to_drop.extend(children_by_parent[item_url])
+        tree = {item_url: metadata for item_url, metadata in tree.iteritems() if item_url not in dropped}
+        tree.update(subtree_metadata)
+
+        if self.metadata_inheritance_cache_subsystem.get(version_key) != version:
+            # the tree was written meanwhile, so this patch may undo that write
+            return None
+        self._set_cached_metadata_inheritance_tree(course_key, tree)
+        if self.request_cache is not None:
+            self.request_cache.data.setdefault('metadata_inheritance', {})[course_key] = tree
+        return tree
+
+    def _find_inheritance_records_at(self, course_id, locations):
+        """
+        Return a dict mapping the location urls of the given containers to their children and
+        inheritable metadata (see _find_inheritance_records).
+        """
+        if not locations:
+            return {}
+        query = self._inheritance_query(course_id)
+        query['_id.name'] = {'$in': list(set(location.name for location in locations))}
+        results_by_url, __ = self._find_inheritance_records(course_id, query)
+        urls = set(unicode(as_published(location)) for location in locations)
+        return {url: record for url, record in results_by_url.iteritems() if url in urls}
+
+    @staticmethod
+    def _metadata_inheritance_version_key(course_key):
+        """
+        Return the key in the caching subsystem of the edit stamp of the metadata inheritance
+        tree of the course with the string ``course_key``.
+        """
+        return u'{}.inheritance_version'.format(course_key)
+
+    def _set_cached_metadata_inheritance_tree(self, course_key, tree):
+        """
+        Write the metadata inheritance tree of the course with the string ``course_key`` to the
+        caching subsystem, with a new edit stamp.
+        """
+        self.metadata_inheritance_cache_subsystem.set(
+            self._metadata_inheritance_version_key(course_key), uuid4().hex
+        )
+        self.metadata_inheritance_cache_subsystem.set(course_key, tree)
 
     def _get_cached_metadata_inheritance_tree(self, course_id, force_refresh=False):
         '''
@@ -777,7 +939,7 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
 
             # now write out computed tree to caching subsystem (e.g. memcached), if available
             if self.metadata_inheritance_cache_subsystem is not None:
-                self.metadata_inheritance_cache_subsystem.set(unicode(course_id), tree)
+                self._set_cached_metadata_inheritance_tree(unicode(course_id), tree)
 
         # now populate a request_cache, if available. NOTE, we are outside of the
         # scope of the above if: statement so that after a memcache hit, it'll get
@@ -791,18 +953,26 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
 
         return tree
 
-    def refresh_cached_metadata_inheritance_tree(self, course_id, runtime=None):
+    def refresh_cached_metadata_inheritance_tree(self, course_id, runtime=None, location=None):
         """
         Refresh the cached metadata inheritance tree for the org/course combination
         for location
 
         If given a runtime, it replaces the cached_metadata in that runtime. NOTE: failure to provide
         a runtime may mean that some objects report old values for inherited data.
+
+        If given the location of the only item which changed, and the store refreshes the tree
+        incrementally, only the subtree of that item is recomputed (falling back to recomputing
+        the whole tree if the cached tree isn't consistent with the db).
         """
         course_id = course_id.for_branch(None)
         if not self._is_in_bulk_operation(course_id):
-            # below is done for side effects when runtime is None
-            cached_metadata = self._get_cached_metadata_inheritance_tree(course_id, force_refresh=True)
+            cached_metadata = None
+            if location is not None and self.incremental_inheritance_refresh:
+                cached_metadata = self._patch_metadata_inheritance_tree(self.fill_in_run(course_id), location)
+            if cached_metadata is None:
+                # below is done for side effects when runtime is None
+                cached_metadata = self._get_cached_metadata_inheritance_tree(course_id, force_refresh=True)
             if runtime:
                 runtime.cached_metadata = cached_metadata
 
@@ -824,7 +994,8 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
                 course_key.make_usage_key_from_deprecated_string(item).to_deprecated_son() for item in items
             ]}
         }
-        return list(self.collection.find(query))
+        with profiled(MONGO, 'find_children', items, course_key):
+            return list(self.collection.find(query))
 
     def _cache_children(self, course_key, items, depth=0):
         """
@@ -1042,9 +1213,10 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
         ItemNotFoundError.
         '''
         assert isinstance(location, UsageKey)
-        item = self.collection.find_one(
-            {'_id': location.to_deprecated_son()}
-        )
+        with profiled(MONGO, 'find_one', location, location.course_key):
+            item = self.collection.find_one(
+                {'_id': location.to_deprecated_son()}
+            )
         if item is None:
             raise ItemNotFoundError(location)
         return item
@@ -1225,14 +1397,15 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             query['definition.children'] = qualifiers.pop('children')
 
         query.update(qualifiers)
-        items = self.collection.find(
-            query,
-            sort=[SORT_REVISION_FAVOR_DRAFT],
-        )
+        with profiled(MONGO, 'find_items', query, course_id):
+            items = list(self.collection.find(
+                query,
+                sort=[SORT_REVISION_FAVOR_DRAFT],
+            ))
 
         modules = self._load_items(
             course_id,
-            list(items),
+            items,
             using_descriptor_system=using_descriptor_system
         )
         return modules
@@ -1510,7 +1683,9 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             xblock._edit_info = payload['edit_info']
 
             # recompute (and update) the metadata inheritance tree which is cached
-            self.refresh_cached_metadata_inheritance_tree(xblock.scope_ids.usage_id.course_key, xblock.runtime)
+            self.refresh_cached_metadata_inheritance_tree(
+                xblock.scope_ids.usage_id.course_key, xblock.runtime, xblock.scope_ids.usage_id
+            )
             # fire signal that we've written to DB
         except ItemNotFoundError:
             if not allow_not_found:
@@ -1606,9 +1781,10 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             return parent_loc
 
         # query the collection, sorting by DRAFT first
-        parents = list(
-            self.collection.find(query, {'_id': True}, sort=[SORT_REVISION_FAVOR_DRAFT])
-        )
+        with profiled(MONGO, 'find_parents', location, location.course_key):
+            parents = list(
+                self.collection.find(query, {'_id': True}, sort=[SORT_REVISION_FAVOR_DRAFT])
+            )
         if len(parents) == 0:
             # no parents were found
             return cache_and_return(None)
@@ -19,6 +19,7 @@ from xmodule.modulestore.exceptions import (
 from xmodule.modulestore.mongo.base import (
     MongoModuleStore, MongoRevisionKey, as_draft, as_published, SORT_REVISION_FAVOR_DRAFT
 )
+from xmodule.modulestore.profiler import MONGO, profiled
 from xmodule.modulestore.store_utilities import rewrite_nonportable_content_links
 from xmodule.modulestore.draft_and_published import UnsupportedRevisionError, DIRECT_ONLY_CATEGORIES
 
@@ -265,7 +266,8 @@ class DraftModuleStore(MongoModuleStore):
         query['definition.children'] = location.to_deprecated_string()
 
         # find all the items that satisfy the query
-        parents = self.collection.find(query, {'_id': True}, sort=[SORT_REVISION_FAVOR_DRAFT])
+        with profiled(MONGO, 'find_parents', location, location.course_key):
+            parents = list(self.collection.find(query, {'_id': True}, sort=[SORT_REVISION_FAVOR_DRAFT]))
 
         # return only the parent(s) that satisfy the request
         return [
@@ -0,0 +1,55 @@
+"""
+Generates synthetic courses of a given size in a modulestore.
+"""
+from xmodule.modulestore import ModuleStoreEnum
+
+# The categories of the levels of a generated course, from the top down.
+COURSE_LEVELS = ('chapter', 'sequential', 'vertical', 'problem')
+
+PROBLEM_DATA = u"""
+<problem>
+  <multiplechoiceresponse>
+    <choicegroup type="MultipleChoice">
+      <choice correct="false">Wrong</choice>
+      <choice correct="true">Right</choice>
+    </choicegroup>
+  </multiplechoiceresponse>
+</problem>
+"""
+
+
+def make_course(store, course_key, chapters, sequentials, verticals, problems, user_id=ModuleStoreEnum.UserID.test):
+    """
+    Create a course in ``store`` with ``chapters`` chapters, ``sequentials`` sequentials per chapter,
+    ``verticals`` verticals per sequential and ``problems`` problems per vertical.
+
+    The block ids are derived from the position of each block in the course (e.g. the second
+    problem of the first vertical of the first sequential of the first chapter is 'problem_0_0_0_1'),
+    so generating a course of the same size always yields the same course.
+
+    Returns:
+        the created course, and a dict mapping each category to the usage keys of the blocks
+        created in it.
+    """
+    sizes = (chapters, sequentials, verticals, problems)
+    usage_keys = {category: [] for category in COURSE_LEVELS}
+
+    def add_children(parent_key, level, path):  # pylint: disable=missing-docstring
+        if level == len(COURSE_LEVELS):
+            return
+
+        category = COURSE_LEVELS[level]
+        fields = {'data': PROBLEM_DATA} if category == 'problem' else {}
+        for index in xrange(sizes[level]):
+            child_path = path + (index,)
+            block_id = u'{}_{}'.format(category, u'_'.join(unicode(position) for position in child_path))
+            fields['display_name'] = block_id
+            child = store.create_child(user_id, parent_key, category, block_id=block_id, fields=dict(fields))
+            usage_keys[category].append(child.location)
+            add_children(child.location, level + 1, child_path)
+
+    with store.bulk_operations(course_key):
+        course = store.create_course(course_key.org, course_key.course, course_key.run, user_id)
+        add_children(course.location, 0, ())
+
+    return store.get_course(course.id), usage_keys
@@ -0,0 +1,113 @@
+"""
+Performance test for the read paths of the modulestores, on synthetic courses of several sizes.
+"""
+import itertools
+import json
+import os
+import unittest
+from contextlib import contextmanager
+from time import time
+
+import ddt
+#from nose.plugins.attrib import attr
+
+from openedx.core.lib.block_structure.factory import BlockStructureFactory
+from xmodule.modulestore import ModuleStoreEnum
+from xmodule.modulestore.perf_tests.generate_course import COURSE_LEVELS, make_course
+from xmodule.modulestore.tests.utils import MIXED_MODULESTORE_SETUPS, SHORT_NAME_MAP
+
+# Sizes of the generated courses, as (chapters, sequentials, verticals, problems) per parent.
+COURSE_SIZES = (
+    (2, 2, 2, 2),
+    (5, 5, 4, 4),
+    (10, 10, 5, 5),
+    (20, 10, 10, 5),
+)
+
+# Number of times each read is timed per test run (the fastest is reported).
+ROUNDS = 3
+
+# Number of blocks whose parent is looked up per test run.
+PARENT_LOOKUPS = 100
+
+# File the timings are written to, as json.
+REPORT_PATH = os.environ.get('MODULESTORE_READS_REPORT', 'modulestore_reads.json')
+
+
+@ddt.ddt
+# Eventually, exclude this attribute from regular unittests while running *only* tests
+# with this attribute during regular performance tests.
+# @attr("perf_test")
+@unittest.skip
+class ModuleStoreReadsTest(unittest.TestCase):
+    """
+    This class exists to time the common reads of the split and old mongo modulestores
+    (and a publish) on generated courses of increasing size, and to write the timings
+    to a json report which can be compared across code changes.
+    """
+
+    # Use this attribute to skip this test on regular unittest CI runs.
+    perf_test = True
+
+    # Timings of each test run, keyed by '<modulestore>:<chapters>x<sequentials>x<verticals>x<problems>'.
+    report = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super(ModuleStoreReadsTest, cls).tearDownClass()
+        if cls.report:
+            with open(REPORT_PATH, 'w') as report_file:
+                json.dump(cls.report, report_file, indent=2, sort_keys=True)
+
+    @contextmanager
+    def timed(self, timings, name):
+        """
+        Time the wrapped code block, keeping the fastest duration of ``name`` in ``timings``.
+        """
+        start = time()
+        yield
+        duration = time() - start
+        timings[name] = min(duration, timings.get(name, duration))
+
+    @ddt.data(*itertools.product(MIXED_MODULESTORE_SETUPS, COURSE_SIZES))
+    @ddt.unpack
+    def test_generate_read_timings(self, store_builder, course_size):
+        """
+        Generate timings for reading a course of size ``course_size`` from the modulestore
+        built by ``store_builder``.
+        """
+        timings = {}
+        with store_builder.build() as (__, store):
+            course_key = store.make_course_key('perf', 'reads', 'x'.join(str(size) for size in course_size))
+            with self.timed(timings, 'generate_course'):
+                course, usage_keys = make_course(store, course_key, *course_size)
+            parent_keys = list(itertools.islice(
+                itertools.chain.from_iterable(usage_keys[category] for category in reversed(COURSE_LEVELS)),
+                PARENT_LOOKUPS
+            ))
+
+            for __ in xrange(ROUNDS):
+                with self.timed(timings, 'get_course(depth=None)'):
+                    store.get_course(course.id, depth=None)
+
+                for category in COURSE_LEVELS:
+                    with self.timed(timings, 'get_items({})'.format(category)):
+                        items = store.get_items(course.id, qualifiers={'category': category})
+                    self.assertEqual(len(items), len(usage_keys[category]))
+
+                with self.timed(timings, 'get_parent_location x {}'.format(len(parent_keys))):
+                    for usage_key in parent_keys:
+                        store.get_parent_location(usage_key)
+
+                with self.timed(timings, 'create_from_modulestore'):
+                    BlockStructureFactory.create_from_modulestore(course.location, store)
+
+            # Publishing changes the course, so it's only timed once.
+            with self.timed(timings, 'publish(chapter)'):
+                store.publish(usage_keys['chapter'][0], ModuleStoreEnum.UserID.test)
+
+        desc = '{}:{}'.format(SHORT_NAME_MAP[store_builder], 'x'.join(str(size) for size in course_size))
+        self.report[desc] = {
+            'blocks': {category: len(keys) for category, keys in usage_keys.iteritems()},
+            'timings': timings,
+        }
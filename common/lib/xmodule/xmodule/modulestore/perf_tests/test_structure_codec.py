@@ -0,0 +1,80 @@
+"""
+Performance test for the codecs used to cache split modulestore structures.
+"""
+import unittest
+
+import ddt
+#from nose.plugins.attrib import attr
+
+from nose.plugins.skip import SkipTest
+from xmodule.modulestore.perf_tests.test_asset_import_export import TEST_DATA_ROOT
+from xmodule.modulestore.split_mongo.structure_codec import STRUCTURE_CODECS
+from xmodule.modulestore.tests.utils import VersioningModulestoreBuilder
+from xmodule.modulestore.xml_importer import import_course_from_xml
+
+# The dependency below needs to be installed manually from the development.txt file, which doesn't
+# get installed during unit tests!
+try:
+    from code_block_timer import CodeBlockTimer
+except ImportError:
+    CodeBlockTimer = None
+
+# Exported courses to import and cache the structures of.
+TEST_COURSES = ('toy', 'manual-testing-complete', 'split_test_module', 'conditional_and_poll')
+
+# Number of times each structure is encoded and decoded per test run.
+ROUNDS = 10
+
+
+@ddt.ddt
+# Eventually, exclude this attribute from regular unittests while running *only* tests
+# with this attribute during regular performance tests.
+# @attr("perf_test")
+@unittest.skip
+class StructureCodecTest(unittest.TestCase):
+    """
+    This class exists to time the encoding and decoding of the structures of real
+    courses by each structure codec, and to compare the sizes of the encoded structures.
+    """
+
+    # Use this attribute to skip this test on regular unittest CI runs.
+    perf_test = True
+
+    @ddt.data(*TEST_COURSES)
+    def test_generate_codec_timings(self, course_name):
+        """
+        Generate timings and sizes for each structure codec, for the structure of ``course_name``.
+        """
+        if CodeBlockTimer is None:
+            raise SkipTest("CodeBlockTimer undefined.")
+
+        with VersioningModulestoreBuilder().build() as (contentstore, store):
+            course_key = store.make_course_key('a', course_name, 'course')
+            import_course_from_xml(
+                store,
+                'test_user',
+                TEST_DATA_ROOT,
+                source_dirs=[course_name],
+                static_content_store=contentstore,
+                target_id=course_key,
+                create_if_not_present=True,
+                raise_on_failure=True,
+            )
+            structure = store._lookup_course(course_key).structure  # pylint: disable=protected-access
+
+        sizes = {}
+        for codec in STRUCTURE_CODECS.values():
+            desc = "StructureCodec:{}:{}:{}_blocks".format(codec.name, course_name, len(structure['blocks']))
+            with CodeBlockTimer(desc):
+                with CodeBlockTimer("encode"):
+                    for __ in xrange(ROUNDS):
+                        encoded = codec.encode(structure)
+
+                with CodeBlockTimer("decode"):
+                    for __ in xrange(ROUNDS):
+                        decoded = codec.decode(encoded)
+
+            self.assertEqual(decoded, structure)
+            sizes[codec.name] = len(encoded)
+
+        print "{}: encoded sizes {}".format(course_name, sizes)
@@ -0,0 +1,303 @@
+"""
+A profiler of the modulestore calls made in a thread (e.g. while handling a request).
+
+While a :class:`ModuleStoreProfiler` is started, it records each call to the entry points
+of the :class:`.MixedModuleStore`, and each query the split and old mongo modulestores make,
+with what was asked for (e.g. the usage key of an item, or the id of a structure), the course,
+the call site outside of the modulestore and the duration. From these, it finds:
+
+* repeated reads: identical reads made more than once, which could have been cached, and
+* fanned out reads: many reads of the same kind made from the same call site, which
+  are usually one read per item of a list (N+1 reads), and could have been batched.
+
+When no profiler is started, profiling costs a thread local lookup per call.
+"""
+import contextlib
+import functools
+import os
+import threading
+import traceback
+from collections import Counter, defaultdict
+from time import time
+
+import contracts
+import mongodb_proxy
+from opaque_keys.edx.keys import CourseKey
+
+# the kinds of the profiled calls
+MODULESTORE = 'modulestore'
+SPLIT = 'split'
+MONGO = 'mongo'
+
+# calls named so (or whose last dotted part is named so) are reads
+READ_PREFIXES = ('get', 'has', 'find')
+
+# frames in the modulestore, the standard library, the libraries wrapping modulestore methods,
+# and installed packages are skipped when finding where the modulestore was called from
+SKIPPED_DIRS = tuple(
+    os.path.dirname(os.path.abspath(path))
+    for path in (__file__, contextlib.__file__, contracts.__file__, mongodb_proxy.__file__)
+)
+SKIPPED_PATH_PARTS = ('site-packages', 'dist-packages')
+
+# the maximum length of the description of what a call asked for
+MAX_KEY_LENGTH = 200
+
+_LOCAL = threading.local()
+
+
+class ProfiledCall(object):
+    """
+    A call recorded by a :class:`ModuleStoreProfiler`.
+    """
+    __slots__ = ('kind', 'name', 'key', 'course', 'call_site', 'depth', 'duration')
+
+    def __init__(self, kind, name, key, course, call_site, depth):
+        self.kind = kind
+        self.name = name
+        self.key = key
+        self.course = course
+        self.call_site = call_site
+        self.depth = depth
+        self.duration = None
+
+    @property
+    def is_read(self):
+        """
+        Whether the call is a read.
+        """
+        return self.name.rpartition('.')[2].startswith(READ_PREFIXES)
+
+    def to_json(self):
+        """
+        Return a json serializable dict describing the call.
+        """
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+
+class ModuleStoreProfiler(object):
+    """
+    Records the modulestore calls made in the thread it's started in.
+    """
+    def __init__(self):
+        self.calls = []
+        self._depth = 0
+        self._previous = None
+
+    def start(self):
+        """
+        Start recording the calls made in this thread (until ``stop`` is called), and
+        return this profiler.
+        """
+        self._previous = get_profiler()
+        _LOCAL.profiler = self
+        return self
+
+    def stop(self):
+        """
+        Stop recording calls, restoring the profiler which was started before this one, if any.
+        """
+        _LOCAL.profiler = self._previous
+        self._previous = None
+
+    @contextlib.contextmanager
+    def record(self, kind, name, key=None, course=None):
+        """
+        Record a call of kind ``kind`` named ``name``, timing the wrapped code block.
+
+        Arguments:
+            kind: what was called (e.g. MODULESTORE)
+            name: the name of the call (e.g. the name of the method)
+            key: what the call asked for (e.g. a usage key, or a structure id)
+            course: the course the call was made for
+        """
+        call = ProfiledCall(kind, name, _describe(key), _describe(course), _call_site(), self._depth)
+        self.calls.append(call)
+        self._depth += 1
+        start = time()
+        try:
+            yield call
+        finally:
+            call.duration = time() - start
+            self._depth -= 1
+
+    def repeated_reads(self, minimum=2):
+        """
+        Return (call, count) pairs for the reads made at least ``minimum`` times with the same key,
+        most repeated first (the call is the first of them).
+        """
+        counts = Counter()
+        first_calls = {}
+        for call in self.calls:
+            if call.is_read:
+                read = (call.kind, call.name, call.key, call.course)
+                counts[read] += 1
+                first_calls.setdefault(read, call)
+        return [(first_calls[read], count) for read, count in counts.most_common() if count >= minimum]
+
+    def fanned_out_reads(self, minimum=10):
+        """
+        Return (call, count) pairs for the reads of the same kind made at least ``minimum`` times,
+        with different keys, from the same call site, most fanned out first (the call is the first
+        of them).
+        """
+        keys = defaultdict(set)
+        first_calls = {}
+        for call in self.calls:
+            if call.is_read:
+                read = (call.kind, call.name, call.call_site)
+                keys[read].add(call.key)
+                first_calls.setdefault(read, call)
+        fanned_out = [(first_calls[read], len(read_keys)) for read, read_keys in keys.iteritems()]
+        fanned_out.sort(key=lambda read: read[1], reverse=True)
+        return [(call, count) for call, count in fanned_out if count >= minimum]
+
+    def totals(self):
+        """
+        Return a dict mapping each kind of call to the number of calls of that kind and their total
+        duration (of the outermost of any nested calls of the kind).
+        """
+        totals = {}
+        open_calls = []
+        for call in self.calls:
+            while open_calls and open_calls[-1].depth >= call.depth:
+                open_calls.pop()
+            count, duration = totals.get(call.kind, (0, 0))
+            if not any(open_call.kind == call.kind for open_call in open_calls):
+                duration += call.duration or 0
+            totals[call.kind] = (count + 1, duration)
+            open_calls.append(call)
+        return totals
+
+    def report(self):
+        """
+        Return a json serializable dict with the calls, their totals, and the repeated and fanned
+        out reads among them.
+        """
+        return {
+            'totals': {
+                kind: {'count': count, 'duration': duration}
+                for kind, (count, duration) in self.totals().iteritems()
+            },
+            'repeated_reads': [
+                dict(call.to_json(), count=count) for call, count in self.repeated_reads()
+            ],
+            'fanned_out_reads': [
+                dict(call.to_json(), count=count) for call, count in self.fanned_out_reads()
+            ],
+            'calls': [call.to_json() for call in self.calls],
+        }
+
+    def summary_lines(self):
+        """
+        Return the lines of a human readable summary of the totals, and the repeated and fanned
+        out reads.
+        """
+        lines = [
+            u'{}: {} calls in {:.3f}s'.format(kind, count, duration)
+            for kind, (count, duration) in sorted(self.totals().iteritems())
+        ]
+        lines.extend(
+            u'repeated read: {} x {}.{}({}) for {} from {}'.format(
+                count, call.kind, call.name, call.key, call.course, call.call_site
+            )
+            for call, count in self.repeated_reads()
+        )
+        lines.extend(
+            u'fanned out read: {} x {}.{} from {}'.format(count, call.kind, call.name, call.call_site)
+            for call, count in self.fanned_out_reads()
+        )
+        return lines
+
+
+def get_profiler():
+    """
+    Return the profiler started in this thread, if any.
+    """
+    return getattr(_LOCAL, 'profiler', None)
+
+
+@contextlib.contextmanager
+def profile_modulestore():
+    """
+    Record the modulestore calls made in this thread within the wrapped code block,
+    yielding the :class:`ModuleStoreProfiler`.
+    """
+    profiler = ModuleStoreProfiler().start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+@contextlib.contextmanager
+def profiled(kind, name, key=None, course=None):
+    """
+    Record the wrapped code block as a call (see :meth:`ModuleStoreProfiler.record`), if
+    a profiler is started in this thread.
+    """
+    profiler = get_profiler()
+    if profiler is None:
+        yield None
+    else:
+        with profiler.record(kind, name, key, course) as call:
+            yield call
+
+
+def profile_call(func):
+    """
+    A decorator for the entry points of a modulestore, which records each call to ``func``
+    if a profiler is started in this thread. The first argument is recorded as what was
+    asked for, and its course (if it has one) as the course.
+    """
+    @functools.wraps(func)
+    def inner(self, *args, **kwargs):
+        """
+        Record the call, if profiling.
+        """
+        profiler = get_profiler()
+        if profiler is None:
+            return func(self, *args, **kwargs)
+
+        key = args[0] if args else None
+        with profiler.record(MODULESTORE, func.__name__, key, _course_of(key)):
+            return func(self, *args, **kwargs)
+
+    return inner
+
+
+def _describe(value):
+    """
+    Return a short unicode description of ``value`` (using the location of xblocks).
+    """
+    if value is None:
+        return None
+    value = getattr(value, 'location', value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        description = u'[{}]'.format(u', '.join(sorted(unicode(item) for item in value)))
+    else:
+        description = unicode(value)
+    if len(description) > MAX_KEY_LENGTH:
+        description = description[:MAX_KEY_LENGTH - 3] + u'...'
+    return description
+
+
+def _course_of(value):
+    """
+    Return the course key of ``value`` (a course key, usage key or xblock), if it has one.
+    """
+    if isinstance(value, CourseKey):
+        return value
+    return getattr(getattr(value, 'location', value), 'course_key', None)
+
+
+def _call_site():
+    """
+    Return where the modulestore was called from: the innermost frame outside of the
+    modulestore, the standard library and installed packages.
+    """
+    for filename, line_number, function, __ in reversed(traceback.extract_stack()):
+        path = os.path.abspath(filename)
+        if not path.startswith(SKIPPED_DIRS) and not any(part in path for part in SKIPPED_PATH_PARTS):
+            return u'{}:{} in {}'.format(filename, line_number, function)
+    return None
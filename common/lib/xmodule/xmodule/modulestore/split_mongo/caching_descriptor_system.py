@@ -1,5 +1,6 @@
 import sys
 import logging
+from functools import partial
 from contracts import contract, new_contract
 from fs.osfs import OSFS
 from lazy import lazy
@@ -17,7 +18,7 @@ from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.inheritance import inheriting_field_data, InheritanceMixin
 from xmodule.modulestore.split_mongo import BlockKey, CourseEnvelope
 from xmodule.modulestore.split_mongo.id_manager import SplitMongoIdManager
-from xmodule.modulestore.split_mongo.definition_lazy_loader import DefinitionLazyLoader
+from xmodule.modulestore.split_mongo.definition_lazy_loader import DefinitionBatchLoader, DefinitionLazyLoader
 from xmodule.modulestore.split_mongo.split_mongo_kvs import SplitMongoKVS
 
 log = logging.getLogger(__name__)
@@ -39,7 +40,8 @@ class CachingDescriptorSystem(MakoDescriptorSystem, EditInfoRuntimeMixin):
     Computes the settings (nee 'metadata') inheritance upon creation.
     """
     @contract(course_entry=CourseEnvelope)
-    def __init__(self, modulestore, course_entry, default_class, module_data, lazy, **kwargs):
+    def __init__(self, modulestore, course_entry, default_class, module_data, lazy, batch_definition_loads=False,
+                 **kwargs):
         """
         Computes the settings inheritance and sets up the cache.
 
@@ -52,6 +54,9 @@ class CachingDescriptorSystem(MakoDescriptorSystem, EditInfoRuntimeMixin):
 
         module_data: a dict mapping Location -> json that was cached from the
             underlying modulestore
+
+        batch_definition_loads: whether to fetch the definitions of lazily loaded blocks in
+            batches (see :class:`.DefinitionBatchLoader`)
         """
         # needed by capa_problem (as runtime.filestore via this.resources_fs)
         if course_entry.course_key.course:
@@ -77,6 +82,10 @@ class CachingDescriptorSystem(MakoDescriptorSystem, EditInfoRuntimeMixin):
         self.course_id = course_entry.course_key
         self.lazy = lazy
         self.module_data = module_data
+        if batch_definition_loads:
+            self.definition_batch_loader = DefinitionBatchLoader(modulestore, course_entry.course_key)
+        else:
+            self.definition_batch_loader = None
         self.default_class = default_class
         self.local_modules = {}
         self._services['library_tools'] = LibraryToolsService(modulestore)
@@ -90,6 +99,19 @@ class CachingDescriptorSystem(MakoDescriptorSystem, EditInfoRuntimeMixin):
                 parent_map[child] = block_key
         return parent_map
 
+    def _get_inherited_settings(self, block_key):
+        """
+        Return a dict mapping the inheritable settings set on the ancestors of ``block_key`` to
+        the json value set on the nearest one, or None if they have to be found by walking up
+        the tree.
+        """
+        inherited_settings = self.modulestore.get_inherited_settings(
+            self.course_entry.course_key, self.course_entry.structure
+        )
+        if inherited_settings is None:
+            return None
+        return inherited_settings.get(block_key)
+
     @contract(usage_key="BlockUsageLocator | BlockKey", course_entry_override="CourseEnvelope | None")
     def _load_item(self, usage_key, course_entry_override=None, **kwargs):
         """
@@ -188,6 +210,7 @@ class CachingDescriptorSystem(MakoDescriptorSystem, EditInfoRuntimeMixin):
                 block_key.type,
                 definition_id,
                 convert_fields,
+                batch_loader=self.definition_batch_loader,
             )
         else:
             definition_loader = None
@@ -219,7 +242,7 @@ class CachingDescriptorSystem(MakoDescriptorSystem, EditInfoRuntimeMixin):
             )
 
             if InheritanceMixin in self.modulestore.xblock_mixins:
-                field_data = inheriting_field_data(kvs)
+                field_data = inheriting_field_data(kvs, partial(self._get_inherited_settings, block_key))
             else:
                 field_data = KvsFieldData(kvs)
 
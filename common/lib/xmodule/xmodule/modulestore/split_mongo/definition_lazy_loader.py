@@ -9,24 +9,94 @@ class DefinitionLazyLoader(object):
     object doesn't force access during init but waits until client wants the
     definition. Only works if the modulestore is a split mongo store.
     """
-    def __init__(self, modulestore, course_key, block_type, definition_id, field_converter):
+    def __init__(self, modulestore, course_key, block_type, definition_id, field_converter, batch_loader=None):
         """
         Simple placeholder for yet-to-be-fetched data
         :param modulestore: the pymongo db connection with the definitions
         :param definition_locator: the id of the record in the above to fetch
+        :param batch_loader: an optional DefinitionBatchLoader to fetch the definition with
         """
         self.modulestore = modulestore
         self.course_key = course_key
         self.definition_locator = DefinitionLocator(block_type, definition_id)
         self.field_converter = field_converter
+        self.batch_loader = batch_loader
+        if batch_loader is not None:
+            batch_loader.add(definition_id)
 
     def fetch(self):
         """
         Fetch the definition. Note, the caller should replace this lazy
         loader pointer with the result so as not to fetch more than once
         """
+        definition = None
+        if self.batch_loader is not None:
+            definition = self.batch_loader.get(self.definition_locator.definition_id)
+        if definition is None:
+            definition = self.modulestore.get_definition(self.course_key, self.definition_locator.definition_id)
         # get_definition may return a cached value perhaps from another course or code path
         # so, we copy the result here so that updates don't cross-pollinate nor change the cached
         # value in such a way that we can't tell that the definition's been updated.
-        definition = self.modulestore.get_definition(self.course_key, self.definition_locator.definition_id)
         return copy.deepcopy(definition)
+
+
+class DefinitionBatchLoader(object):
+    """
+    Fetches the definitions of the blocks of a runtime in batches, rather than
+    one query per block.
+
+    The lazy loaders of the blocks register their definitions as they're created.
+    When one of them is first fetched, it's fetched in one query along with the
+    other pending definitions (up to MAX_BATCH_SIZE of them), as the blocks loaded
+    together are usually used together. A whole subtree can also be fetched up
+    front by ``prefetch``.
+    """
+    # the maximum number of definitions fetched in one query when a definition is fetched
+    MAX_BATCH_SIZE = 100
+
+    def __init__(self, modulestore, course_key):
+        """
+        :param modulestore: the split modulestore with the definitions
+        :param course_key: the course the definitions are loaded for (to respect bulk operations)
+        """
+        self.modulestore = modulestore
+        self.course_key = course_key
+        self._pending = set()
+        self._loaded = {}
+
+    def add(self, definition_id):
+        """
+        Register a definition which will likely be fetched.
+        """
+        if definition_id not in self._loaded:
+            self._pending.add(definition_id)
+
+    def prefetch(self, definition_ids):
+        """
+        Fetch all the given definitions which haven't been fetched yet, in one query.
+        """
+        self._load(set(definition_ids).difference(self._loaded))
+
+    def get(self, definition_id):
+        """
+        Return the definition with id ``definition_id``, fetching it along with
+        pending definitions if it hasn't been fetched yet. Returns None if the
+        definition wasn't found.
+        """
+        if definition_id not in self._loaded:
+            self._pending.discard(definition_id)
+            batch = [definition_id]
+            while self._pending and len(batch) < self.MAX_BATCH_SIZE:
+                batch.append(self._pending.pop())
+            self._load(batch)
+        return self._loaded.get(definition_id)
+
+    def _load(self, definition_ids):
+        """
+        Fetch the definitions with the given ids in one query.
+        """
+        if not definition_ids:
+            return
+        for definition in self.modulestore.get_definitions(self.course_key, definition_ids):
+            self._loaded[definition['_id']] = definition
+        self._pending.difference_update(definition_ids)
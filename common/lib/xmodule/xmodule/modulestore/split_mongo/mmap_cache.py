@@ -0,0 +1,95 @@
+"""
+A django cache backend for caching split modulestore structures in memory mapped
+files, shared by all the processes on a host.
+
+To use it for the structures of split courses, configure the 'course_structure_cache'
+with it, and a LOCATION on a memory backed filesystem, e.g.::
+
+    CACHES['course_structure_cache'] = {
+        'BACKEND': 'xmodule.modulestore.split_mongo.mmap_cache.MmapCache',
+        'LOCATION': '/dev/shm/edx_course_structure_cache',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+"""
+import cPickle as pickle
+import errno
+import io
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class MmapCache(FileBasedCache):
+    """
+    A file based cache which reads values by memory mapping their files.
+
+    Each value is stored in its own file, after a header holding its expiry time and
+    whether it's stored as is (strings, e.g. structures encoded by a structure codec)
+    or pickled (anything else). Strings are returned as read-only buffers over the
+    pages of their files, which all the processes on the host share, so they're
+    decoded without being copied into each process. The callers of the cache must
+    accept buffers in place of strings, as :class:`.CourseStructureCache` does.
+    Files are written whole and then renamed into place, so processes never read
+    partly written values.
+    """
+    cache_suffix = '.mmcache'
+
+    # expiry time (0 if never), and whether the value is pickled
+    HEADER = struct.Struct('!d?')
+
+    def get(self, key, default=None, version=None):
+        fname = self._key_to_file(key, version)
+        try:
+            with io.open(fname, 'rb') as cache_file:
+                mapped = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError) as error:
+            if error.errno == errno.ENOENT:
+                return default
+            raise
+        except ValueError:
+            # an empty file can't be mapped
+            return default
+
+        expiry, pickled = self.HEADER.unpack_from(mapped)
+        if expiry and expiry < time.time():
+            mapped.close()
+            self._delete(fname)
+            return default
+        if not pickled:
+            # the map is closed once the buffer is no longer referenced
+            return buffer(mapped, self.HEADER.size)
+        try:
+            return pickle.loads(mapped[self.HEADER.size:])
+        finally:
+            mapped.close()
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        pickled = not isinstance(value, str)
+        if pickled:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expiry = self.get_backend_timeout(timeout)
+        header = self.HEADER.pack(0 if expiry is None else expiry, pickled)
+
+        self._createdir()  # Cache dir can be deleted at any time.
+        self._cull()  # make some room if necessary
+        fname = self._key_to_file(key, version)
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        renamed = False
+        try:
+            with io.open(fd, 'wb') as cache_file:
+                cache_file.write(header)
+                cache_file.write(value)
+            os.rename(tmp_path, fname)
+            renamed = True
+        finally:
+            if not renamed:
+                os.remove(tmp_path)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
@@ -8,7 +8,9 @@ import zlib
 import pymongo
 import pytz
 import re
+from collections import OrderedDict
 from contextlib import contextmanager
+from threading import Lock
 from time import time
 
 # Import this just to export it
@@ -26,7 +28,9 @@ from contracts import check, new_contract
 from mongodb_proxy import autoretry_read
 from xmodule.exceptions import HeartbeatFailure
 from xmodule.modulestore import BlockData
+from xmodule.modulestore.profiler import SPLIT, profiled
 from xmodule.modulestore.split_mongo import BlockKey
+from xmodule.modulestore.split_mongo.structure_codec import STRUCTURE_CODECS, PickleStructureCodec, codec_of
 from xmodule.mongo_utils import connect_to_mongodb, create_collection_index
 
 
@@ -113,7 +117,7 @@ class QueryTimer(object):
         self._sample_rate = sample_rate
 
     @contextmanager
-    def timer(self, metric_name, course_context):
+    def timer(self, metric_name, course_context, query=None):
         """
         Contextmanager which acts as a timer for the metric ``metric_name``,
         but which also yields a :class:`Tagger` object that allows the timed block
@@ -121,16 +125,22 @@ class QueryTimer(object):
         timer output. Measurements are recorded as histogram measurements in their own,
         and also as bucketed tags on the timer measurement.
 
+        The timed block is also recorded by the modulestore profiler, if one is started.
+
         Arguments:
             metric_name: The name used to aggregate all of these metrics.
             course_context: The course which the query is being made for.
+            query: What the query asks for (e.g. the id of a structure), which the profiler
+                uses to find repeated queries. It isn't added to the metrics.
         """
         tagger = Tagger(self._sample_rate)
+        profiled_call = profiled(SPLIT, metric_name, query, course_context)
         metric_name = "{}.{}".format(self._metric_base, metric_name)
 
         start = time()
         try:
-            yield tagger
+            with profiled_call:
+                yield tagger
         finally:
             end = time()
             tags = tagger.tags
@@ -226,13 +236,16 @@ def structure_to_mongo(structure, course_context=None):
 class CourseStructureCache(object):
     """
     Wrapper around django cache object to cache course structure objects.
-    The course structures are pickled and compressed when cached.
+    The course structures are encoded (by default, pickled and compressed) when cached,
+    by one of the codecs in :data:`.STRUCTURE_CODECS`. Cached structures are decoded
+    by the codec which encoded them, whichever codec is used for new ones.
 
     If the 'course_structure_cache' doesn't exist, then don't do anything for
     for set and get.
     """
-    def __init__(self):
+    def __init__(self, codec_name=PickleStructureCodec.name):
         self.cache = None
+        self.codec = STRUCTURE_CODECS[codec_name]
         if DJANGO_AVAILABLE:
             try:
                 self.cache = get_cache('course_structure_cache')
@@ -240,41 +253,160 @@ class CourseStructureCache(object):
                 pass
 
     def get(self, key, course_context=None):
-        """Pull the compressed, pickled struct data from cache and deserialize."""
+        """Pull the encoded struct data from cache and decode it."""
         if self.cache is None:
             return None
 
-        with TIMER.timer("CourseStructureCache.get", course_context) as tagger:
-            compressed_pickled_data = self.cache.get(key)
-            tagger.tag(from_cache=str(compressed_pickled_data is not None).lower())
+        with TIMER.timer("CourseStructureCache.get", course_context, key) as tagger:
+            encoded_data = self.cache.get(key)
+            tagger.tag(from_cache=str(encoded_data is not None).lower())
 
-            if compressed_pickled_data is None:
+            if encoded_data is None:
                 # Always log cache misses, because they are unexpected
                 tagger.sample_rate = 1
                 return None
 
-            tagger.measure('compressed_size', len(compressed_pickled_data))
-
-            pickled_data = zlib.decompress(compressed_pickled_data)
-            tagger.measure('uncompressed_size', len(pickled_data))
+            codec = codec_of(encoded_data)
+            tagger.tag(codec=codec.name)
+            tagger.measure('compressed_size', len(encoded_data))
 
-            return pickle.loads(pickled_data)
+            return codec.decode(encoded_data)
 
     def set(self, key, structure, course_context=None):
-        """Given a structure, will pickle, compress, and write to cache."""
+        """Given a structure, will encode and write to cache."""
         if self.cache is None:
             return None
 
         with TIMER.timer("CourseStructureCache.set", course_context) as tagger:
-            pickled_data = pickle.dumps(structure, pickle.HIGHEST_PROTOCOL)
-            tagger.measure('uncompressed_size', len(pickled_data))
-
-            # 1 = Fastest (slightly larger results)
-            compressed_pickled_data = zlib.compress(pickled_data, 1)
-            tagger.measure('compressed_size', len(compressed_pickled_data))
+            tagger.tag(codec=self.codec.name)
+            encoded_data = self.codec.encode(structure)
+            tagger.measure('compressed_size', len(encoded_data))
 
             # Stuctures are immutable, so we set a timeout of "never"
-            self.cache.set(key, compressed_pickled_data, None)
+            self.cache.set(key, encoded_data, None)
+
+
+class DefinitionCache(object):
+    """
+    Cache of split definitions, keyed by definition id.
+
+    Definitions are never changed once they're saved (editing a block saves a new
+    definition), so they can be cached for as long as there's room for them. There are
+    two levels of caching:
+
+    * an in-process LRU cache holding at most ``max_size`` bytes of pickled definitions
+      (disabled if ``max_size`` is 0), and
+    * the 'definition_cache' django cache, if it's configured, which holds the pickled
+      definitions compressed, like :class:`CourseStructureCache`.
+
+    Definitions are stored pickled, so every lookup returns a new copy which the caller
+    is free to change.
+    """
+    def __init__(self, max_size=0):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+        self.cache = None
+        if DJANGO_AVAILABLE:
+            try:
+                self.cache = get_cache('definition_cache')
+            except InvalidCacheBackendError:
+                pass
+
+    @property
+    def enabled(self):
+        """
+        Whether either level of caching is enabled.
+        """
+        return self.max_size > 0 or self.cache is not None
+
+    @staticmethod
+    def _cache_key(definition_id):
+        """
+        Return the key of the definition with id ``definition_id`` in the django cache.
+        """
+        return 'split_definition.{}'.format(definition_id)
+
+    def get(self, definition_id, course_context=None):
+        """
+        Return the definition whose id is ``definition_id``, or None if it isn't cached.
+        """
+        return self.get_many([definition_id], course_context).get(definition_id)
+
+    def get_many(self, definition_ids, course_context=None):
+        """
+        Return a dict mapping those of ``definition_ids`` which are cached to their definitions.
+        """
+        if not self.enabled:
+            return {}
+
+        with TIMER.timer("DefinitionCache.get_many", course_context, definition_ids) as tagger:
+            tagger.measure('requested', len(definition_ids))
+            definitions = {}
+            missing_ids = []
+            with self._lock:
+                for definition_id in definition_ids:
+                    pickled_data = self._entries.pop(unicode(definition_id), None)
+                    if pickled_data is None:
+                        missing_ids.append(definition_id)
+                    else:
+                        self._entries[unicode(definition_id)] = pickled_data
+                        definitions[definition_id] = pickle.loads(pickled_data)
+            tagger.measure('from_process', len(definitions))
+
+            if missing_ids and self.cache is not None:
+                cached_data = self.cache.get_many([self._cache_key(definition_id) for definition_id in missing_ids])
+                tagger.measure('from_cache', len(cached_data))
+                for definition_id in missing_ids:
+                    compressed_pickled_data = cached_data.get(self._cache_key(definition_id))
+                    if compressed_pickled_data is not None:
+                        pickled_data = zlib.decompress(compressed_pickled_data)
+                        self._add(unicode(definition_id), pickled_data)
+                        definitions[definition_id] = pickle.loads(pickled_data)
+
+            return definitions
+
+    def set_many(self, definitions, course_context=None):
+        """
+        Cache each of ``definitions``.
+        """
+        if not self.enabled:
+            return
+
+        with TIMER.timer("DefinitionCache.set_many", course_context) as tagger:
+            tagger.measure('definitions', len(definitions))
+            to_cache = {}
+            for definition in definitions:
+                pickled_data = pickle.dumps(definition, pickle.HIGHEST_PROTOCOL)
+                self._add(unicode(definition['_id']), pickled_data)
+                if self.cache is not None:
+                    # 1 = Fastest (slightly larger results)
+                    to_cache[self._cache_key(definition['_id'])] = zlib.compress(pickled_data, 1)
+
+            if to_cache:
+                # Definitions are immutable, so we set a timeout of "never"
+                self.cache.set_many(to_cache, None)
+
+    def _add(self, key, pickled_data):
+        """
+        Add ``pickled_data`` to the in-process cache, evicting the least recently used
+        definitions until it fits in ``max_size``.
+        """
+        size = len(pickled_data)
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            while self._size + size > self.max_size:
+                __, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+            self._entries[key] = pickled_data
+            self._size += size
 
 
 class MongoConnection(object):
@@ -283,10 +415,15 @@ class MongoConnection(object):
     """
     def __init__(
         self, db, collection, host, port=27017, tz_aware=True, user=None, password=None,
-        asset_collection=None, retry_wait_time=0.1, **kwargs
+        asset_collection=None, retry_wait_time=0.1, definition_cache_size=0,
+        structure_cache_codec=PickleStructureCodec.name, **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        ``definition_cache_size`` is the number of bytes of definitions to cache in this process.
+        ``structure_cache_codec`` is the name of the codec used to cache structures (see
+        :class:`CourseStructureCache`).
         """
         # Set a write concern of 1, which makes writes complete successfully to the primary
         # only before returning. Also makes pymongo report write errors.
@@ -302,6 +439,9 @@ class MongoConnection(object):
         self.structures = self.database[collection + '.structures']
         self.definitions = self.database[collection + '.definitions']
 
+        self.definition_cache = DefinitionCache(definition_cache_size)
+        self.structure_cache_codec = structure_cache_codec
+
     def heartbeat(self):
         """
         Check that the db is reachable.
@@ -317,8 +457,8 @@ class MongoConnection(object):
 
         This method will use a cached version of the structure if it is availble.
         """
-        with TIMER.timer("get_structure", course_context) as tagger_get_structure:
-            cache = CourseStructureCache()
+        with TIMER.timer("get_structure", course_context, key) as tagger_get_structure:
+            cache = CourseStructureCache(self.structure_cache_codec)
 
             structure = cache.get(key, course_context)
             tagger_get_structure.tag(from_cache=str(bool(structure)).lower())
@@ -326,7 +466,7 @@ class MongoConnection(object):
                 # Always log cache misses, because they are unexpected
                 tagger_get_structure.sample_rate = 1
 
-                with TIMER.timer("get_structure.find_one", course_context) as tagger_find_one:
+                with TIMER.timer("get_structure.find_one", course_context, key) as tagger_find_one:
                     doc = self.structures.find_one({'_id': key})
                     tagger_find_one.measure("blocks", len(doc['blocks']))
                     structure = structure_from_mongo(doc, course_context)
@@ -344,7 +484,7 @@ class MongoConnection(object):
         Arguments:
             ids (list): A list of structure ids
         """
-        with TIMER.timer("find_structures_by_id", course_context) as tagger:
+        with TIMER.timer("find_structures_by_id", course_context, ids) as tagger:
             tagger.measure("requested_ids", len(ids))
             docs = [
                 structure_from_mongo(structure, course_context)
@@ -361,7 +501,7 @@ class MongoConnection(object):
         Arguments:
             ids (list): A list of structure ids
         """
-        with TIMER.timer("find_course_blocks_by_id", course_context) as tagger:
+        with TIMER.timer("find_course_blocks_by_id", course_context, ids) as tagger:
             tagger.measure("requested_ids", len(ids))
             docs = [
                 structure_from_mongo(structure, course_context)
@@ -381,7 +521,7 @@ class MongoConnection(object):
         Arguments:
             ids (list): A list of structure ids
         """
-        with TIMER.timer("find_structures_derived_from", course_context) as tagger:
+        with TIMER.timer("find_structures_derived_from", course_context, ids) as tagger:
             tagger.measure("base_ids", len(ids))
             docs = [
                 structure_from_mongo(structure, course_context)
@@ -399,7 +539,7 @@ class MongoConnection(object):
             original_version (str or ObjectID): The id of a structure
             block_key (BlockKey): The id of the block in question
         """
-        with TIMER.timer("find_ancestor_structures", course_context) as tagger:
+        with TIMER.timer("find_ancestor_structures", course_context, (original_version, block_key)) as tagger:
             docs = [
                 structure_from_mongo(structure, course_context)
                 for structure in self.structures.find({
@@ -430,7 +570,7 @@ class MongoConnection(object):
         """
         Get the course_index from the persistence mechanism whose id is the given key
         """
-        with TIMER.timer("get_course_index", key):
+        with TIMER.timer("get_course_index", key, key):
             if ignore_case:
                 query = {
                     key_attr: re.compile(u'^{}$'.format(re.escape(getattr(key, key_attr))), re.IGNORECASE)
@@ -513,9 +653,16 @@ class MongoConnection(object):
     def get_definition(self, key, course_context=None):
         """
         Get the definition from the persistence mechanism whose id is the given key
+
+        This method will use a cached version of the definition if it is available.
         """
-        with TIMER.timer("get_definition", course_context) as tagger:
-            definition = self.definitions.find_one({'_id': key})
+        with TIMER.timer("get_definition", course_context, key) as tagger:
+            definition = self.definition_cache.get(key, course_context)
+            tagger.tag(from_cache=str(definition is not None).lower())
+            if definition is None:
+                definition = self.definitions.find_one({'_id': key})
+                if definition is not None:
+                    self.definition_cache.set_many([definition], course_context)
             tagger.measure("fields", len(definition['fields']))
             tagger.tag(block_type=definition['block_type'])
             return definition
@@ -523,11 +670,27 @@ class MongoConnection(object):
     def get_definitions(self, definitions, course_context=None):
         """
         Retrieve all definitions listed in `definitions`.
+
+        Only the definitions which aren't cached are queried for, all in one query.
         """
-        with TIMER.timer("get_definitions", course_context) as tagger:
+        with TIMER.timer("get_definitions", course_context, definitions) as tagger:
             tagger.measure('definitions', len(definitions))
-            definitions = self.definitions.find({'_id': {'$in': definitions}})
-            return definitions
+            cached = self.definition_cache.get_many(definitions, course_context)
+            tagger.measure('from_cache', len(cached))
+            result = cached.values()
+            missing_ids = [definition_id for definition_id in definitions if definition_id not in cached]
+            if missing_ids:
+                from_db = list(self.definitions.find({'_id': {'$in': missing_ids}}))
+                self.definition_cache.set_many(from_db, course_context)
+                result.extend(from_db)
+            return result
+
+    def prefetch_definitions(self, definitions, course_context=None):
+        """
+        Cache all the definitions listed in `definitions` which aren't cached yet, in one query.
+        """
+        if self.definition_cache.enabled:
+            self.get_definitions(list(set(definitions)), course_context)
 
     def insert_definition(self, definition, course_context=None):
         """
@@ -537,6 +700,7 @@ class MongoConnection(object):
             tagger.measure('fields', len(definition['fields']))
             tagger.tag(block_type=definition['block_type'])
             self.definitions.insert(definition)
+            self.definition_cache.set_many([definition], course_context)
 
     def ensure_indexes(self):
         """
@@ -83,9 +83,12 @@ from ..exceptions import ItemNotFoundError
 from .caching_descriptor_system import CachingDescriptorSystem
 from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection, DuplicateKeyError
 from xmodule.modulestore.split_mongo import BlockKey, CourseEnvelope
+from xmodule.modulestore.split_mongo.structure_codec import PickleStructureCodec
+from xmodule.modulestore.split_mongo.structure_index import StructureIndex
 from xmodule.modulestore.store_utilities import DETACHED_XBLOCK_TYPES
 from xmodule.error_module import ErrorDescriptor
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from threading import Lock
 from types import NoneType
 from xmodule.assetstore import AssetMetadata
 
@@ -341,6 +344,7 @@ class SplitBulkWriteMixin(BulkOperationsMixin):
         (no data will be written to the database if a bulk operation is active.)
         """
         self._clear_cache(structure['_id'])
+        self._clear_structure_index(structure['_id'])
         bulk_write_record = self._get_bulk_ops_record(course_key)
         if bulk_write_record.active:
             bulk_write_record.structures[structure['_id']] = structure
@@ -649,20 +653,35 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
     # It won't recompute the value on operations such as update_course_index (e.g., to revert to a prev
     # version) but those functions will have an optional arg for setting these.
     SEARCH_TARGET_DICT = ['wiki_slug']
+    # the number of structures whose StructureIndexes are kept in memory
+    STRUCTURE_INDEX_CACHE_SIZE = 20
 
     def __init__(self, contentstore, doc_store_config, fs_root, render_template,
                  default_class=None,
                  error_tracker=null_error_tracker,
                  i18n_service=None, fs_service=None, user_service=None,
-                 services=None, signal_handler=None, **kwargs):
+                 services=None, signal_handler=None, definition_cache_size=0,
+                 structure_cache_codec=PickleStructureCodec.name, batch_definition_loads=False, **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param definition_cache_size: the number of bytes of definitions to cache in this process
+            (see :class:`.DefinitionCache`).
+        :param structure_cache_codec: the name of the codec used to cache structures
+            (see :class:`.CourseStructureCache`).
+        :param batch_definition_loads: whether to fetch the definitions of lazily loaded blocks in
+            batches, and those of the subtrees loaded to a given depth up front
+            (see :class:`.DefinitionBatchLoader`).
         """
 
         super(SplitMongoModuleStore, self).__init__(contentstore, **kwargs)
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        self.db_connection = MongoConnection(
+            definition_cache_size=definition_cache_size,
+            structure_cache_codec=structure_cache_codec,
+            **doc_store_config
+        )
         self.db = self.db_connection.database
+        self.batch_definition_loads = batch_definition_loads
 
         if default_class is not None:
             module_path, __, class_name = default_class.rpartition('.')
@@ -688,6 +707,9 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
 
         self.signal_handler = signal_handler
 
+        self._structure_indexes = OrderedDict()
+        self._structure_indexes_lock = Lock()
+
     def close_connections(self):
         """
         Closes any open connections to the underlying databases
@@ -755,6 +777,14 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
                         # convert_fields gets done later in the runtime's xblock_from_json
                         block.fields.update(definition.get('fields'))
                         block.definition_loaded = True
+            elif depth is not None:
+                # Lazy loading of a bounded subtree: if definitions are cached, warm the cache
+                # with the subtree's definitions in one query, so that loading them later
+                # doesn't take a query per block.
+                self.db_connection.prefetch_definitions(
+                    [block.definition for block in new_module_data.itervalues()],
+                    course_key
+                )
 
             system.module_data.update(new_module_data)
             return system.module_data
@@ -765,7 +795,8 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
         Load & cache the given blocks from the course. May return the blocks in any order.
 
         Load the definitions into each block if lazy is in kwargs and is False;
-        otherwise, do not load the definitions - they'll be loaded later when needed.
+        otherwise, do not load the definitions - they'll be loaded later when needed (in one
+        query for the blocks out to depth, if definition loads are batched).
         """
         runtime = self._get_cache(course_entry.structure['_id'])
         if runtime is None:
@@ -774,8 +805,24 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
             self._add_cache(course_entry.structure['_id'], runtime)
             self.cache_items(runtime, block_keys, course_entry.course_key, depth, lazy)
 
+        if runtime.lazy and runtime.definition_batch_loader is not None and depth:
+            self._prefetch_definitions(runtime, block_keys, depth)
+
         return [runtime.load_item(block_key, course_entry, **kwargs) for block_key in block_keys]
 
+    def _prefetch_definitions(self, runtime, block_keys, depth):
+        """
+        Fetch the definitions of the blocks out to ``depth`` below ``block_keys`` in one query,
+        rather than one query per block as each block's content is first used.
+        """
+        subtree = {}
+        for block_key in block_keys:
+            subtree = self.descendants(runtime.course_entry.structure['blocks'], block_key, depth, subtree)
+        runtime.definition_batch_loader.prefetch(
+            block.definition for block in subtree.itervalues()
+            if block.definition is not None and not block.definition_loaded
+        )
+
     def _get_cache(self, course_version_guid):
         """
         Find the descriptor cache for this course if it exists
@@ -812,6 +859,50 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
         else:
             self.request_cache.data['course_cache'] = {}
 
+    def _get_structure_index(self, course_key, structure):
+        """
+        Return the StructureIndex for this structure.
+
+        Structures in the db never change, so their indexes are kept (for the last
+        STRUCTURE_INDEX_CACHE_SIZE structures used) and shared. A structure which may
+        still be edited in an active bulk operation gets a new index each time.
+        """
+        bulk_write_record = self._get_bulk_ops_record(course_key)
+        if bulk_write_record.active and structure['_id'] not in bulk_write_record.structures_in_db:
+            return StructureIndex()
+
+        with self._structure_indexes_lock:
+            index = self._structure_indexes.pop(structure['_id'], None)
+            if index is None:
+                index = StructureIndex()
+            self._structure_indexes[structure['_id']] = index
+            while len(self._structure_indexes) > self.STRUCTURE_INDEX_CACHE_SIZE:
+                self._structure_indexes.popitem(last=False)
+        return index
+
+    def get_inherited_settings(self, course_key, structure):
+        """
+        Return a dict mapping the keys of the structure's blocks to the inheritable settings
+        they inherit (see :meth:`.StructureIndex.inherited_settings`), computed once per
+        structure version.
+
+        Returns None if the structure has been changed in an active bulk operation on
+        course_key, because its blocks may still be changed in memory, so inherited values
+        have to be read from the parent blocks.
+        """
+        bulk_write_record = self._get_bulk_ops_record(course_key)
+        if bulk_write_record.active and structure['_id'] not in bulk_write_record.structures_in_db:
+            return None
+        structure_index = self._get_structure_index(course_key, structure)
+        return structure_index.inherited_settings(structure, inheritance.InheritanceMixin.fields.keys())
+
+    def _clear_structure_index(self, structure_id):
+        """
+        Forget the kept StructureIndex for the structure with this id, if any.
+        """
+        with self._structure_indexes_lock:
+            self._structure_indexes.pop(structure_id, None)
+
     def _lookup_course(self, course_key, head_validation=True):
         """
         Decode the locator into the right series of db access. Does not
@@ -1204,21 +1295,18 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
         if 'children' in qualifiers:
             settings['children'] = qualifiers.pop('children')
 
-        # No need of these caches unless include_orphans is set to False
-        path_cache = None
-        parents_cache = None
+        structure_index = self._get_structure_index(course_locator, course.structure)
+        block_keys = self._find_candidate_block_keys(structure_index, course.structure, qualifiers, settings)
+        blocks = course.structure['blocks']
 
+        reachable_from_root = None
         if not include_orphans:
-            path_cache = {}
-            parents_cache = self.build_block_key_to_parents_mapping(course.structure)
+            reachable_from_root = structure_index.reachable_from_root(course.structure)
 
-        for block_id, value in course.structure['blocks'].iteritems():
-            if _block_matches_all(value):
+        for block_id in block_keys:
+            if _block_matches_all(blocks[block_id]):
                 if not include_orphans:
-                    if (  # pylint: disable=bad-continuation
-                        block_id.type in DETACHED_XBLOCK_TYPES or
-                        self.has_path_to_root(block_id, course, path_cache, parents_cache)
-                    ):
+                    if block_id.type in DETACHED_XBLOCK_TYPES or block_id in reachable_from_root:
                         items.append(block_id)
                 else:
                     items.append(block_id)
@@ -1228,6 +1316,33 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
         else:
             return []
 
+    def _find_candidate_block_keys(self, structure_index, structure, qualifiers, settings):
+        """
+        Use the structure's indexes to narrow down the blocks which may match the
+        ``block_type`` qualifier and the settings criteria of get_items.
+
+        Returns a collection of block keys including all the matching blocks (but maybe
+        others too), or all the block keys if none of the criteria can be looked up.
+        """
+        candidates = None
+
+        block_type_values = StructureIndex.lookup_values(qualifiers.get('block_type'))
+        if 'block_type' in qualifiers and block_type_values is not None:
+            candidates = set()
+            for block_type in block_type_values:
+                candidates.update(structure_index.block_keys_of_type(structure, block_type))
+
+        for field_name, criteria in settings.iteritems():
+            setting_values = StructureIndex.lookup_values(criteria)
+            if setting_values is None:
+                continue
+            setting_candidates = set()
+            for value in setting_values:
+                setting_candidates.update(structure_index.block_keys_with_setting(structure, field_name, value))
+            candidates = setting_candidates if candidates is None else candidates & setting_candidates
+
+        return structure['blocks'].viewkeys() if candidates is None else candidates
+
     def build_block_key_to_parents_mapping(self, structure):
         """
         Given a structure, builds block_key to parents mapping for all block keys in structure
@@ -1248,6 +1363,9 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
         """
         Check recursively if an xblock has a path to the course root
 
+        Without ``path_cache`` and ``parents_cache``, this uses the structure's kept set of
+        blocks reachable from the root instead of recursing.
+
         :param block_key: BlockKey of the component whose path is to be checked
         :param course: actual db json of course from structures
         :param path_cache: a dictionary that records which modules have a path to the root so that we don't have to
@@ -1257,6 +1375,9 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
 
         :return Bool: whether or not component has path to the root
         """
+        if path_cache is None and parents_cache is None:
+            structure_index = self._get_structure_index(course.course_key, course.structure)
+            return block_key in structure_index.reachable_from_root(course.structure)
 
         if path_cache and block_key in path_cache:
             return path_cache[block_key]
@@ -1264,7 +1385,7 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
         if parents_cache is None:
             xblock_parents = self._get_parents_from_structure(block_key, course.structure)
         else:
-            xblock_parents = parents_cache[block_key]
+            xblock_parents = parents_cache.get(block_key, [])
 
         if len(xblock_parents) == 0 and block_key.type in ["course", "library"]:
             # Found, xblock has the path to the root
@@ -1296,14 +1417,16 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
             raise ItemNotFoundError(locator)
 
         course = self._lookup_course(locator.course_key)
-        all_parent_ids = self._get_parents_from_structure(BlockKey.from_usage_key(locator), course.structure)
+        structure_index = self._get_structure_index(locator.course_key, course.structure)
+        all_parent_ids = structure_index.parents(course.structure).get(BlockKey.from_usage_key(locator), [])
 
         # Check and verify the found parent_ids are not orphans; Remove parent which has no valid path
         # to the course root
+        reachable_from_root = structure_index.reachable_from_root(course.structure)
         parent_ids = [
             valid_parent
             for valid_parent in all_parent_ids
-            if self.has_path_to_root(valid_parent, course)
+            if valid_parent in reachable_from_root
         ]
 
         if len(parent_ids) == 0:
@@ -3295,6 +3418,7 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
             course_entry=course_entry,
             module_data={},
             lazy=lazy,
+            batch_definition_loads=self.batch_definition_loads,
             default_class=self.default_class,
             error_tracker=self.error_tracker,
             render_template=self.render_template,
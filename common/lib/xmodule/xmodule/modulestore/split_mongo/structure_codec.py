@@ -0,0 +1,236 @@
+"""
+Codecs which encode split modulestore structures for :class:`.CourseStructureCache`.
+
+Encoded structures may be decoded from strings or from buffers (e.g. over the memory
+mapped files of :class:`.MmapCache`), without being copied.
+"""
+import cPickle as pickle
+import logging
+import zlib
+from itertools import izip
+
+from bson.objectid import ObjectId
+
+from xmodule.modulestore import BlockData
+from xmodule.modulestore.split_mongo import BlockKey
+
+log = logging.getLogger(__name__)
+
+
+class PickleStructureCodec(object):
+    """
+    Encodes structures by pickling and compressing them.
+    """
+    name = 'pickle'
+
+    def encode(self, structure):
+        """
+        Return ``structure`` encoded as a string.
+        """
+        # 1 = Fastest (slightly larger results)
+        return zlib.compress(pickle.dumps(structure, pickle.HIGHEST_PROTOCOL), 1)
+
+    def decode(self, data):
+        """
+        Return the structure encoded in ``data``.
+        """
+        return pickle.loads(zlib.decompress(data))
+
+
+class BinaryStructureCodec(object):
+    """
+    Encodes structures in a compact, column oriented layout, which is faster to
+    encode and decode than pickling the graph of BlockData, EditInfo and BlockKey
+    objects:
+
+    * each attribute of the blocks is stored as its own column of plain values,
+    * block types and edit info values (versions, users, dates) are stored once each,
+      and referred to by index,
+    * children are stored as indexes of blocks rather than as BlockKeys, and
+    * definition ids are stored as their 12 bytes.
+
+    Encoded structures start with MAGIC and the VERSION of the layout they're in.
+    Only structures in the current VERSION can be decoded.
+
+    Edit info which isn't stored in the db (the subtree edit info) isn't encoded.
+    """
+    name = 'binary'
+
+    MAGIC = 'SSC'
+    VERSION = 1
+
+    EDIT_INFO_ATTRS = (
+        'previous_version', 'update_version', 'source_version', 'edited_on', 'edited_by',
+        'original_usage', 'original_usage_version',
+    )
+
+    def encode(self, structure):
+        """
+        Return ``structure`` encoded as a string.
+        """
+        blocks = structure['blocks']
+        block_keys = list(blocks)
+        block_indexes = {block_key: index for index, block_key in enumerate(block_keys)}
+        other_keys = []
+        types = _InternTable()
+        values = _InternTable()
+
+        def key_index(block_key):
+            """
+            Return the index of ``block_key``, or a negative index into ``other_keys``
+            if it isn't the key of one of the blocks.
+            """
+            index = block_indexes.get(block_key)
+            if index is None:
+                other_keys.append(tuple(block_key))
+                index = -len(other_keys)
+            return index
+
+        fields_column = []
+        children_column = []
+        definitions = []
+        edit_info_columns = tuple([] for __ in self.EDIT_INFO_ATTRS)
+        for block_key in block_keys:
+            block_data = blocks[block_key]
+            fields = block_data.fields
+            if 'children' in fields:
+                children_column.append([key_index(child) for child in fields['children']])
+                fields = dict(fields)
+                del fields['children']
+            else:
+                children_column.append(None)
+            fields_column.append(fields)
+            definitions.append(block_data.definition)
+            edit_info = block_data.edit_info
+            for attr, column in izip(self.EDIT_INFO_ATTRS, edit_info_columns):
+                column.append(values.index(getattr(edit_info, attr)))
+
+        block_types = [types.index(block_key.type) for block_key in block_keys]
+        data_block_types = [types.index(blocks[block_key].block_type) for block_key in block_keys]
+        columns = {
+            'structure': {key: value for key, value in structure.iteritems() if key not in ('blocks', 'root')},
+            'root': key_index(structure['root']),
+            'types': types.values,
+            'block_types': block_types,
+            'block_ids': [block_key.id for block_key in block_keys],
+            'data_block_types': data_block_types,
+            'fields': fields_column,
+            'children': children_column,
+            'defaults': [blocks[block_key].defaults or None for block_key in block_keys],
+            'definitions': _pack_ids(definitions),
+            'values': values.values,
+            'edit_info': edit_info_columns,
+            'other_keys': other_keys,
+        }
+        # 1 = Fastest (slightly larger results)
+        payload = zlib.compress(pickle.dumps(columns, pickle.HIGHEST_PROTOCOL), 1)
+        return self.MAGIC + chr(self.VERSION) + payload
+
+    def decode(self, data):
+        """
+        Return the structure encoded in ``data``, or None if it's encoded in another
+        version of the layout.
+        """
+        version = ord(data[len(self.MAGIC)])
+        if version != self.VERSION:
+            log.info("Can't decode a structure encoded in version %d of the binary layout.", version)
+            return None
+
+        columns = pickle.loads(zlib.decompress(buffer(data, len(self.MAGIC) + 1)))
+        types = columns['types']
+        values = columns['values']
+        block_keys = [
+            BlockKey(types[type_index], block_id)
+            for type_index, block_id in izip(columns['block_types'], columns['block_ids'])
+        ]
+        other_keys = [BlockKey(*block_key) for block_key in columns['other_keys']]
+
+        def block_key_at(index):
+            """
+            Return the block key at ``index`` (see ``key_index`` in encode).
+            """
+            return block_keys[index] if index >= 0 else other_keys[-1 - index]
+
+        blocks = {}
+        block_data_columns = izip(
+            block_keys, columns['data_block_types'], columns['fields'], columns['children'],
+            columns['defaults'], _unpack_ids(columns['definitions']), izip(*columns['edit_info']),
+        )
+        for block_key, type_index, fields, children, defaults, definition, edit_info in block_data_columns:
+            if children is not None:
+                fields['children'] = [block_key_at(index) for index in children]
+            blocks[block_key] = BlockData(
+                fields=fields,
+                block_type=types[type_index],
+                definition=definition,
+                defaults=defaults or {},
+                edit_info={
+                    attr: values[index]
+                    for attr, index in izip(self.EDIT_INFO_ATTRS, edit_info)
+                },
+            )
+
+        structure = columns['structure']
+        structure['root'] = block_key_at(columns['root'])
+        structure['blocks'] = blocks
+        return structure
+
+
+class _InternTable(object):
+    """
+    A list of distinct values, each stored once, and referred to by index.
+    """
+    def __init__(self):
+        self.values = []
+        self._indexes = {}
+
+    def index(self, value):
+        """
+        Return the index of ``value``, adding it if needed.
+        """
+        # Values of different types may be equal (e.g. 1 and True), so the type is part of the key
+        key = (type(value), value)
+        try:
+            index = self._indexes.get(key)
+        except TypeError:
+            # unhashable values are stored each time
+            self.values.append(value)
+            return len(self.values) - 1
+        if index is None:
+            index = self._indexes[key] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def _pack_ids(ids):
+    """
+    Return ``ids`` packed as the concatenation of their bytes if they're all ObjectIds,
+    or else as they are.
+    """
+    if all(isinstance(id_, ObjectId) for id_ in ids):
+        return ''.join(id_.binary for id_ in ids)
+    return ids
+
+
+def _unpack_ids(packed_ids):
+    """
+    Return the list of ids packed by ``_pack_ids``.
+    """
+    if isinstance(packed_ids, list):
+        return packed_ids
+    return [ObjectId(packed_ids[start:start + 12]) for start in xrange(0, len(packed_ids), 12)]
+
+
+STRUCTURE_CODECS = {
+    codec.name: codec
+    for codec in (PickleStructureCodec(), BinaryStructureCodec())
+}
+
+
+def codec_of(data):
+    """
+    Return the codec which encoded ``data``.
+    """
+    if data[:len(BinaryStructureCodec.MAGIC)] == BinaryStructureCodec.MAGIC:
+        return STRUCTURE_CODECS[BinaryStructureCodec.name]
+    return STRUCTURE_CODECS[PickleStructureCodec.name]
@@ -0,0 +1,175 @@
+"""
+Secondary indexes over the blocks of split modulestore structures.
+"""
+import re
+from collections import defaultdict
+
+
+class StructureIndex(object):
+    """
+    Indexes of the blocks of one structure, each built the first time it's needed.
+
+    A structure stored in the database never changes, so its index can be kept and
+    reused for as long as that structure version is in use. The index doesn't keep a
+    reference to the structure: it's passed to each lookup, and must be the structure
+    (or a copy of the structure) the index was first used with.
+    """
+    def __init__(self):
+        self._block_keys_by_type = None
+        self._parents = None
+        self._reachable_from_root = None
+        self._inherited_settings = None
+        self._block_keys_by_setting = {}
+
+    @classmethod
+    def lookup_values(cls, criteria):
+        """
+        Return the values to look up in an index to find the blocks whose field matches
+        ``criteria`` (as in ModuleStoreRead._value_matches), or None if it can't be
+        looked up (e.g. a regex or a function).
+        """
+        if isinstance(criteria, dict):
+            if criteria.keys() != ['$in']:
+                return None
+            values = set()
+            for value in criteria['$in']:
+                value = cls.lookup_values(value)
+                if value is None:
+                    return None
+                values.update(value)
+            return values
+        if callable(criteria) or isinstance(criteria, re._pattern_type):  # pylint: disable=protected-access
+            return None
+        try:
+            hash(criteria)
+        except TypeError:
+            return None
+        return {criteria}
+
+    def block_keys_of_type(self, structure, block_type):
+        """
+        Return the set of keys of the blocks of ``block_type``.
+        """
+        if self._block_keys_by_type is None:
+            block_keys_by_type = defaultdict(set)
+            for block_key in structure['blocks']:
+                block_keys_by_type[block_key.type].add(block_key)
+            self._block_keys_by_type = dict(block_keys_by_type)
+        return self._block_keys_by_type.get(block_type, frozenset())
+
+    def block_keys_with_setting(self, structure, field_name, value):
+        """
+        Return the set of keys of the blocks whose ``field_name`` settings field is set to ``value``,
+        or to a list containing ``value``.
+        """
+        if field_name not in self._block_keys_by_setting:
+            block_keys_by_value = defaultdict(set)
+            for block_key, block_data in structure['blocks'].iteritems():
+                if field_name in block_data.fields:
+                    for field_value in self._indexed_values(block_data.fields[field_name]):
+                        block_keys_by_value[field_value].add(block_key)
+            self._block_keys_by_setting[field_name] = dict(block_keys_by_value)
+        return self._block_keys_by_setting[field_name].get(value, frozenset())
+
+    def parents(self, structure):
+        """
+        Return a dict mapping the keys of blocks to the list of keys of their parents.
+
+        Blocks without parents aren't in the dict.
+        """
+        if self._parents is None:
+            parents = defaultdict(list)
+            for parent_key, block_data in structure['blocks'].iteritems():
+                for child_key in block_data.fields.get('children', []):
+                    parents[child_key].append(parent_key)
+            self._parents = dict(parents)
+        return self._parents
+
+    def reachable_from_root(self, structure):
+        """
+        Return the set of keys of the blocks which have a path to the root, i.e. that
+        descend from a course or library block without parents (or are one).
+        """
+        if self._reachable_from_root is None:
+            parents = self.parents(structure)
+            stack = [
+                block_key for block_key in structure['blocks']
+                if block_key.type in ('course', 'library') and block_key not in parents
+            ]
+            reachable = set(stack)
+            while stack:
+                block_data = structure['blocks'].get(stack.pop())
+                if block_data is None:
+                    continue
+                for child_key in block_data.fields.get('children', []):
+                    if child_key not in reachable:
+                        reachable.add(child_key)
+                        stack.append(child_key)
+            self._reachable_from_root = frozenset(reachable)
+        return self._reachable_from_root
+
+    def inherited_settings(self, structure, inheritable_names):
+        """
+        Return a dict mapping the keys of blocks to a dict of the ``inheritable_names``
+        settings set on their ancestors, each mapped to the value set on the nearest one.
+
+        A block's ancestors are found by following its last parent (as the split runtime does).
+        Every block of the structure is in the dict. The dicts of settings are shared between
+        blocks, so mustn't be changed.
+        """
+        if self._inherited_settings is None:
+            parents = self.parents(structure)
+            blocks = structure['blocks']
+            inherited_settings = {}
+            passed_down_settings = {}
+
+            def _passed_down(parent_key):
+                """
+                Return the settings ``parent_key`` passes down to its children.
+                """
+                if parent_key not in passed_down_settings:
+                    passed_down = inherited_settings[parent_key]
+                    parent_fields = blocks[parent_key].fields
+                    set_names = [name for name in inheritable_names if name in parent_fields]
+                    if set_names:
+                        passed_down = dict(passed_down)
+                        for name in set_names:
+                            passed_down[name] = parent_fields[name]
+                    passed_down_settings[parent_key] = passed_down
+                return passed_down_settings[parent_key]
+
+            for block_key in blocks:
+                # find the nearest ancestor whose settings are already resolved
+                lineage = []
+                ancestor_key = block_key
+                while ancestor_key not in inherited_settings:
+                    lineage.append(ancestor_key)
+                    ancestor_parents = parents.get(ancestor_key)
+                    if not ancestor_parents or ancestor_parents[-1] in lineage:
+                        inherited_settings[ancestor_key] = {}
+                        lineage.pop()
+                        break
+                    ancestor_key = ancestor_parents[-1]
+                # and resolve the settings of its descendants down to this block
+                for descendant_key in reversed(lineage):
+                    inherited_settings[descendant_key] = _passed_down(parents[descendant_key][-1])
+
+            self._inherited_settings = inherited_settings
+        return self._inherited_settings
+
+    @classmethod
+    def _indexed_values(cls, field_value):
+        """
+        Yield the hashable values which ``field_value`` matches: itself, or if it's a list, its elements.
+        """
+        if isinstance(field_value, list):
+            for element in field_value:
+                for value in cls._indexed_values(element):
+                    yield value
+        else:
+            try:
+                hash(field_value)
+            except TypeError:
+                # Unhashable values other than lists (e.g. dicts) aren't equal to any hashable criteria.
+                return
+            yield field_value
@@ -39,9 +39,10 @@ from nose.tools import assert_in
 from xmodule.exceptions import NotFoundError
 from git.test.lib.asserts import assert_not_none
 from xmodule.x_module import XModuleMixin
-from xmodule.modulestore.mongo.base import as_draft
+from xmodule.modulestore.mongo.base import as_draft, as_published
 from xmodule.modulestore.tests.mongo_connection import MONGO_PORT_NUM, MONGO_HOST
-from xmodule.modulestore.tests.utils import LocationMixin, mock_tab_from_json
+from xmodule.modulestore.tests.factories import check_exact_number_of_calls
+from xmodule.modulestore.tests.utils import LocationMixin, MemoryCache, mock_tab_from_json
 from xmodule.modulestore.edit_info import EditInfoMixin
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.inheritance import InheritanceMixin
@@ -689,6 +690,83 @@ class TestMongoModuleStore(TestMongoModuleStoreBase):
         # Clean up the data so we don't break other tests which apparently expect a particular state
         self.draft_store.delete_course(course.id, self.dummy_user)
 
+    def test_incremental_inheritance_refresh(self):
+        """
+        Test that updating an item patches the cached metadata inheritance tree for its subtree,
+        to the same tree as recomputing it.
+        """
+        store = self.draft_store
+        self.addCleanup(
+            setattr, store, 'metadata_inheritance_cache_subsystem', store.metadata_inheritance_cache_subsystem
+        )
+        self.addCleanup(setattr, store, 'incremental_inheritance_refresh', store.incremental_inheritance_refresh)
+        store.metadata_inheritance_cache_subsystem = MemoryCache()
+        store.incremental_inheritance_refresh = True
+
+        course = store.create_course("TestX", "Inheritance", "2015", self.dummy_user)
+        self.addCleanup(store.delete_course, course.id, self.dummy_user)
+        chapter = store.create_child(self.dummy_user, course.location, 'chapter')
+        sequential = store.create_child(self.dummy_user, chapter.location, 'sequential')
+        html = store.create_child(self.dummy_user, sequential.location, 'html')
+
+        chapter = store.get_item(chapter.location)
+        chapter.visible_to_staff_only = True
+        with check_exact_number_of_calls(store, '_compute_metadata_inheritance_tree', 0):
+            store.update_item(chapter, self.dummy_user)
+
+        tree = store._get_cached_metadata_inheritance_tree(course.id)  # pylint: disable=protected-access
+        self.assertTrue(tree[unicode(as_published(html.location))]['visible_to_staff_only'])
+        self.assertEqual(tree, store._compute_metadata_inheritance_tree(course.id))  # pylint: disable=protected-access
+
+        # removing the sequential drops its subtree from the tree
+        chapter = store.get_item(chapter.location)
+        chapter.children = []
+        with check_exact_number_of_calls(store, '_compute_metadata_inheritance_tree', 0):
+            store.update_item(chapter, self.dummy_user)
+
+        tree = store._get_cached_metadata_inheritance_tree(course.id)  # pylint: disable=protected-access
+        self.assertNotIn(unicode(as_published(sequential.location)), tree)
+        self.assertNotIn(unicode(as_published(html.location)), tree)
+        self.assertEqual(tree, store._compute_metadata_inheritance_tree(course.id))  # pylint: disable=protected-access
+
+    def test_incremental_inheritance_refresh_conflict(self):
+        """
+        Test that the cached metadata inheritance tree is recomputed rather than patched if it's
+        written while being patched.
+        """
+        store = self.draft_store
+        self.addCleanup(
+            setattr, store, 'metadata_inheritance_cache_subsystem', store.metadata_inheritance_cache_subsystem
+        )
+        self.addCleanup(setattr, store, 'incremental_inheritance_refresh', store.incremental_inheritance_refresh)
+        store.metadata_inheritance_cache_subsystem = MemoryCache()
+        store.incremental_inheritance_refresh = True
+
+        course = store.create_course("TestX", "InheritanceConflict", "2015", self.dummy_user)
+        self.addCleanup(store.delete_course, course.id, self.dummy_user)
+        chapter = store.create_child(self.dummy_user, course.location, 'chapter')
+        store.create_child(self.dummy_user, chapter.location, 'sequential')
+
+        find_records = store._find_inheritance_records_at  # pylint: disable=protected-access
+        written = []
+
+        def find_records_and_write_tree(*args):
+            """
+            Find the records, after another process writes the tree (once).
+            """
+            if not written:
+                written.append(True)
+                store._get_cached_metadata_inheritance_tree(  # pylint: disable=protected-access
+                    course.id, force_refresh=True
+                )
+            return find_records(*args)
+
+        chapter = store.get_item(chapter.location)
+        chapter.visible_to_staff_only = True
+        with patch.object(store, '_find_inheritance_records_at', side_effect=find_records_and_write_tree):
+            with check_exact_number_of_calls(store, '_compute_metadata_inheritance_tree', 2):
+                store.update_item(chapter, self.dummy_user)
+
     def test_make_course_usage_key(self):
         """Test that we get back the appropriate usage key for the root of a course key."""
         course_key = CourseLocator(org="edX", course="101", run="2015")
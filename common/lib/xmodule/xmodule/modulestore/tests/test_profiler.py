@@ -0,0 +1,111 @@
+"""
+Tests for the modulestore profiler.
+"""
+import unittest
+
+from opaque_keys.edx.locator import CourseLocator
+
+from xmodule.modulestore.profiler import (
+    MODULESTORE, MONGO, SPLIT, ModuleStoreProfiler, get_profiler, profile_call, profile_modulestore, profiled
+)
+from xmodule.modulestore.split_mongo.mongo_connection import TIMER
+
+
+class ProfiledStore(object):
+    """
+    A store with a profiled entry point.
+    """
+    @profile_call
+    def get_item(self, usage_key, depth=0):
+        """
+        Return the item, after querying for it.
+        """
+        with profiled(MONGO, 'find_one', usage_key, usage_key.course_key):
+            return depth
+
+
+class TestModuleStoreProfiler(unittest.TestCase):
+    """
+    Tests for the ModuleStoreProfiler.
+    """
+    def setUp(self):
+        super(TestModuleStoreProfiler, self).setUp()
+        self.course_key = CourseLocator('org', 'course', 'run')
+        self.usage_keys = [self.course_key.make_usage_key('html', 'html{}'.format(index)) for index in range(10)]
+        self.store = ProfiledStore()
+
+    def test_not_profiling(self):
+        self.assertIsNone(get_profiler())
+        self.assertEqual(self.store.get_item(self.usage_keys[0], depth=1), 1)
+        with profiled(MONGO, 'find_one') as call:
+            self.assertIsNone(call)
+
+    def test_profile_calls(self):
+        with profile_modulestore() as profiler:
+            self.assertIs(get_profiler(), profiler)
+            self.assertEqual(self.store.get_item(self.usage_keys[0], depth=1), 1)
+        self.assertIsNone(get_profiler())
+
+        call, query = profiler.calls
+        self.assertEqual((call.kind, call.name, call.depth), (MODULESTORE, 'get_item', 0))
+        self.assertEqual((query.kind, query.name, query.depth), (MONGO, 'find_one', 1))
+        for profiled_call in profiler.calls:
+            self.assertEqual(profiled_call.key, unicode(self.usage_keys[0]))
+            self.assertEqual(profiled_call.course, unicode(self.course_key))
+            self.assertIsNotNone(profiled_call.duration)
+        self.assertEqual(profiler.totals()[MODULESTORE][0], 1)
+        self.assertEqual(profiler.totals()[MONGO][0], 1)
+
+    def test_nested_profilers(self):
+        with profile_modulestore() as outer_profiler:
+            with profile_modulestore() as inner_profiler:
+                self.store.get_item(self.usage_keys[0])
+            self.assertIs(get_profiler(), outer_profiler)
+        self.assertEqual(outer_profiler.calls, [])
+        self.assertEqual(len(inner_profiler.calls), 2)
+
+    def test_repeated_reads(self):
+        with profile_modulestore() as profiler:
+            for __ in range(3):
+                self.store.get_item(self.usage_keys[0])
+            self.store.get_item(self.usage_keys[1])
+            with profiled(MONGO, 'update', self.usage_keys[2]):
+                pass
+            with profiled(MONGO, 'update', self.usage_keys[2]):
+                pass
+
+        repeated = [(call.kind, call.name, call.key, count) for call, count in profiler.repeated_reads()]
+        self.assertItemsEqual(repeated, [
+            (MODULESTORE, 'get_item', unicode(self.usage_keys[0]), 3),
+            (MONGO, 'find_one', unicode(self.usage_keys[0]), 3),
+        ])
+
+    def test_fanned_out_reads(self):
+        with profile_modulestore() as profiler:
+            for usage_key in self.usage_keys:
+                self.store.get_item(usage_key)
+        fanned_out = [(call.kind, call.name, count) for call, count in profiler.fanned_out_reads()]
+        self.assertItemsEqual(fanned_out, [(MODULESTORE, 'get_item', 10), (MONGO, 'find_one', 10)])
+        self.assertEqual(profiler.fanned_out_reads(minimum=11), [])
+        self.assertEqual(profiler.repeated_reads(), [])
+
+    def test_split_queries(self):
+        with profile_modulestore() as profiler:
+            with TIMER.timer('get_structure', self.course_key, 'structure_id'):
+                pass
+        call, = profiler.calls
+        self.assertEqual((call.kind, call.name, call.key), (SPLIT, 'get_structure', 'structure_id'))
+
+    def test_report(self):
+        profiler = ModuleStoreProfiler().start()
+        try:
+            for __ in range(2):
+                self.store.get_item(self.usage_keys[0])
+        finally:
+            profiler.stop()
+        report = profiler.report()
+        self.assertEqual(report['totals'][MODULESTORE]['count'], 2)
+        self.assertEqual(len(report['calls']), 4)
+        self.assertEqual([read['count'] for read in report['repeated_reads']], [2, 2])
+        self.assertEqual(report['fanned_out_reads'], [])
+        self.assertEqual(len(profiler.summary_lines()), 4)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the memory mapped file cache backend.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from xmodule.modulestore.split_mongo.mmap_cache import MmapCache
+
+
+class TestMmapCache(unittest.TestCase):
+    """
+    Tests for MmapCache
+    """
+    def setUp(self):
+        super(TestMmapCache, self).setUp()
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.cache = MmapCache(self.location, {'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3}})
+
+    def test_strings(self):
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+        self.cache.set('key', 'value\x00\xff', None)
+        value = self.cache.get('key')
+        self.assertIsInstance(value, buffer)
+        self.assertEqual(str(value), 'value\x00\xff')
+        self.assertTrue(self.cache.has_key('key'))
+
+    def test_other_values(self):
+        self.cache.set('key', {'a': [1, u'☃']}, None)
+        self.assertEqual(self.cache.get('key'), {'a': [1, u'☃']})
+        self.cache.set('key', u'unicode', None)
+        self.assertEqual(self.cache.get('key'), u'unicode')
+
+    def test_shared_between_instances(self):
+        self.cache.set('key', 'value', None)
+        self.assertEqual(str(MmapCache(self.location, {}).get('key')), 'value')
+
+    def test_expiry(self):
+        with patch('time.time', return_value=1000):
+            self.cache.set('key', 'value', 10)
+            self.cache.set('other_key', 'value', None)
+        with patch('time.time', return_value=1005):
+            self.assertEqual(str(self.cache.get('key')), 'value')
+        with patch('time.time', return_value=1011):
+            self.assertEqual(self.cache.get('key', 'default'), 'default')
+            self.assertEqual(str(self.cache.get('other_key')), 'value')
+        self.assertEqual(len(os.listdir(self.location)), 1)
+
+    def test_delete_and_clear(self):
+        self.cache.set('key', 'value', None)
+        self.cache.set('other_key', 'value', None)
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(str(self.cache.get('other_key')), 'value')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('other_key'))
+
+    def test_cull(self):
+        for index in range(4):
+            self.cache.set('key{}'.format(index), 'value', None)
+        self.assertEqual(len(os.listdir(self.location)), 3)
+        self.assertEqual(str(self.cache.get('key3')), 'value')
+
+    def test_empty_file(self):
+        open(self.cache._key_to_file('key'), 'w').close()  # pylint: disable=protected-access
+        self.assertIsNone(self.cache.get('key'))
@@ -16,7 +16,7 @@ from nose.plugins.attrib import attr
 from django.core.cache import caches, InvalidCacheBackendError
 
 from openedx.core.lib import tempdir
-from xblock.fields import Reference, ReferenceList, ReferenceValueDict
+from xblock.fields import Reference, ReferenceList, ReferenceValueDict, Scope
 from xmodule.course_module import CourseDescriptor
 from xmodule.modulestore import ModuleStoreEnum
 from xmodule.modulestore.exceptions import (
@@ -32,6 +32,7 @@ from xmodule.fields import Date, Timedelta
 from xmodule.modulestore.split_mongo.split import SplitMongoModuleStore
 from xmodule.modulestore.tests.test_modulestore import check_has_course_method
 from xmodule.modulestore.split_mongo import BlockKey
+from xmodule.modulestore.split_mongo.structure_codec import BinaryStructureCodec, PickleStructureCodec
 from xmodule.modulestore.tests.factories import check_mongo_calls
 from xmodule.modulestore.tests.mongo_connection import MONGO_PORT_NUM, MONGO_HOST
 from xmodule.modulestore.tests.utils import mock_tab_from_json
@@ -992,6 +993,25 @@ class TestCourseStructureCache(SplitModuleTest):
         # now make sure that you get the same structure
         self.assertEqual(cached_structure, not_cached_structure)
 
+    @patch('xmodule.modulestore.split_mongo.mongo_connection.get_cache')
+    def test_course_structure_cache_codecs(self, mock_get_cache):
+        mock_get_cache.return_value = self.cache
+        store = modulestore()
+        self.addCleanup(
+            setattr, store.db_connection, 'structure_cache_codec', store.db_connection.structure_cache_codec
+        )
+
+        store.db_connection.structure_cache_codec = BinaryStructureCodec.name
+        with check_mongo_calls(1):
+            not_cached_structure = self._get_structure(self.new_course)
+
+        # structures cached by one codec are read whichever codec is used
+        store.db_connection.structure_cache_codec = PickleStructureCodec.name
+        with check_mongo_calls(0):
+            cached_structure = self._get_structure(self.new_course)
+
+        self.assertEqual(cached_structure, not_cached_structure)
+
     def _get_structure(self, course):
         """
         Helper function to get a structure from a course.
@@ -1109,6 +1129,35 @@ class SplitModuleItemTests(SplitModuleTest):
         with self.assertRaises(ItemNotFoundError):
             modulestore().get_item(course.location.for_branch(BRANCH_NAME_PUBLISHED))
 
+    @patch('xmodule.tabs.CourseTab.from_json', side_effect=mock_tab_from_json)
+    def test_get_item_prefetches_definitions(self, _from_json):
+        store = modulestore()
+        self.addCleanup(setattr, store, 'batch_definition_loads', store.batch_definition_loads)
+        store.batch_definition_loads = True
+        hero_locator = CourseLocator(org="testx", course="GreekHero", run="run", branch=BRANCH_NAME_DRAFT)
+        course = store.get_course(hero_locator, depth=2)
+
+        # the definitions of the blocks out to depth were fetched with the course
+        with check_mongo_calls(0):
+            for chapter in course.get_children():
+                chapter.get_explicitly_set_fields_by_scope(Scope.content)
+                for child in chapter.get_children():
+                    child.get_explicitly_set_fields_by_scope(Scope.content)
+
+    @patch('xmodule.tabs.CourseTab.from_json', side_effect=mock_tab_from_json)
+    def test_lazy_definition_loads_are_batched(self, _from_json):
+        store = modulestore()
+        self.addCleanup(setattr, store, 'batch_definition_loads', store.batch_definition_loads)
+        store.batch_definition_loads = True
+        hero_locator = CourseLocator(org="testx", course="GreekHero", run="run", branch=BRANCH_NAME_DRAFT)
+        chapters = store.get_course(hero_locator).get_children()
+        self.assertGreater(len(chapters), 1)
+
+        # the definitions of the loaded blocks are fetched together when the first is used
+        with check_mongo_calls(1):
+            for chapter in chapters:
+                chapter.get_explicitly_set_fields_by_scope(Scope.content)
+
     def test_get_non_root(self):
         # not a course obj
         locator = BlockUsageLocator(
@@ -1212,6 +1261,15 @@ class SplitModuleItemTests(SplitModuleTest):
         self.assertEqual(len(matches), 1)
         matches = modulestore().get_items(locator, settings={'group_access': {'$exists': False}})
         self.assertEqual(len(matches), 6)
+        matches = modulestore().get_items(locator, qualifiers={'category': {'$in': ['chapter', 'course']}})
+        self.assertEqual(len(matches), 4)
+        matches = modulestore().get_items(locator, qualifiers={'category': 'chapter'}, include_orphans=False)
+        self.assertEqual(len(matches), 3)
+        chapter = modulestore().get_items(locator, qualifiers={'name': 'chapter1'})[0]
+        matches = modulestore().get_items(
+            locator, settings={'display_name': chapter.display_name}, include_orphans=False
+        )
+        self.assertEqual([match.location for match in matches], [chapter.location])
 
     def test_get_parents(self):
         '''
@@ -2006,6 +2064,26 @@ class TestInheritance(SplitModuleTest):
         problem = modulestore().get_item(problem.location.version_agnostic())
         self.assertFalse(problem.visible_to_staff_only)
 
+    def test_inheritance_in_bulk_operation(self):
+        """
+        Test that inherited settings are looked up until the structure is changed in a bulk operation
+        """
+        store = modulestore()
+        course_key = CourseLocator(org='testx', course='GreekHero', run="run", branch=BRANCH_NAME_DRAFT)
+        with store.bulk_operations(course_key):
+            chapter = store.get_item(BlockUsageLocator(course_key, 'chapter', 'chapter3'))
+            problem = store.get_item(BlockUsageLocator(course_key, 'problem', 'problem3_2'))
+            structure = store._lookup_course(course_key).structure  # pylint: disable=protected-access
+            self.assertIsNotNone(store.get_inherited_settings(course_key, structure))
+            self.assertEqual(problem.graceperiod, datetime.timedelta(hours=2))
+
+            chapter.visible_to_staff_only = True
+            store.update_item(chapter, self.user_id)
+            structure = store._lookup_course(course_key).structure  # pylint: disable=protected-access
+            self.assertIsNone(store.get_inherited_settings(course_key, structure))
+            problem = store.get_item(problem.location.version_agnostic())
+            self.assertTrue(problem.visible_to_staff_only)
+
     def test_dynamic_inheritance(self):
         """
         Test inheritance for create_item with and without a parent pointer
@@ -1,7 +1,11 @@
 """ Test the behavior of split_mongo/MongoConnection """
+import cPickle as pickle
 import unittest
-from mock import patch
-from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection
+
+from bson.objectid import ObjectId
+from django.core.cache import InvalidCacheBackendError
+from mock import Mock, patch
+from xmodule.modulestore.split_mongo.mongo_connection import DefinitionCache, MongoConnection
 from xmodule.exceptions import HeartbeatFailure
 
 
@@ -17,3 +21,86 @@ class TestHeartbeatFailureException(unittest.TestCase):
 
             with self.assertRaises(HeartbeatFailure):
                 useless_conn.heartbeat()
+
+
+class DictCache(object):
+    """ A minimal stand-in for a django cache """
+    def __init__(self):
+        self.data = {}
+
+    def get_many(self, keys):
+        return {key: self.data[key] for key in keys if key in self.data}
+
+    def set_many(self, data, timeout):  # pylint: disable=unused-argument
+        self.data.update(data)
+
+
+@patch('xmodule.modulestore.split_mongo.mongo_connection.get_cache', side_effect=InvalidCacheBackendError)
+class TestDefinitionCache(unittest.TestCase):
+    """ Test the caching of definitions """
+    def setUp(self):
+        super(TestDefinitionCache, self).setUp()
+        self.definitions = [
+            {'_id': ObjectId(), 'block_type': 'html', 'fields': {'data': 'x' * 100}}
+            for __ in range(3)
+        ]
+        self.size = len(pickle.dumps(self.definitions[0], pickle.HIGHEST_PROTOCOL))
+
+    def test_disabled(self, _mock_get_cache):
+        cache = DefinitionCache()
+        self.assertFalse(cache.enabled)
+        cache.set_many(self.definitions)
+        self.assertEqual(cache.get_many([self.definitions[0]['_id']]), {})
+
+    def test_lru_eviction(self, _mock_get_cache):
+        cache = DefinitionCache(2 * self.size)
+        cache.set_many(self.definitions[:2])
+        # use the first definition so that the second is the least recently used
+        self.assertEqual(cache.get(self.definitions[0]['_id']), self.definitions[0])
+        cache.set_many(self.definitions[2:])
+        self.assertEqual(cache.get(self.definitions[0]['_id']), self.definitions[0])
+        self.assertIsNone(cache.get(self.definitions[1]['_id']))
+        self.assertEqual(cache.get(self.definitions[2]['_id']), self.definitions[2])
+
+    def test_too_large(self, _mock_get_cache):
+        cache = DefinitionCache(self.size - 1)
+        cache.set_many(self.definitions[:1])
+        self.assertIsNone(cache.get(self.definitions[0]['_id']))
+
+    def test_returns_copies(self, _mock_get_cache):
+        cache = DefinitionCache(10 * self.size)
+        cache.set_many(self.definitions[:1])
+        cache.get(self.definitions[0]['_id'])['fields']['data'] = 'changed'
+        self.assertEqual(cache.get(self.definitions[0]['_id']), self.definitions[0])
+
+    def test_django_cache(self, mock_get_cache):
+        mock_get_cache.side_effect = None
+        mock_get_cache.return_value = DictCache()
+        DefinitionCache().set_many(self.definitions)
+
+        # a new process cache is filled from the django cache
+        cache = DefinitionCache(10 * self.size)
+        ids = [definition['_id'] for definition in self.definitions]
+        self.assertEqual(cache.get_many(ids), dict(zip(ids, self.definitions)))
+        mock_get_cache.return_value.data.clear()
+        self.assertEqual(cache.get_many(ids), dict(zip(ids, self.definitions)))
+
+    @patch('pymongo.MongoClient')
+    @patch('pymongo.database.Database')
+    def test_get_definitions(self, *calls):
+        with patch('mongodb_proxy.MongoProxy'):
+            conn = MongoConnection('useless', 'useless', 'useless', definition_cache_size=10 * self.size)
+        conn.definitions = Mock()
+        conn.definitions.find.return_value = self.definitions[1:]
+        conn.definition_cache.set_many(self.definitions[:1])
+
+        ids = [definition['_id'] for definition in self.definitions]
+        self.assertItemsEqual(conn.get_definitions(ids), self.definitions)
+        # only the definitions that weren't cached are queried for
+        conn.definitions.find.assert_called_once_with({'_id': {'$in': ids[1:]}})
+
+        conn.definitions.find.reset_mock()
+        conn.prefetch_definitions(ids)
+        self.assertEqual(conn.get_definition(ids[2]), self.definitions[2])
+        self.assertFalse(conn.definitions.find.called)
+        self.assertFalse(conn.definitions.find_one.called)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the codecs used to cache split modulestore structures.
+"""
+import datetime
+import unittest
+
+import ddt
+from bson.objectid import ObjectId
+from pytz import UTC
+
+from xmodule.modulestore import BlockData
+from xmodule.modulestore.split_mongo import BlockKey
+from xmodule.modulestore.split_mongo.structure_codec import (
+    BinaryStructureCodec, PickleStructureCodec, STRUCTURE_CODECS, codec_of
+)
+
+
+@ddt.ddt
+class TestStructureCodecs(unittest.TestCase):
+    """
+    Tests for the structure codecs
+    """
+    def setUp(self):
+        super(TestStructureCodecs, self).setUp()
+        version = ObjectId()
+        edited_on = datetime.datetime(2015, 10, 1, tzinfo=UTC)
+        self.course = BlockKey('course', 'course')
+        self.chapter = BlockKey('chapter', 'chapter')
+        self.html = BlockKey('html', 'html')
+
+        def block_data(block_type, fields, **edit_info):
+            """
+            Return a BlockData of ``block_type``, with ``fields``.
+            """
+            edit_info.setdefault('update_version', version)
+            edit_info.setdefault('edited_on', edited_on)
+            edit_info.setdefault('edited_by', 42)
+            return BlockData(block_type=block_type, fields=fields, definition=ObjectId(), edit_info=edit_info)
+
+        self.structure = {
+            '_id': version,
+            'root': self.course,
+            'original_version': version,
+            'previous_version': None,
+            'edited_on': edited_on,
+            'edited_by': 42,
+            'schema_version': 1,
+            'blocks': {
+                self.course: block_data(
+                    'course', {'children': [self.chapter], 'display_name': u'Course', 'start': '2015-10-01'}
+                ),
+                # a child which isn't in the structure is kept
+                self.chapter: block_data('chapter', {'children': [self.html, BlockKey('html', 'missing')]}),
+                self.html: block_data(
+                    'html', {'display_name': u'HTML ☃', 'group_access': {1: [2]}},
+                    previous_version=ObjectId(), edited_by=u'42', original_usage=u'block-v1:a+b+c+type@html+block@x',
+                ),
+            },
+        }
+        self.structure['blocks'][self.html].defaults = {'display_name': u'Default'}
+
+    @ddt.data(*STRUCTURE_CODECS.values())
+    def test_round_trip(self, codec):
+        encoded = codec.encode(self.structure)
+        self.assertIs(codec_of(encoded), codec)
+        decoded = codec.decode(encoded)
+        self.assertEqual(decoded, self.structure)
+        self.assertEqual(decoded['blocks'][self.html].defaults, {'display_name': u'Default'})
+        self.assertEqual(decoded['blocks'][self.html].edit_info.edited_by, u'42')
+        self.assertIsInstance(decoded['blocks'][self.html].edit_info.edited_by, unicode)
+        self.assertIsInstance(decoded['root'], BlockKey)
+        for child in decoded['blocks'][self.chapter].fields['children']:
+            self.assertIsInstance(child, BlockKey)
+
+    @ddt.data(*STRUCTURE_CODECS.values())
+    def test_decode_buffer(self, codec):
+        encoded = buffer(codec.encode(self.structure))
+        self.assertIs(codec_of(encoded), codec)
+        self.assertEqual(codec.decode(encoded), self.structure)
+
+    def test_binary_encoding_is_smaller(self):
+        for index in range(100):
+            block_key = BlockKey('html', 'html{}'.format(index))
+            self.structure['blocks'][self.chapter].fields['children'].append(block_key)
+            self.structure['blocks'][block_key] = BlockData(
+                block_type='html', fields={'display_name': u'HTML'}, definition=ObjectId(),
+                edit_info=self.structure['blocks'][self.html].edit_info.to_storable(),
+            )
+        self.assertLess(
+            len(BinaryStructureCodec().encode(self.structure)),
+            len(PickleStructureCodec().encode(self.structure))
+        )
+
+    def test_binary_definitions_not_object_ids(self):
+        self.structure['blocks'][self.html].definition = None
+        codec = BinaryStructureCodec()
+        self.assertEqual(codec.decode(codec.encode(self.structure)), self.structure)
+
+    def test_binary_other_version(self):
+        codec = STRUCTURE_CODECS[BinaryStructureCodec.name]
+        encoded = codec.encode(self.structure)
+        encoded = encoded[:len(codec.MAGIC)] + chr(codec.VERSION + 1) + encoded[len(codec.MAGIC) + 1:]
+        self.assertIs(codec_of(encoded), codec)
+        self.assertIsNone(codec.decode(encoded))
@@ -0,0 +1,127 @@
+"""
+Tests for the secondary indexes over split modulestore structures.
+"""
+import re
+import unittest
+
+from xmodule.modulestore import BlockData
+from xmodule.modulestore.split_mongo import BlockKey
+from xmodule.modulestore.split_mongo.structure_index import StructureIndex
+
+
+class TestStructureIndex(unittest.TestCase):
+    """
+    Tests for StructureIndex
+    """
+    def setUp(self):
+        super(TestStructureIndex, self).setUp()
+        self.course = BlockKey('course', 'course')
+        self.chapter = BlockKey('chapter', 'chapter')
+        self.problem1 = BlockKey('problem', 'problem1')
+        self.problem2 = BlockKey('problem', 'problem2')
+        self.orphan = BlockKey('problem', 'orphan')
+        self.structure = {
+            '_id': 'structure',
+            'blocks': {
+                self.course: BlockData(block_type='course', fields={'children': [self.chapter]}),
+                self.chapter: BlockData(
+                    block_type='chapter', fields={'children': [self.problem1, self.problem2], 'graded': True}
+                ),
+                self.problem1: BlockData(
+                    block_type='problem', fields={'weight': 1, 'group_access': {1: [2]}, 'tags': ['a', ['b']]}
+                ),
+                self.problem2: BlockData(block_type='problem', fields={'weight': 2.0, 'tags': 'a'}),
+                self.orphan: BlockData(block_type='problem', fields={}),
+            },
+        }
+        self.index = StructureIndex()
+
+    def test_block_keys_of_type(self):
+        self.assertEqual(
+            self.index.block_keys_of_type(self.structure, 'problem'),
+            {self.problem1, self.problem2, self.orphan}
+        )
+        self.assertEqual(self.index.block_keys_of_type(self.structure, 'course'), {self.course})
+        self.assertEqual(self.index.block_keys_of_type(self.structure, 'html'), set())
+
+    def test_block_keys_with_setting(self):
+        self.assertEqual(self.index.block_keys_with_setting(self.structure, 'weight', 1), {self.problem1})
+        self.assertEqual(self.index.block_keys_with_setting(self.structure, 'weight', 2), {self.problem2})
+        # lists match any of their (nested) elements
+        self.assertEqual(
+            self.index.block_keys_with_setting(self.structure, 'tags', 'a'), {self.problem1, self.problem2}
+        )
+        self.assertEqual(self.index.block_keys_with_setting(self.structure, 'tags', 'b'), {self.problem1})
+        self.assertEqual(
+            self.index.block_keys_with_setting(self.structure, 'children', self.problem2), {self.chapter}
+        )
+        self.assertEqual(self.index.block_keys_with_setting(self.structure, 'graded', False), set())
+        self.assertEqual(self.index.block_keys_with_setting(self.structure, 'group_access', 1), set())
+
+    def test_parents(self):
+        parents = self.index.parents(self.structure)
+        self.assertEqual(parents[self.problem1], [self.chapter])
+        self.assertEqual(parents[self.chapter], [self.course])
+        self.assertNotIn(self.course, parents)
+        self.assertNotIn(self.orphan, parents)
+
+    def test_reachable_from_root(self):
+        self.structure['blocks'][self.orphan] = BlockData(block_type='problem', fields={'children': [self.problem1]})
+        self.assertEqual(
+            self.index.reachable_from_root(self.structure),
+            {self.course, self.chapter, self.problem1, self.problem2}
+        )
+
+    def test_reachable_from_library_root(self):
+        library = BlockKey('library', 'library')
+        self.structure['blocks'] = {
+            library: BlockData(block_type='library', fields={'children': [self.problem1]}),
+            self.problem1: BlockData(block_type='problem', fields={}),
+            self.orphan: BlockData(block_type='problem', fields={}),
+        }
+        self.assertEqual(self.index.reachable_from_root(self.structure), {library, self.problem1})
+
+    def test_inherited_settings(self):
+        self.structure['blocks'][self.course].fields['due'] = 'course due'
+        self.structure['blocks'][self.problem2].fields['children'] = [self.orphan]
+        self.structure['blocks'][self.problem2].fields['due'] = 'problem due'
+        inherited_settings = self.index.inherited_settings(self.structure, ['graded', 'due'])
+        self.assertEqual(inherited_settings[self.course], {})
+        self.assertEqual(inherited_settings[self.chapter], {'due': 'course due'})
+        self.assertEqual(inherited_settings[self.problem1], {'due': 'course due', 'graded': True})
+        self.assertEqual(inherited_settings[self.orphan], {'due': 'problem due', 'graded': True})
+
+    def test_inherited_settings_from_last_parent(self):
+        other_chapter = BlockKey('chapter', 'other_chapter')
+        self.structure['blocks'][other_chapter] = BlockData(
+            block_type='chapter', fields={'children': [self.problem1], 'graded': False}
+        )
+        parents = self.index.parents(self.structure)[self.problem1]
+        inherited_settings = self.index.inherited_settings(self.structure, ['graded'])
+        self.assertEqual(
+            inherited_settings[self.problem1],
+            {'graded': self.structure['blocks'][parents[-1]].fields['graded']}
+        )
+
+    def test_indexes_are_kept(self):
+        self.index.block_keys_of_type(self.structure, 'problem')
+        self.index.parents(self.structure)
+        self.index.reachable_from_root(self.structure)
+        self.index.inherited_settings(self.structure, ['graded'])
+        self.index.block_keys_with_setting(self.structure, 'weight', 1)
+        self.structure['blocks'].clear()
+        self.assertEqual(len(self.index.block_keys_of_type(self.structure, 'problem')), 3)
+        self.assertEqual(len(self.index.parents(self.structure)), 3)
+        self.assertEqual(len(self.index.reachable_from_root(self.structure)), 4)
+        self.assertEqual(self.index.inherited_settings(self.structure, ['graded'])[self.problem1], {'graded': True})
+        self.assertEqual(self.index.block_keys_with_setting(self.structure, 'weight', 1), {self.problem1})
+
+    def test_lookup_values(self):
+        self.assertEqual(StructureIndex.lookup_values('problem'), {'problem'})
+        self.assertEqual(StructureIndex.lookup_values({'$in': ['problem', 'html']}), {'problem', 'html'})
+        self.assertIsNone(StructureIndex.lookup_values(re.compile('prob')))
+        self.assertIsNone(StructureIndex.lookup_values(lambda value: True))
+        self.assertIsNone(StructureIndex.lookup_values({'$exists': True}))
+        self.assertIsNone(StructureIndex.lookup_values({'$nin': ['problem']}))
+        self.assertIsNone(StructureIndex.lookup_values({'$in': [re.compile('prob')]}))
+        self.assertIsNone(StructureIndex.lookup_values(['problem']))
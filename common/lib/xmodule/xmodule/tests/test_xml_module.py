@@ -132,6 +132,34 @@ class InheritingFieldDataTest(unittest.TestCase):
         child.parent = "parent"
         self.assertEqual(child.not_inherited, "nothing")
 
+    def test_inherited_settings_lookup(self):
+        # Given inherited settings are used instead of the parent's values.
+        inherited_settings = {'inherited': "Looked up!", 'not_inherited': "Looked up!"}
+        self.field_data.get_inherited_settings = lambda: inherited_settings
+        parent = self.get_a_block(usage_id="parent")
+        parent.inherited = "Changed!"
+
+        child = self.get_a_block(usage_id="child")
+        child.parent = "parent"
+        self.assertEqual(child.inherited, "Looked up!")
+        self.assertEqual(child.not_inherited, "nothing")
+
+        # Without a value for the field, the field's default is used.
+        inherited_settings.clear()
+        child = self.get_a_block(usage_id="other_child")
+        child.parent = "parent"
+        self.assertEqual(child.inherited, "the default")
+
+    def test_inherited_settings_lookup_unavailable(self):
+        # If inherited settings can't be looked up, the parent's value is used.
+        self.field_data.get_inherited_settings = lambda: None
+        parent = self.get_a_block(usage_id="parent")
+        parent.inherited = "Changed!"
+
+        child = self.get_a_block(usage_id="child")
+        child.parent = "parent"
+        self.assertEqual(child.inherited, "Changed!")
+
 
 class EditableMetadataFieldsTest(unittest.TestCase):
     def test_display_name_field(self):
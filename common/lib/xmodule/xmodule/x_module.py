@@ -4,6 +4,7 @@ import sys
 import time
 import yaml
 
+from contextlib import contextmanager
 from contracts import contract, new_contract
 from functools import partial
 from lxml import etree
@@ -1249,10 +1250,18 @@ class MetricsMixin(object):
     """
 
     def render(self, block, view_name, context=None):
+        with self._render_metrics(block, view_name):
+            return super(MetricsMixin, self).render(block, view_name, context=context)
+
+    @contextmanager
+    def _render_metrics(self, block, view_name):
+        """
+        Log the metrics of rendering the view ``view_name`` of ``block`` in the wrapped code block.
+        """
         start_time = time.time()
         try:
             status = "success"
-            return super(MetricsMixin, self).render(block, view_name, context=context)
+            yield
 
         except:
             status = "failure"
@@ -23,6 +23,7 @@ class BlocksAPITransformer(BlockStructureTransformer):
     """
 
     VERSION = 1
+    SUPPORTS_INCREMENTAL_COLLECT = True
     STUDENT_VIEW_DATA = 'student_view_data'
     STUDENT_VIEW_MULTI_DEVICE = 'student_view_multi_device'
 
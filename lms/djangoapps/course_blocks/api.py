@@ -2,7 +2,9 @@
 API entry point to the course_blocks app with top-level
 get_course_blocks and clear_course_from_cache functions.
 """
+from django.conf import settings
 from django.core.cache import cache
+from openedx.core.lib.block_structure.cache import BlockStructureLocalCache
 from openedx.core.lib.block_structure.manager import BlockStructureManager
 from openedx.core.lib.block_structure.transformers import BlockStructureTransformers
 from xmodule.modulestore.django import modulestore
@@ -79,13 +81,30 @@ def get_course_in_cache(course_key):
     return _get_block_structure_manager(course_key).get_collected()
 
 
+def get_course_if_in_cache(course_key):
+    """
+    A higher order function implemented on top of the
+    block_structure.get_collected_if_cached function that returns the
+    block structure in the cache for the given course_key, without
+    collecting it if it's not in the cache.
+
+    Returns:
+        BlockStructureBlockData - The collected block structure,
+            starting at root_block_usage_key, or None if it's not in
+            the cache or is outdated.
+    """
+    return _get_block_structure_manager(course_key).get_collected_if_cached()
+
+
 def update_course_in_cache(course_key):
     """
     A higher order function implemented on top of the
     block_structure.updated_collected function that updates the block
     structure in the cache for the given course_key.
     """
-    return _get_block_structure_manager(course_key).update_collected()
+    return _get_block_structure_manager(course_key).update_collected(
+        incremental=settings.FEATURES.get('ENABLE_INCREMENTAL_BLOCK_STRUCTURE_COLLECTION', False),
+    )
 
 
 def clear_course_from_cache(course_key):
@@ -108,7 +127,13 @@ def _get_block_structure_manager(course_key):
     """
     store = modulestore()
     course_usage_key = store.make_course_usage_key(course_key)
-    return BlockStructureManager(course_usage_key, store, _get_cache())
+    return BlockStructureManager(
+        course_usage_key,
+        store,
+        _get_cache(),
+        compact=settings.FEATURES.get('ENABLE_COMPACT_BLOCK_STRUCTURES', False),
+        local_cache=_get_local_cache(),
+    )
 
 
 def _get_cache():
@@ -116,3 +141,20 @@ def _get_cache():
     Returns the storage for caching Block Structures.
     """
     return cache
+
+
+_LOCAL_CACHE = None
+
+
+def _get_local_cache():
+    """
+    Returns the in-process storage for caching Block Structures, or None
+    if it is disabled.
+    """
+    global _LOCAL_CACHE  # pylint: disable=global-statement
+    max_size = getattr(settings, 'BLOCK_STRUCTURE_LOCAL_CACHE_SIZE', 0)
+    if not max_size:
+        return None
+    if _LOCAL_CACHE is None or _LOCAL_CACHE.max_size != max_size:
+        _LOCAL_CACHE = BlockStructureLocalCache(max_size)
+    return _LOCAL_CACHE
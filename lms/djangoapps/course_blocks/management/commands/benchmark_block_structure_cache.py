@@ -0,0 +1,103 @@
+"""
+Command to compare the serialization formats of cached course blocks.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+from openedx.core.lib.block_structure.cache import BlockStructureCache
+from openedx.core.lib.cache_utils import zpickle, zunpickle
+
+from ...api import get_course_in_cache
+
+
+class Command(BaseCommand):
+    """
+    Compares the size and (de)serialization times of the block structure
+    cache format against zpickling the entire structure, for courses
+    already in the modulestore (such as imported course exports).
+
+    Example usage:
+        $ ./manage.py lms benchmark_block_structure_cache 'edX/DemoX/Demo_Course' --settings=devstack
+    """
+    args = '<course_id course_id ...>'
+    help = 'Benchmarks the serialization of course blocks for one or more courses.'
+
+    def add_arguments(self, parser):
+        """
+        Entry point for subclassed commands to add custom arguments.
+        """
+        parser.add_argument(
+            '--iterations',
+            help='Number of times each operation is timed.',
+            type=int,
+            default=10,
+        )
+
+    def handle(self, *args, **options):
+        if len(args) < 1:
+            raise CommandError('At least one course must be specified.')
+        try:
+            course_keys = [CourseKey.from_string(arg) for arg in args]
+        except InvalidKeyError:
+            raise CommandError('Invalid key specified.')
+
+        iterations = options.get('iterations') or 10
+        for course_key in course_keys:
+            block_structure = get_course_in_cache(course_key)
+            for row in self._benchmark(block_structure, iterations):
+                self.stdout.write(u'{}\t{}\t{}\t{}\n'.format(unicode(course_key), *row))
+
+    def _benchmark(self, block_structure, iterations):
+        """
+        Returns a list of (format, measurement, value) tuples for the
+        given block structure.
+        """
+        root_block_usage_key = block_structure.root_block_usage_key
+        block_structure._load_block_data()  # pylint: disable=protected-access
+        legacy_data = (
+            block_structure._block_relations,  # pylint: disable=protected-access
+            block_structure._transformer_data,  # pylint: disable=protected-access
+            block_structure._block_data_map,  # pylint: disable=protected-access
+        )
+        zpickled = zpickle(legacy_data)
+        serialized = BlockStructureCache.serialize(block_structure)
+        transformer_names = block_structure._transformer_data.keys()  # pylint: disable=protected-access
+
+        def read_one_transformer():
+            """
+            Deserializes the structure and reads a single transformer's
+            data for all of its blocks, as a typical request would.
+            """
+            structure = BlockStructureCache.deserialize(root_block_usage_key, serialized)
+            if transformer_names:
+                structure._load_transformer_block_data(transformer_names[0])  # pylint: disable=protected-access
+
+        def timed(func):
+            """
+            Returns the formatted average time of calling func.
+            """
+            return '{:.2f} ms'.format(self._time(func, iterations))
+
+        return [
+            ('zpickle', 'size', '{} bytes'.format(len(zpickled))),
+            ('zpickle', 'serialize', timed(lambda: zpickle(legacy_data))),
+            ('zpickle', 'deserialize', timed(lambda: zunpickle(zpickled))),
+            ('sectioned', 'size', '{} bytes'.format(len(serialized))),
+            ('sectioned', 'serialize', timed(lambda: BlockStructureCache.serialize(block_structure))),
+            ('sectioned', 'deserialize', timed(
+                lambda: BlockStructureCache.deserialize(root_block_usage_key, serialized)
+            )),
+            ('sectioned', 'deserialize and load one transformer', timed(read_one_transformer)),
+        ]
+
+    @staticmethod
+    def _time(func, iterations):
+        """
+        Returns the average time in milliseconds of calling func.
+        """
+        start = time.time()
+        for _ in xrange(iterations):
+            func()
+        return (time.time() - start) * 1000 / iterations
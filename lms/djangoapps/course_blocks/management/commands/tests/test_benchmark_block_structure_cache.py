@@ -0,0 +1,33 @@
+"""
+Tests for benchmark_block_structure_cache management command.
+"""
+from StringIO import StringIO
+
+from django.core.management.base import CommandError
+
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+from .. import benchmark_block_structure_cache
+
+
+class TestBenchmarkBlockStructureCache(ModuleStoreTestCase):
+    """
+    Tests benchmark block structure cache management command.
+    """
+    def setUp(self):
+        super(TestBenchmarkBlockStructureCache, self).setUp()
+        self.course = CourseFactory.create()
+        ItemFactory.create(parent=self.course, category='chapter')
+        self.command = benchmark_block_structure_cache.Command()
+        self.command.stdout = StringIO()
+
+    def test_benchmark(self):
+        self.command.handle(unicode(self.course.id), iterations=1)
+        output = self.command.stdout.getvalue().splitlines()
+        self.assertEquals(len(output), 7)
+        for line in output:
+            self.assertTrue(line.startswith(unicode(self.course.id)))
+
+    def test_no_courses(self):
+        with self.assertRaises(CommandError):
+            self.command.handle()
@@ -1,6 +1,7 @@
 """
 Signal handlers for invalidating cached data.
 """
+from django.conf import settings
 from django.dispatch.dispatcher import receiver
 
 from xmodule.modulestore.django import SignalHandler
@@ -15,7 +16,10 @@ def _listen_for_course_publish(sender, course_key, **kwargs):  # pylint: disable
     Catches the signal that a course has been published in the module
     store and creates/updates the corresponding cache entry.
     """
-    clear_course_from_cache(course_key)
+    # When collecting incrementally, the cached structure is kept so
+    # that only its changed subtrees are recollected by the task.
+    if not settings.FEATURES.get('ENABLE_INCREMENTAL_BLOCK_STRUCTURE_COLLECTION', False):
+        clear_course_from_cache(course_key)
 
     # The countdown=0 kwarg ensures the call occurs after the signal emitter
     # has finished all operations.
@@ -18,6 +18,8 @@ class ContentLibraryTransformer(BlockStructureTransformer):
     Staff users are *not* exempted from library content pathways.
     """
     VERSION = 1
+    SUPPORTS_INCREMENTAL_COLLECT = True
+    INCREMENTAL_COLLECT_EXCLUDED_TYPES = ('library_content',)
 
     @classmethod
     def name(cls):
@@ -20,6 +20,8 @@ class SplitTestTransformer(BlockStructureTransformer):
     'group_access' fields.
     """
     VERSION = 1
+    SUPPORTS_INCREMENTAL_COLLECT = True
+    INCREMENTAL_COLLECT_EXCLUDED_TYPES = ('split_test',)
 
     @classmethod
     def name(cls):
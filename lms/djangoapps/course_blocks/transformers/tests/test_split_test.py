@@ -2,6 +2,7 @@
 Tests for SplitTestTransformer.
 """
 import ddt
+from mock import patch
 
 import openedx.core.djangoapps.user_api.course_tag.api as course_tag_api
 from openedx.core.djangoapps.user_api.partition_schemes import RandomUserPartitionScheme
@@ -9,9 +10,11 @@ from student.tests.factories import CourseEnrollmentFactory
 from xmodule.partitions.partitions import Group, UserPartition
 from xmodule.modulestore.tests.factories import check_mongo_calls, check_mongo_calls_range
 
-from ...api import get_course_blocks
+from openedx.core.lib.block_structure.block_structure import BlockStructureBlockData
+
+from ...api import get_course_blocks, get_course_in_cache, update_course_in_cache
 from ..user_partitions import UserPartitionTransformer, _get_user_partition_groups
-from .helpers import CourseStructureTestCase, create_location
+from .helpers import CourseStructureTestCase, create_location, publish_course, update_block
 
 
 @ddt.ddt
@@ -222,3 +225,30 @@ class SplitTestTransformerTestCase(CourseStructureTestCase):
             set(block_structure1.get_block_keys()),
             set(block_structure2.get_block_keys()),
         )
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_INCREMENTAL_BLOCK_STRUCTURE_COLLECTION': True})
+    def test_update_below_split_test(self):
+        course_tag_api.set_course_tag(
+            self.user,
+            self.course.id,
+            RandomUserPartitionScheme.key_for_partition(self.split_test_user_partition),
+            2,
+        )
+        get_course_in_cache(self.course.id)
+
+        # Edit a block below the BSplit split_test, whose other children
+        # are not part of the changed subtree's ancestors.
+        block_j = self.blocks['J']
+        block_j.display_name = 'Updated J'
+        update_block(block_j)
+        publish_course(self.course)
+
+        with patch.object(BlockStructureBlockData, '_update_subtrees') as mock_update_subtrees:
+            update_course_in_cache(self.course.id)
+        self.assertFalse(mock_update_subtrees.called)
+
+        block_structure = get_course_blocks(self.user, self.course.location, self.transformers)
+        self.assertEqual(
+            set(block_structure.get_block_keys()),
+            set(self.get_block_key_set(self.blocks, 'course', 'A', 'D', 'F', 'J', 'M', 'I')),
+        )
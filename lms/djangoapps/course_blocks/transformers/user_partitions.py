@@ -17,6 +17,10 @@ class UserPartitionTransformer(BlockStructureTransformer):
     Staff users are *not* exempted from user partition pathways.
     """
     VERSION = 1
+    SUPPORTS_INCREMENTAL_COLLECT = True
+    # The split test transformer's data is collected along with this
+    # transformer's.
+    INCREMENTAL_COLLECT_EXCLUDED_TYPES = SplitTestTransformer.INCREMENTAL_COLLECT_EXCLUDED_TYPES
 
     @classmethod
     def name(cls):
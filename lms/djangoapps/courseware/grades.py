@@ -1,16 +1,21 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
 
+import hashlib
 import json
 import logging
 import random
 from collections import defaultdict
+from datetime import datetime
 from functools import partial
+from itertools import islice
 
 import dogstats_wrapper as dog_stats_api
 from django.conf import settings
 from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.test.client import RequestFactory
+from django.utils.timezone import UTC
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 from opaque_keys.edx.locator import BlockUsageLocator
@@ -18,7 +23,8 @@ from opaque_keys.edx.locator import BlockUsageLocator
 from openedx.core.lib.gating import api as gating_api
 from courseware import courses
 from courseware.access import has_access
-from courseware.model_data import FieldDataCache, ScoresClient
+from courseware.access_utils import adjust_start_date
+from courseware.model_data import FieldDataCache, ScoresClient, descriptor_descendents, user_states_for_users
 from openedx.core.djangoapps.signals.signals import GRADES_UPDATED
 from student.models import anonymous_id_for_user
 from util.db import outer_atomic
@@ -27,7 +33,8 @@ from xmodule import graders
 from xmodule.graders import Score
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore.exceptions import ItemNotFoundError
-from .models import StudentModule
+from xmodule.split_test_module import get_split_user_partitions
+from .models import PersistentSubsectionGrade, StudentModule
 from .module_render import get_module_for_descriptor
 
 log = logging.getLogger("edx.courseware")
@@ -202,6 +209,52 @@ def field_data_cache_for_grading(course, user):
     )
 
 
+def descriptors_for_grading(course):
+    """
+    Return the list of descriptors in the course that might possibly affect
+    the grading process, i.e. those whose state field_data_cache_for_grading
+    loads.
+    """
+    descriptor_filter = partial(descriptor_affects_grading, course.block_types_affecting_grading)
+    return descriptor_descendents(course, depth=None, descriptor_filter=descriptor_filter)
+
+
+class GradingBatch(object):
+    """
+    Grading state shared by a batch of students that are graded together by
+    iterate_grades_for.
+
+    The descriptors affecting grading are only collected once for the whole
+    course, the max scores cache is shared, and the scores and states of every
+    student in the batch are each fetched from StudentModule with a single query.
+
+    The rest of a student's grading state is still loaded per student: the
+    FieldDataCache is scoped to a single user (it's seeded with the student's
+    states, but loads the other scopes itself), and the submissions API only
+    returns the scores of one student at a time, so _grade keeps calling
+    sub_api.get_scores once per student.
+    """
+    def __init__(self, course, descriptors, max_scores_cache, students):
+        self.course = course
+        self.descriptors = descriptors
+        self.max_scores_cache = max_scores_cache
+        student_ids = [student.id for student in students]
+        scorable_locations = set(descriptor.location for descriptor in descriptors if descriptor.has_score)
+        self._scores_clients = ScoresClient.create_for_users(course.id, student_ids, scorable_locations)
+        self._usage_keys = set(descriptor.scope_ids.usage_id for descriptor in descriptors)
+        self._user_states = user_states_for_users(course.id, student_ids, self._usage_keys)
+
+    def caches_for(self, student):
+        """
+        Return the (field_data_cache, scores_client) to use to grade the
+        given student of this batch.
+        """
+        field_data_cache = FieldDataCache([], self.course.id, student)
+        field_data_cache.add_user_states(self._usage_keys, self._user_states.get(student.id, {}))
+        field_data_cache.add_descriptors_to_cache(self.descriptors)
+        return field_data_cache, self._scores_clients[student.id]
+
+
 def answer_distributions(course_key):
     """
     Given a course_key, return answer distributions in the form of a dictionary
@@ -295,13 +348,31 @@ def answer_distributions(course_key):
     return answer_counts
 
 
-def grade(student, request, course, keep_raw_scores=False, field_data_cache=None, scores_client=None):
+def grade(student, request, course, keep_raw_scores=False, field_data_cache=None, scores_client=None,
+          grading_batch=None):
     """
     Returns the grade of the student.
 
     Also sends a signal to update the minimum grade requirement status.
+
+    If the ENABLE_PERSISTENT_GRADES feature is on, the grade is assembled
+    from the student's stored subsection grades whenever they are complete
+    for the current version of the course.
+
+    grading_batch is the GradingBatch the student belongs to, when grading
+    many students at once.
     """
-    grade_summary = _grade(student, request, course, keep_raw_scores, field_data_cache, scores_client)
+    grade_summary = None
+    if persistent_grades_enabled():
+        grade_summary = _grade_from_persisted(student, course, keep_raw_scores)
+    if grade_summary is None:
+        max_scores_cache = None
+        if grading_batch is not None:
+            field_data_cache, scores_client = grading_batch.caches_for(student)
+            max_scores_cache = grading_batch.max_scores_cache
+        grade_summary = _grade(
+            student, request, course, keep_raw_scores, field_data_cache, scores_client, max_scores_cache
+        )
     responses = GRADES_UPDATED.send_robust(
         sender=None,
         username=student.username,
@@ -316,7 +387,7 @@ def grade(student, request, course, keep_raw_scores=False, field_data_cache=None
     return grade_summary
 
 
-def _grade(student, request, course, keep_raw_scores, field_data_cache, scores_client):
+def _grade(student, request, course, keep_raw_scores, field_data_cache, scores_client, max_scores_cache=None):
     """
     Unwrapped version of "grade"
 
@@ -335,6 +406,9 @@ def _grade(student, request, course, keep_raw_scores, field_data_cache, scores_c
     - keep_raw_scores : if True, then value for key 'raw_scores' contains scores
       for every graded module
 
+    If a max_scores_cache is given, it is expected to already be populated,
+    and the caller is responsible for pushing it to the remote cache.
+
     More information on the format is in the docstring for CourseGrader.
     """
     with outer_atomic():
@@ -356,16 +430,20 @@ def _grade(student, request, course, keep_raw_scores, field_data_cache, scores_c
             course.id.to_deprecated_string(),
             anonymous_id_for_user(student, course.id)
         )
-        max_scores_cache = MaxScoresCache.create_for_course(course)
+        push_max_scores = max_scores_cache is None
+        if max_scores_cache is None:
+            max_scores_cache = MaxScoresCache.create_for_course(course)
 
-        # For the moment, we have to get scorable_locations from field_data_cache
-        # and not from scores_client, because scores_client is ignorant of things
-        # in the submissions API. As a further refactoring step, submissions should
-        # be hidden behind the ScoresClient.
-        max_scores_cache.fetch_from_remote(field_data_cache.scorable_locations)
+            # For the moment, we have to get scorable_locations from field_data_cache
+            # and not from scores_client, because scores_client is ignorant of things
+            # in the submissions API. As a further refactoring step, submissions should
+            # be hidden behind the ScoresClient.
+            max_scores_cache.fetch_from_remote(field_data_cache.scorable_locations)
 
     grading_context = course.grading_context
     raw_scores = []
+    # Subsection grades to be stored when persistent grades are enabled
+    subsection_grades = []
 
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
@@ -405,6 +483,7 @@ def _grade(student, request, course, keep_raw_scores, field_data_cache, scores_c
                 # to grade it at all! We can assume 0%
                 if should_grade_section:
                     scores = []
+                    score_entries = []
 
                     def create_module(descriptor):
                         '''creates an XModule instance given a descriptor'''
@@ -453,13 +532,29 @@ def _grade(student, request, course, keep_raw_scores, field_data_cache, scores_c
                                 module_descriptor.location
                             )
                         )
+                        score_entries.append({
+                            'module_id': module_descriptor.location,
+                            'display_name': module_descriptor.display_name_with_default_escaped,
+                            'earned': correct,
+                            'possible': total,
+                            'graded': module_descriptor.graded,
+                            # Scores from the submissions API are never weighted
+                            'weight': (
+                                None
+                                if module_descriptor.location.to_deprecated_string() in submissions_scores
+                                else module_descriptor.weight
+                            ),
+                        })
 
                     __, graded_total = graders.aggregate_scores(scores, section_name)
                     if keep_raw_scores:
                         raw_scores += scores
                 else:
+                    score_entries = None
                     graded_total = Score(0.0, 1.0, True, section_name, None)
 
+                subsection_grades.append((section_format, section_descriptor, score_entries))
+
                 #Add the graded total to totaled_scores
                 if graded_total.possible > 0:
                     format_scores.append(graded_total)
@@ -472,27 +567,201 @@ def _grade(student, request, course, keep_raw_scores, field_data_cache, scores_c
         totaled_scores[section_format] = format_scores
 
     with outer_atomic():
-        # Grading policy might be overriden by a CCX, need to reset it
-        course.set_grading_policy(course.grading_policy)
-        grade_summary = course.grader.grade(totaled_scores, generate_random_scores=settings.GENERATE_PROFILE_SCORES)
+        grade_summary = _summarize_grade(course, totaled_scores, raw_scores, keep_raw_scores)
+        if push_max_scores:
+            max_scores_cache.push_to_remote()
 
-        # We round the grade here, to make sure that the grade is an whole percentage and
-        # doesn't get displayed differently than it gets grades
-        grade_summary['percent'] = round(grade_summary['percent'] * 100 + 0.05) / 100
+        if persistent_grades_enabled() and student.is_authenticated() and not settings.GENERATE_PROFILE_SCORES:
+            _persist_subsection_grades(student, course, subsection_grades)
 
-        letter_grade = grade_for_percentage(course.grade_cutoffs, grade_summary['percent'])
-        grade_summary['grade'] = letter_grade
-        grade_summary['totaled_scores'] = totaled_scores   # make this available, eg for instructor download & debugging
-        if keep_raw_scores:
-            # way to get all RAW scores out to instructor
-            # so grader can be double-checked
-            grade_summary['raw_scores'] = raw_scores
+    return grade_summary
 
-        max_scores_cache.push_to_remote()
+
+def _summarize_grade(course, totaled_scores, raw_scores, keep_raw_scores):
+    """
+    Run the course grader over the totaled scores of each section format and
+    return the resulting grade summary, augmented with the letter grade.
+    """
+    # Grading policy might be overriden by a CCX, need to reset it
+    course.set_grading_policy(course.grading_policy)
+    grade_summary = course.grader.grade(totaled_scores, generate_random_scores=settings.GENERATE_PROFILE_SCORES)
+
+    # We round the grade here, to make sure that the grade is an whole percentage and
+    # doesn't get displayed differently than it gets grades
+    grade_summary['percent'] = round(grade_summary['percent'] * 100 + 0.05) / 100
+
+    letter_grade = grade_for_percentage(course.grade_cutoffs, grade_summary['percent'])
+    grade_summary['grade'] = letter_grade
+    grade_summary['totaled_scores'] = totaled_scores   # make this available, eg for instructor download & debugging
+    if keep_raw_scores:
+        # way to get all RAW scores out to instructor
+        # so grader can be double-checked
+        grade_summary['raw_scores'] = raw_scores
 
     return grade_summary
 
 
+def persistent_grades_enabled():
+    """
+    Returns whether grades should be read from and written to the
+    PersistentSubsectionGrade store.
+    """
+    return settings.FEATURES.get('ENABLE_PERSISTENT_GRADES', False)
+
+
+def _grades_version(student, course):
+    """
+    Returns a string identifying what the grade of the student depends on
+    besides their scores, used to tell whether stored subsection grades are
+    still applicable: the published content of the course, the content
+    released to the student so far, and the groups the student is in (which
+    decide the content the student has access to).
+    """
+    if course.subtree_edited_on is None:
+        # check for subtree_edited_on because old XML courses doesn't have this attribute
+        edited_on = None
+    else:
+        edited_on = course.subtree_edited_on.isoformat()
+
+    released_on = _latest_release(student, course)
+    version = u'{}|{}|{}'.format(
+        edited_on,
+        released_on.isoformat() if released_on is not None else None,
+        _user_partition_groups(student, course),
+    )
+    return hashlib.md5(version.encode('utf-8')).hexdigest()
+
+
+def _latest_release(student, course):
+    """
+    Returns the latest start date (adjusted for beta testers) of the graded
+    content of the course which is released to the student, or None.
+    """
+    now = datetime.now(UTC())
+    start_dates = (
+        adjust_start_date(student, descriptor.days_early_for_beta, descriptor.start, course.id)
+        for descriptor in course.grading_context['all_descriptors']
+        if descriptor.start is not None
+    )
+    return max([start for start in start_dates if start <= now] or [None])
+
+
+def _user_partition_groups(student, course):
+    """
+    Returns a list of (partition id, group id) pairs of the groups the student
+    is in, for each active user partition of the course which restricts access
+    to content. The groups of split_test partitions are left out, as students
+    are assigned to them for good.
+
+    The students aren't assigned to groups (e.g. cohorts) they aren't in yet.
+    """
+    split_partition_ids = set(partition.id for partition in get_split_user_partitions(course.user_partitions))
+    groups = []
+    for partition in course.user_partitions:
+        if not partition.active or partition.id in split_partition_ids:
+            continue
+        group = partition.scheme.get_group_for_user(course.id, student, partition, assign=False)
+        groups.append((partition.id, group.id if group is not None else None))
+    return sorted(groups)
+
+
+def _persist_subsection_grades(student, course, subsection_grades):
+    """
+    Replace the stored subsection grades of the student in this course.
+
+    subsection_grades is a list of (section_format, section_descriptor,
+    score_entries) tuples, where score_entries is None for subsections the
+    student has not attempted.
+    """
+    grades_version = _grades_version(student, course)
+    new_grades = [
+        PersistentSubsectionGrade(
+            user=student,
+            course_id=course.id,
+            usage_key=section_descriptor.location,
+            course_version=grades_version,
+            section_format=section_format,
+            display_name=section_descriptor.display_name_with_default_escaped,
+            scores=PersistentSubsectionGrade.encode_scores(score_entries),
+        )
+        for section_format, section_descriptor, score_entries in subsection_grades
+    ]
+    try:
+        with transaction.atomic():
+            PersistentSubsectionGrade.objects.filter(user=student, course_id=course.id).delete()
+            PersistentSubsectionGrade.objects.bulk_create(new_grades)
+    except IntegrityError:
+        # The grades of the student were stored concurrently (e.g. by a grade
+        # report computing them while the student looked at the progress page),
+        # so update the rows stored in the meantime instead.
+        for new_grade in new_grades:
+            PersistentSubsectionGrade.objects.update_or_create(
+                user=student,
+                course_id=course.id,
+                usage_key=new_grade.usage_key,
+                defaults={
+                    'course_version': new_grade.course_version,
+                    'section_format': new_grade.section_format,
+                    'display_name': new_grade.display_name,
+                    'scores': new_grade.scores,
+                },
+            )
+
+
+def _grade_from_persisted(student, course, keep_raw_scores):
+    """
+    Assemble the grade of the student from their stored subsection grades,
+    without loading any student state or instantiating any XModules.
+
+    Returns None if the stored grades are missing or stale for any graded
+    subsection of the course, or if the course contains problems which must
+    always be recalculated, in which case the caller must fall back to _grade.
+    """
+    if not student.is_authenticated():
+        return None
+
+    with outer_atomic():
+        stored_grades = {
+            unicode(subsection_grade.usage_key): subsection_grade
+            for subsection_grade in PersistentSubsectionGrade.objects.filter(
+                user=student,
+                course_id=course.id,
+                course_version=_grades_version(student, course),
+            )
+        }
+    if not stored_grades:
+        return None
+
+    raw_scores = []
+    totaled_scores = {}
+    for section_format, sections in course.grading_context['graded_sections'].iteritems():
+        format_scores = []
+        for section in sections:
+            section_descriptor = section['section_descriptor']
+            if any(descriptor.always_recalculate_grades for descriptor in section['xmoduledescriptors']):
+                return None
+
+            subsection_grade = stored_grades.get(unicode(section_descriptor.location))
+            if subsection_grade is None:
+                return None
+
+            section_name = section_descriptor.display_name_with_default_escaped
+            scores = subsection_grade.get_scores()
+            if scores is None:
+                graded_total = Score(0.0, 1.0, True, section_name, None)
+            else:
+                __, graded_total = graders.aggregate_scores(scores, section_name)
+                if keep_raw_scores:
+                    raw_scores += scores
+
+            if graded_total.possible > 0:
+                format_scores.append(graded_total)
+
+        totaled_scores[section_format] = format_scores
+
+    return _summarize_grade(course, totaled_scores, raw_scores, keep_raw_scores)
+
+
 def grade_for_percentage(grade_cutoffs, percentage):
     """
     Returns a letter grade as defined in grading_policy (e.g. 'A' 'B' 'C' for 6.002x) or None.
@@ -755,7 +1024,11 @@ def get_score(user, problem_descriptor, module_creator, scores_client, submissio
     return weighted_score(correct, total, problem_descriptor.weight)
 
 
-def iterate_grades_for(course_or_id, students, keep_raw_scores=False):
+# The number of students graded together by iterate_grades_for
+GRADING_BATCH_SIZE = 100
+
+
+def iterate_grades_for(course_or_id, students, keep_raw_scores=False, batch_size=GRADING_BATCH_SIZE):
     """Given a course_id and an iterable of students (User), yield a tuple of:
 
     (student, gradeset, err_msg) for every student enrolled in the course.
@@ -772,12 +1045,45 @@ def iterate_grades_for(course_or_id, students, keep_raw_scores=False):
     - grade_breakdown : A breakdown of the major components that
         make up the final grade. (For display)
     - raw_scores: contains scores for every graded module
+
+    Students are graded in batches of batch_size, which share the course-wide
+    grading state and fetch their scores together (see GradingBatch).
     """
     if isinstance(course_or_id, (basestring, CourseKey)):
         course = courses.get_course_by_id(course_or_id)
     else:
         course = course_or_id
 
+    students = iter(students)
+    descriptors = None
+    max_scores_cache = None
+    while True:
+        batch_students = list(islice(students, batch_size))
+        if not batch_students:
+            break
+
+        if descriptors is None:
+            with outer_atomic():
+                descriptors = descriptors_for_grading(course)
+                max_scores_cache = MaxScoresCache.create_for_course(course)
+                max_scores_cache.fetch_from_remote(
+                    descriptor.location for descriptor in descriptors if descriptor.has_score
+                )
+
+        with outer_atomic():
+            grading_batch = GradingBatch(course, descriptors, max_scores_cache, batch_students)
+        for result in _iterate_grades_for_batch(course, batch_students, keep_raw_scores, grading_batch):
+            yield result
+
+        with outer_atomic():
+            max_scores_cache.push_to_remote()
+
+
+def _iterate_grades_for_batch(course, students, keep_raw_scores, grading_batch):
+    """
+    Yield (student, gradeset, err_msg) for each student of a GradingBatch, as
+    described in iterate_grades_for.
+    """
     for student in students:
         with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=[u'action:{}'.format(course.id)]):
             try:
@@ -787,7 +1093,7 @@ def iterate_grades_for(course_or_id, students, keep_raw_scores=False):
                 # It's not pretty, but untangling that is currently beyond the
                 # scope of this feature.
                 request.session = {}
-                gradeset = grade(student, request, course, keep_raw_scores)
+                gradeset = grade(student, request, course, keep_raw_scores, grading_batch=grading_batch)
                 yield student, gradeset, ""
             except Exception as exc:  # pylint: disable=broad-except
                 # Keep marching on even if this student couldn't be graded for
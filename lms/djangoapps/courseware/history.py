@@ -0,0 +1,158 @@
+"""
+Writing of StudentModuleHistory entries.
+
+Each save of a StudentModule whose module type has its history saved records a
+StudentModuleHistory entry (see `StudentModuleHistory.save_history`). The entries are
+written by the history sink configured by the STUDENT_MODULE_HISTORY setting: to the
+StudentModuleHistory table (of the given database), or as json lines to a logger.
+
+By default, each entry is written as it's recorded. Within `batch_history`, the entries
+are collected and written in bulk instead, which code saving many StudentModules (such as
+instructor tasks) should use, within the transaction saving them.
+"""
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# The default configuration of the history sink.
+DEFAULT_CONFIG = {'STORAGE_TYPE': 'database'}
+
+# Maximum number of entries collected by `batch_history` before they're written.
+BATCH_SIZE = 500
+
+_LOCAL = threading.local()
+
+
+class HistorySink(object):
+    """
+    Writes StudentModuleHistory entries.
+    """
+    @classmethod
+    def from_config(cls, config_name='STUDENT_MODULE_HISTORY'):
+        """
+        Return one of the HistorySink subclasses depending on django configuration.
+        Look at subclasses for expected configuration.
+        """
+        config = getattr(settings, config_name, None) or DEFAULT_CONFIG
+        storage_type = config.get('STORAGE_TYPE', 'database').lower()
+        if storage_type == 'database':
+            return DatabaseHistorySink(config.get('DATABASE'))
+        elif storage_type == 'log':
+            return LogHistorySink(config.get('LOGGER', 'courseware.student_module_history'))
+        raise ValueError(u"Unknown StudentModuleHistory storage type: {}".format(storage_type))
+
+    def write(self, entries):
+        """
+        Write the (unsaved) StudentModuleHistory instances ``entries``.
+        """
+        raise NotImplementedError
+
+
+class DatabaseHistorySink(HistorySink):
+    """
+    Inserts history entries into the StudentModuleHistory table, with one query per write.
+
+    Configuration::
+
+        STORAGE_TYPE : "database"
+        DATABASE : The alias of the database to write to (e.g. one holding an append-only
+                   copy of the table), if not the one StudentModuleHistory is routed to.
+    """
+    def __init__(self, database=None):
+        self.database = database
+
+    def write(self, entries):
+        if not entries:
+            return
+        manager = type(entries[0]).objects
+        if self.database is not None:
+            manager = manager.db_manager(self.database)
+        manager.bulk_create(entries)
+
+
+class LogHistorySink(HistorySink):
+    """
+    Logs each history entry as a line of json, for logging to route to an append-only
+    file or log collector, instead of the StudentModuleHistory table.
+
+    Configuration::
+
+        STORAGE_TYPE : "log"
+        LOGGER : The name of the logger to log to (courseware.student_module_history by default).
+    """
+    def __init__(self, logger_name):
+        self.logger = logging.getLogger(logger_name)
+
+    def write(self, entries):
+        for entry in entries:
+            self.logger.info(json.dumps({
+                'student_module_id': entry.student_module_id,
+                'version': entry.version,
+                'created': entry.created.isoformat() if entry.created else None,
+                'state': entry.state,
+                'grade': entry.grade,
+                'max_grade': entry.max_grade,
+            }))
+
+
+class HistoryBatch(object):
+    """
+    Collects history entries to write them in bulk, every BATCH_SIZE entries and on `flush`.
+    """
+    def __init__(self, sink=None, batch_size=BATCH_SIZE):
+        self.sink = sink or HistorySink.from_config()
+        self.batch_size = batch_size
+        self.entries = []
+
+    def add(self, entry):
+        """
+        Collect ``entry``, writing the collected entries if there are ``batch_size`` of them.
+        """
+        self.entries.append(entry)
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the collected entries.
+        """
+        entries, self.entries = self.entries, []
+        if entries:
+            self.sink.write(entries)
+
+
+def record_history(entry):
+    """
+    Write the StudentModuleHistory instance ``entry``, or collect it to be written in bulk
+    if within `batch_history`.
+    """
+    batch = getattr(_LOCAL, 'batch', None)
+    if batch is not None:
+        batch.add(entry)
+    else:
+        HistorySink.from_config().write([entry])
+
+
+@contextmanager
+def batch_history(sink=None, batch_size=BATCH_SIZE):
+    """
+    Collect the history entries recorded in this thread within the wrapped code block, and
+    write them in bulk, every ``batch_size`` entries and at the end of the block.
+
+    The block should run in the transaction saving the StudentModules, so that the entries
+    are written (or rolled back) with them. If the block raises, the entries still collected
+    are dropped rather than written.
+
+    Yields the :class:`HistoryBatch`. A nested block collects into a batch of its own, which
+    is written at the end of the nested block.
+    """
+    outer_batch = getattr(_LOCAL, 'batch', None)
+    batch = _LOCAL.batch = HistoryBatch(sink, batch_size)
+    try:
+        yield batch
+    finally:
+        _LOCAL.batch = outer_batch
+    batch.flush()
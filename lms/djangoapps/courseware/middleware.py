@@ -1,11 +1,18 @@
 """
 Middleware for the courseware app
 """
+import logging
 
+from django.conf import settings
+from django.db import DatabaseError, connections, router
 from django.shortcuts import redirect
 from django.core.urlresolvers import reverse
 
 from courseware.courses import UserNotEnrolled
+from courseware.models import StudentModule
+from courseware.user_state_client import get_write_buffer, start_write_buffer
+
+log = logging.getLogger(__name__)
 
 
 class RedirectUnenrolledMiddleware(object):
@@ -22,3 +29,66 @@ class RedirectUnenrolledMiddleware(object):
                     args=[course_key.to_deprecated_string()]
                 )
             )
+
+
+class UserStateWriteBufferMiddleware(object):
+    """
+    If FEATURES['ENABLE_USER_STATE_WRITE_BEHIND'] is set, buffers the user state writes to the
+    blocks of settings.USER_STATE_WRITE_BEHIND_BLOCK_TYPES made during each request, and saves
+    them in bulk at the end of the request. Repeated writes to the state of a block (e.g. position
+    updates) are coalesced into a single write.
+
+    This must come after 'request_cache.middleware.RequestCache' in MIDDLEWARE_CLASSES.
+    """
+    def process_request(self, request):  # pylint: disable=unused-argument
+        """
+        Start buffering the user state writes of the request.
+        """
+        if settings.FEATURES.get('ENABLE_USER_STATE_WRITE_BEHIND'):
+            start_write_buffer(settings.USER_STATE_WRITE_BEHIND_BLOCK_TYPES)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):  # pylint: disable=unused-argument
+        """
+        Note whether the user state writes of the view are rolled back if it raises an
+        exception, i.e. whether it runs in a transaction (see ATOMIC_REQUESTS). Views
+        decorated with transaction.non_atomic_requests (e.g. courseware.views.index)
+        keep the writes they made before raising.
+        """
+        write_buffer = get_write_buffer()
+        if write_buffer:
+            alias = router.db_for_write(StudentModule)
+            write_buffer.drop_on_exception = (
+                connections[alias].settings_dict.get('ATOMIC_REQUESTS', False) and
+                alias not in getattr(view_func, '_non_atomic_requests', set())
+            )
+
+    def process_exception(self, request, exception):  # pylint: disable=unused-argument
+        """
+        Drop the buffered user state writes of a request that raised an exception if the
+        writes made in its transaction are rolled back, and save them otherwise.
+        """
+        write_buffer = get_write_buffer()
+        if write_buffer:
+            if write_buffer.drop_on_exception:
+                write_buffer.clear()
+            else:
+                self._flush(request, write_buffer)
+
+    def process_response(self, request, response):
+        """
+        Save the buffered user state writes of the request.
+        """
+        write_buffer = get_write_buffer()
+        if write_buffer:
+            self._flush(request, write_buffer)
+        return response
+
+    def _flush(self, request, write_buffer):
+        """
+        Save the writes in ``write_buffer``, logging (rather than raising) any database error.
+        """
+        num_writes = len(write_buffer)
+        try:
+            write_buffer.flush()
+        except DatabaseError:
+            log.exception("Saving %d buffered user state writes failed for %s", num_writes, request.path)
@@ -42,8 +42,8 @@ from xblock.runtime import KeyValueStore
 from xblock.exceptions import KeyValueMultiSaveError, InvalidScopeError
 from xblock.fields import Scope, UserScope
 from xmodule.modulestore.django import modulestore
-from xblock.core import XBlockAside
-from courseware.user_state_client import DjangoXBlockUserStateClient
+from xblock.core import XBlock, XBlockAside
+from courseware.user_state_client import DjangoXBlockUserStateClient, get_write_buffer
 
 
 log = logging.getLogger(__name__)
@@ -61,12 +61,23 @@ def _all_usage_keys(descriptors, aside_types):
     Return a set of all usage_ids for the `descriptors` and for
     as all asides in `aside_types` for those descriptors.
     """
+    return _usage_keys_with_asides(
+        (descriptor.scope_ids.usage_id for descriptor in descriptors),
+        aside_types,
+    )
+
+
+def _usage_keys_with_asides(usage_keys, aside_types):
+    """
+    Return a set of the `usage_keys` and of the usage_ids of all asides
+    in `aside_types` for those usage keys.
+    """
     usage_ids = set()
-    for descriptor in descriptors:
-        usage_ids.add(descriptor.scope_ids.usage_id)
+    for usage_key in usage_keys:
+        usage_ids.add(usage_key)
 
         for aside_type in aside_types:
-            usage_ids.add(AsideUsageKeyV1(descriptor.scope_ids.usage_id, aside_type))
+            usage_ids.add(AsideUsageKeyV1(usage_key, aside_type))
 
     return usage_ids
 
@@ -86,6 +97,19 @@ def _all_block_types(descriptors, aside_types):
     return block_types
 
 
+def _block_types_of_usage_keys(usage_keys, aside_types):
+    """
+    Return a set of all block_types of the supplied `usage_keys` (of XBlocks)
+    and of the aside types in `aside_types`.
+    """
+    block_types = set(BlockTypeKeyV1(XBlock.entry_point, usage_key.block_type) for usage_key in usage_keys)
+
+    for aside_type in aside_types:
+        block_types.add(BlockTypeKeyV1(XBlockAside.entry_point, aside_type))
+
+    return block_types
+
+
 class DjangoKeyValueStore(KeyValueStore):
     """
     This KeyValueStore will read and write data in the following scopes to django models
@@ -179,6 +203,17 @@ class DjangoOrmFieldCache(object):
         for field_object in self._read_objects(fields, xblocks, aside_types):
             self._cache[self._cache_key_for_field_object(field_object)] = field_object
 
+    def cache_usage_keys(self, usage_keys, aside_types):
+        """
+        Load all fields for the blocks ``usage_keys`` and ``aside_types`` into this cache.
+
+        Arguments:
+            usage_keys (list of :class:`~UsageKey`): The blocks to cache fields for.
+            aside_types (list of str): Aside types to cache fields for.
+        """
+        for field_object in self._read_all_objects(usage_keys, aside_types):
+            self._cache[self._cache_key_for_field_object(field_object)] = field_object
+
     @contract(kvs_key=DjangoKeyValueStore.Key)
     def get(self, kvs_key):
         """
@@ -324,6 +359,20 @@ class DjangoOrmFieldCache(object):
         """
         raise NotImplementedError()
 
+    @abstractmethod
+    def _read_all_objects(self, usage_keys, aside_types):
+        """
+        Return an iterator for all objects stored in the underlying datastore
+        for any field of the blocks ``usage_keys`` and the ``aside_types``
+        associated with them.
+
+        Arguments:
+            usage_keys (list of :class:`~UsageKey`): The blocks to load fields for
+            aside_types (list of str): Asides to load field for (which annotate the supplied
+                blocks).
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     def _cache_key_for_field_object(self, field_object):
         """
@@ -354,6 +403,7 @@ class UserStateCache(object):
         self.course_id = course_id
         self.user = user
         self._client = DjangoXBlockUserStateClient(self.user)
+        self._added_usage_keys = set()
 
     def cache_fields(self, fields, xblocks, aside_types):  # pylint: disable=unused-argument
         """
@@ -367,11 +417,40 @@ class UserStateCache(object):
         """
         block_field_state = self._client.get_many(
             self.user.username,
-            _all_usage_keys(xblocks, aside_types),
+            _all_usage_keys(xblocks, aside_types) - self._added_usage_keys,
+        )
+        for user_state in block_field_state:
+            self._cache[user_state.block_key] = user_state.state
+
+    def cache_usage_keys(self, usage_keys, aside_types):
+        """
+        Load all fields for the blocks ``usage_keys`` and ``aside_types`` into this cache.
+
+        Arguments:
+            usage_keys (list of :class:`~UsageKey`): The blocks to cache fields for.
+            aside_types (list of str): Aside types to cache fields for.
+        """
+        block_field_state = self._client.get_many(
+            self.user.username,
+            _usage_keys_with_asides(usage_keys, aside_types) - self._added_usage_keys,
         )
         for user_state in block_field_state:
             self._cache[user_state.block_key] = user_state.state
 
+    def add_states(self, usage_keys, block_states):
+        """
+        Add the already loaded fields of the blocks ``usage_keys`` to this cache,
+        so that they aren't loaded again.
+
+        Arguments:
+            usage_keys (list of :class:`~UsageKey`): The blocks whose fields were loaded.
+            block_states (dict): A dict mapping those of ``usage_keys`` with stored
+                fields to a dict of their field values.
+        """
+        for usage_key, state in block_states.iteritems():
+            self._cache[usage_key] = state
+        self._added_usage_keys.update(usage_keys)
+
     @contract(kvs_key=DjangoKeyValueStore.Key)
     def set(self, kvs_key, value):
         """
@@ -539,6 +618,22 @@ class UserStateSummaryCache(DjangoOrmFieldCache):
             field_name__in=set(field.name for field in fields),
         )
 
+    def _read_all_objects(self, usage_keys, aside_types):
+        """
+        Return an iterator for all objects stored in the underlying datastore
+        for any field of the blocks ``usage_keys`` and the ``aside_types``
+        associated with them.
+
+        Arguments:
+            usage_keys (list of :class:`~UsageKey`): The blocks to load fields for
+            aside_types (list of str): Asides to load field for (which annotate the supplied
+                blocks).
+        """
+        return XModuleUserStateSummaryField.objects.chunked_filter(
+            'usage_id__in',
+            _usage_keys_with_asides(usage_keys, aside_types),
+        )
+
     def _cache_key_for_field_object(self, field_object):
         """
         Return the key used in this DjangoOrmFieldCache to store the specified field_object.
@@ -602,6 +697,23 @@ class PreferencesCache(DjangoOrmFieldCache):
             field_name__in=set(field.name for field in fields),
         )
 
+    def _read_all_objects(self, usage_keys, aside_types):
+        """
+        Return an iterator for all objects stored in the underlying datastore
+        for any field of the blocks ``usage_keys`` and the ``aside_types``
+        associated with them.
+
+        Arguments:
+            usage_keys (list of :class:`~UsageKey`): The blocks to load fields for
+            aside_types (list of str): Asides to load field for (which annotate the supplied
+                blocks).
+        """
+        return XModuleStudentPrefsField.objects.chunked_filter(
+            'module_type__in',
+            _block_types_of_usage_keys(usage_keys, aside_types),
+            student=self.user.pk,
+        )
+
     def _cache_key_for_field_object(self, field_object):
         """
         Return the key used in this DjangoOrmFieldCache to store the specified field_object.
@@ -662,6 +774,21 @@ class UserInfoCache(DjangoOrmFieldCache):
             field_name__in=set(field.name for field in fields),
         )
 
+    def _read_all_objects(self, usage_keys, aside_types):
+        """
+        Return an iterator for all objects stored in the underlying datastore
+        for any field of the blocks ``usage_keys`` and the ``aside_types``
+        associated with them.
+
+        Arguments:
+            usage_keys (list of :class:`~UsageKey`): The blocks to load fields for
+            aside_types (list of str): Asides to load field for (which annotate the supplied
+                blocks).
+        """
+        return XModuleStudentInfoField.objects.filter(
+            student=self.user.pk,
+        )
+
     def _cache_key_for_field_object(self, field_object):
         """
         Return the key used in this DjangoOrmFieldCache to store the specified field_object.
@@ -681,6 +808,72 @@ class UserInfoCache(DjangoOrmFieldCache):
         return key.field_name
 
 
+def descriptor_descendents(descriptor, depth=None, descriptor_filter=lambda descriptor: True):
+    """
+    Return a list of `descriptor` and its descendants (including required
+    module descriptors) that match `descriptor_filter`.
+
+    Arguments:
+        descriptor: An XModuleDescriptor
+        depth is the number of levels of descendants to include, in addition to
+            the supplied descriptor. If depth is None, include all descendants
+        descriptor_filter is a function that accepts a descriptor and return whether
+            it should be included
+    """
+    def get_child_descriptors(descriptor, depth, descriptor_filter):
+        """
+        Return a list of all child descriptors down to the specified depth
+        that match the descriptor filter. Includes `descriptor`
+
+        descriptor: The parent to search inside
+        depth: The number of levels to descend, or None for infinite depth
+        descriptor_filter(descriptor): A function that returns True
+            if descriptor should be included in the results
+        """
+        if descriptor_filter(descriptor):
+            descriptors = [descriptor]
+        else:
+            descriptors = []
+
+        if depth is None or depth > 0:
+            new_depth = depth - 1 if depth is not None else depth
+
+            for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
+                descriptors.extend(get_child_descriptors(child, new_depth, descriptor_filter))
+
+        return descriptors
+
+    with modulestore().bulk_operations(descriptor.location.course_key):
+        return get_child_descriptors(descriptor, depth, descriptor_filter)
+
+
+def block_structure_descendents(block_structure, usage_key, depth=None):
+    """
+    Return a list of the usage keys of the block `usage_key` and its descendants
+    in `block_structure` (such as a collected course block structure), without
+    loading any of the blocks. Unlike `descriptor_descendents`, this doesn't
+    include required module descriptors (which aren't part of block structures).
+
+    Arguments:
+        block_structure: A BlockStructure containing `usage_key`
+        usage_key: The UsageKey of the block to start from
+        depth is the number of levels of descendants to include, in addition to
+            the supplied block. If depth is None, include all descendants
+    """
+    usage_keys = []
+    level = [usage_key]
+    while level and (depth is None or depth >= 0):
+        usage_keys.extend(level)
+        level = [
+            child_key
+            for parent_key in level
+            for child_key in block_structure.get_children(parent_key)
+        ]
+        if depth is not None:
+            depth -= 1
+    return usage_keys
+
+
 class FieldDataCache(object):
     """
     A cache of django model objects needed to supply the data
@@ -725,14 +918,23 @@ class FieldDataCache(object):
             ),
         }
         self.scorable_locations = set()
+        self.prefetched_usage_keys = set()
         self.add_descriptors_to_cache(descriptors)
 
     def add_descriptors_to_cache(self, descriptors):
         """
         Add all `descriptors` to this FieldDataCache.
+
+        The field data of descriptors whose blocks were added with
+        `prefetch_usage_keys` is already cached, and isn't loaded again.
         """
         if self.user.is_authenticated():
             self.scorable_locations.update(desc.location for desc in descriptors if desc.has_score)
+            if self.prefetched_usage_keys:
+                descriptors = [
+                    descriptor for descriptor in descriptors
+                    if descriptor.scope_ids.usage_id not in self.prefetched_usage_keys
+                ]
             for scope, fields in self._fields_to_cache(descriptors).items():
                 if scope not in self.cache:
                     continue
@@ -750,34 +952,47 @@ class FieldDataCache(object):
             descriptor_filter is a function that accepts a descriptor and return whether the field data
                 should be cached
         """
+        self.add_descriptors_to_cache(descriptor_descendents(descriptor, depth, descriptor_filter))
 
-        def get_child_descriptors(descriptor, depth, descriptor_filter):
-            """
-            Return a list of all child descriptors down to the specified depth
-            that match the descriptor filter. Includes `descriptor`
+    def prefetch_usage_keys(self, usage_keys):
+        """
+        Add all fields of the blocks `usage_keys` to this FieldDataCache, without
+        loading their descriptors. The fields of all scopes are loaded with one
+        (chunked) query per scope, whatever the types of the blocks.
 
-            descriptor: The parent to search inside
-            depth: The number of levels to descend, or None for infinite depth
-            descriptor_filter(descriptor): A function that returns True
-                if descriptor should be included in the results
-            """
-            if descriptor_filter(descriptor):
-                descriptors = [descriptor]
-            else:
-                descriptors = []
+        Descriptors of these blocks later added with `add_descriptors_to_cache`
+        (or `add_descriptor_descendents`) need no further queries.
 
-            if depth is None or depth > 0:
-                new_depth = depth - 1 if depth is not None else depth
+        Arguments:
+            usage_keys: The UsageKeys of the blocks to cache fields for (e.g. from
+                `block_structure_descendents`)
+        """
+        if not self.user.is_authenticated():
+            return
 
-                for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
-                    descriptors.extend(get_child_descriptors(child, new_depth, descriptor_filter))
+        usage_keys = set(usage_keys) - self.prefetched_usage_keys
+        if not usage_keys:
+            return
 
-            return descriptors
+        for cache in self.cache.values():
+            cache.cache_usage_keys(usage_keys, self.asides)
+        self.prefetched_usage_keys.update(usage_keys)
 
-        with modulestore().bulk_operations(descriptor.location.course_key):
-            descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
+    def add_user_states(self, usage_keys, block_states):
+        """
+        Add the Scope.user_state fields of the blocks `usage_keys`, already loaded
+        (e.g. by `user_states_for_users`), to this FieldDataCache.
 
-        self.add_descriptors_to_cache(descriptors)
+        Descriptors of these blocks later added with `add_descriptors_to_cache` need
+        no further query for their Scope.user_state fields.
+
+        Arguments:
+            usage_keys: The UsageKeys of the blocks whose fields were loaded
+            block_states: A dict mapping those of `usage_keys` with stored fields
+                to a dict of their field values
+        """
+        if self.user.is_authenticated():
+            self.cache[Scope.user_state].add_states(usage_keys, block_states)
 
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
@@ -930,6 +1145,35 @@ class FieldDataCache(object):
         return sum(len(cache) for cache in self.cache.values())
 
 
+def user_states_for_users(course_id, user_ids, usage_keys):
+    """
+    Return a dict mapping each of `user_ids` to the Scope.user_state fields stored
+    for them of the blocks `usage_keys`, as a dict mapping usage keys to dicts of
+    field values, read from StudentModule with one (chunked) query for all the users.
+    """
+    write_buffer = get_write_buffer()
+    if write_buffer:
+        write_buffer.flush(usage_keys=usage_keys)
+
+    user_states = {user_id: {} for user_id in user_ids}
+    student_modules = StudentModule.objects.chunked_filter(
+        'module_state_key__in',
+        list(usage_keys),
+        student_id__in=user_ids,
+        course_id=course_id,
+    )
+    for student_module in student_modules:
+        if student_module.state is None:
+            continue
+        state = json.loads(student_module.state)
+        # As for DjangoXBlockUserStateClient, an empty state has been deleted.
+        if state == {}:
+            continue
+        usage_key = student_module.module_state_key.map_into_course(student_module.course_id)
+        user_states[student_module.student_id][usage_key] = state
+    return user_states
+
+
 class ScoresClient(object):
     """
     Basic client interface for retrieving Score information.
@@ -957,15 +1201,17 @@ class ScoresClient(object):
             course_id=self.course_key,
             module_state_key__in=set(locations),
         )
+        for location, correct, total in scores_qset.values_list('module_state_key', 'grade', 'max_grade'):
+            self._add_score(location, correct, total)
+        self._has_fetched = True
+
+    def _add_score(self, location, correct, total):
+        """Record the score of a location, as read from StudentModule."""
         # Locations in StudentModule don't necessarily have course key info
         # attached to them (since old mongo identifiers don't include runs).
         # So we have to add that info back in before we put it into our lookup.
-        self._locations_to_scores.update({
-            UsageKey.from_string(location).map_into_course(self.course_key): self.Score(correct, total)
-            for location, correct, total
-            in scores_qset.values_list('module_state_key', 'grade', 'max_grade')
-        })
-        self._has_fetched = True
+        location = UsageKey.from_string(location).map_into_course(self.course_key)
+        self._locations_to_scores[location] = self.Score(correct, total)
 
     def get(self, location):
         """
@@ -989,12 +1235,38 @@ class ScoresClient(object):
         client.fetch_scores(fd_cache.scorable_locations)
         return client
 
+    @classmethod
+    def create_for_users(cls, course_key, user_ids, locations):
+        """
+        Create a ScoresClient for each of the given users, fetching the scores
+        of all of them with a single query. Returns a dict mapping user ids to
+        their ScoresClient.
+        """
+        clients = {user_id: cls(course_key, user_id) for user_id in user_ids}
+        scores_qset = StudentModule.objects.filter(
+            student_id__in=clients.keys(),
+            course_id=course_key,
+            module_state_key__in=set(locations),
+        )
+        for user_id, location, correct, total in scores_qset.values_list(
+                'student_id', 'module_state_key', 'grade', 'max_grade'
+        ):
+            clients[user_id]._add_score(location, correct, total)  # pylint: disable=protected-access
+        for client in clients.values():
+            client._has_fetched = True  # pylint: disable=protected-access
+        return clients
+
 
 # @contract(user_id=int, usage_key=UsageKey, score="number|None", max_score="number|None")
 def set_score(user_id, usage_key, score, max_score):
     """
     Set the score and max_score for the specified user and xblock usage.
     """
+    # Scores are saved right away, after any buffered state of the block.
+    write_buffer = get_write_buffer()
+    if write_buffer:
+        write_buffer.flush(user_id=user_id, usage_keys=[usage_key])
+
     student_module, created = StudentModule.objects.get_or_create(
         student_id=user_id,
         module_state_key=usage_key,
@@ -12,19 +12,23 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
+import json
 import logging
 import itertools
 
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver, Signal
 
 from model_utils.models import TimeStampedModel
+from opaque_keys.edx.keys import CourseKey, UsageKey
 from student.models import user_by_anonymous_id
 from submissions.models import score_set, score_reset
 
+from courseware.history import record_history
+from xmodule.graders import Score
 from xmodule_django.models import CourseKeyField, LocationKeyField, BlockTypeKeyField
 log = logging.getLogger(__name__)
 
@@ -172,9 +176,10 @@ class StudentModuleHistory(models.Model):
     @receiver(post_save, sender=StudentModule)
     def save_history(sender, instance, **kwargs):  # pylint: disable=no-self-argument, unused-argument
         """
-        Checks the instance's module_type, and creates & saves a
+        Checks the instance's module_type, and creates & records a
         StudentModuleHistory entry if the module_type is one that
-        we save.
+        we save. The entry is written by the configured history sink,
+        right away or in bulk (see `courseware.history`).
         """
         if instance.module_type in StudentModuleHistory.HISTORY_SAVING_TYPES:
             history_entry = StudentModuleHistory(student_module=instance,
@@ -183,7 +188,7 @@ class StudentModuleHistory(models.Model):
                                                  state=instance.state,
                                                  grade=instance.grade,
                                                  max_grade=instance.max_grade)
-            history_entry.save()
+            record_history(history_entry)
 
     def __unicode__(self):
         return unicode(repr(self))
@@ -295,6 +300,110 @@ class OfflineComputedGradeLog(models.Model):
         return "[OCGLog] %s: %s" % (self.course_id.to_deprecated_string(), self.created)  # pylint: disable=no-member
 
 
+class PersistentSubsectionGrade(TimeStampedModel):
+    """
+    Stores the weighted problem scores a student has earned within a single
+    graded subsection, so that a course grade can be assembled without walking
+    the course and instantiating XModules.
+
+    Rows are written in full by `courseware.grades` whenever a grade has to be
+    computed from scratch, and patched in place when a SCORE_CHANGED signal
+    arrives for one of the problems they contain. A row only applies to the
+    published content, released content and student groups identified by
+    `course_version`.
+    """
+    class Meta(object):
+        app_label = "courseware"
+        unique_together = (('user', 'course_id', 'usage_key'),)
+
+    user = models.ForeignKey(User, db_index=True)
+    course_id = CourseKeyField(max_length=255, db_index=True)
+
+    # The subsection (sequential) these scores belong to
+    usage_key = LocationKeyField(max_length=255)
+
+    # Identifies the version of the course content, of the content released to
+    # the student and of the student's groups the scores were computed against
+    # (see `courseware.grades`). Rows for any other version are ignored and rebuilt.
+    course_version = models.CharField(max_length=255, blank=True, default='')
+
+    section_format = models.CharField(max_length=255, blank=True, default='')
+    display_name = models.TextField(blank=True, default='')
+
+    # JSON list of the problem scores in this subsection, or null if the
+    # student has not interacted with any of them (which counts as 0%).
+    scores = models.TextField(null=True, blank=True)
+
+    def __unicode__(self):
+        return u"[PersistentSubsectionGrade] {}: {} ({}) = {}".format(
+            self.user_id, self.usage_key, self.course_version, self.scores
+        )
+
+    @staticmethod
+    def encode_scores(entries):
+        """
+        Serialize a list of problem score dicts for storage. Each entry has
+        the keys `module_id`, `display_name`, `earned`, `possible`, `graded`
+        and `weight`. Passing None records an unattempted subsection.
+        """
+        if entries is None:
+            return None
+        return json.dumps([dict(entry, module_id=unicode(entry['module_id'])) for entry in entries])
+
+    def get_scores(self):
+        """
+        Returns the stored problem scores as a list of graders.Score objects,
+        or None if the student had not attempted this subsection.
+        """
+        if self.scores is None:
+            return None
+        return [
+            Score(
+                entry['earned'],
+                entry['possible'],
+                entry['graded'] and entry['possible'] > 0,
+                entry['display_name'],
+                UsageKey.from_string(entry['module_id']).map_into_course(self.course_id),
+            )
+            for entry in json.loads(self.scores)
+        ]
+
+    @classmethod
+    def update_problem_score(cls, user_id, course_key, usage_key, points_earned, points_possible):
+        """
+        Patch the stored score of a single problem for the given student.
+
+        If no stored subsection knows about the problem (e.g. the student had
+        not attempted the subsection yet), every stored subsection grade of
+        the student in this course is discarded, so that the next read
+        computes and stores the grade from scratch.
+        """
+        # We need to import this here to avoid a circular dependency, since
+        # courseware.grades imports this module.
+        from courseware.grades import weighted_score
+
+        usage_id = unicode(usage_key)
+        # Lock the rows of the student, so that concurrent score changes for
+        # problems of the same subsection don't overwrite each other.
+        with transaction.atomic():
+            subsection_grades = cls.objects.select_for_update().filter(user_id=user_id, course_id=course_key)
+            for subsection_grade in subsection_grades:
+                if subsection_grade.scores is None:
+                    continue
+                entries = json.loads(subsection_grade.scores)
+                for entry in entries:
+                    if entry['module_id'] == usage_id:
+                        entry['earned'], entry['possible'] = weighted_score(
+                            points_earned, points_possible, entry['weight']
+                        )
+                        subsection_grade.scores = json.dumps(entries)
+                        subsection_grade.save()
+                        return True
+
+            subsection_grades.delete()
+        return False
+
+
 class StudentFieldOverride(TimeStampedModel):
     """
     Holds the value of a specific field overriden for a student.  This is used
@@ -409,3 +518,22 @@ def submissions_score_reset_handler(sender, **kwargs):  # pylint: disable=unused
             u"Failed to process score_reset signal from Submissions API. "
             "user: %s, course_id: %s, usage_id: %s", user, course_id, usage_id
         )
+
+
+@receiver(SCORE_CHANGED)
+def persistent_grade_score_changed_handler(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Consume the SCORE_CHANGED signal and fold the new score into the student's
+    stored subsection grades, when persistent grades are enabled.
+    """
+    if not settings.FEATURES.get('ENABLE_PERSISTENT_GRADES'):
+        return
+
+    course_key = CourseKey.from_string(kwargs['course_id'])
+    PersistentSubsectionGrade.update_problem_score(
+        kwargs['user_id'],
+        course_key,
+        UsageKey.from_string(kwargs['usage_id']).map_into_course(course_key),
+        kwargs['points_earned'],
+        kwargs['points_possible'],
+    )
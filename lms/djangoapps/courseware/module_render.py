@@ -10,6 +10,7 @@ from functools import partial
 
 import dogstats_wrapper as dog_stats_api
 import newrelic.agent
+import request_cache
 from capa.xqueue_interface import XQueueInterface
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -19,6 +20,7 @@ from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
 from django.http import Http404, HttpResponse
 from django.test.client import RequestFactory
+from django.utils import translation
 from django.views.decorators.csrf import csrf_exempt
 from edx_proctoring.services import ProctoringService
 from eventtracking import tracker
@@ -55,6 +57,7 @@ from lms.djangoapps.lms_xblock.runtime import LmsModuleSystem, unquote_slashes,
 from lms.djangoapps.verify_student.services import ReverificationService
 from openedx.core.djangoapps.credit.services import CreditService
 from openedx.core.lib.xblock_utils import (
+    FragmentCache,
     replace_course_urls,
     replace_jump_to_id_urls,
     replace_static_urls,
@@ -106,6 +109,89 @@ class LmsModuleRenderError(Exception):
     pass
 
 
+# Name of the request cache holding the SharedRuntimeState of each user and course.
+SHARED_RUNTIME_CACHE = 'courseware.module_render.shared_runtime'
+
+
+class SharedRuntimeState(object):
+    """
+    The parts of the module systems bound to a user in a course which don't depend on the
+    module: the services, the access flags of the user, and the URLs rewritten into fragments.
+
+    If FEATURES['ENABLE_SHARED_MODULE_RUNTIME'] is set, one instance is shared by all the
+    modules rendered for the user in the course during a request (see `get_shared_runtime_state`),
+    so that rendering a unit builds them once rather than once per block. Each module still
+    gets its own module system, as XModules are bound to it; the parts only needed by handlers
+    and grading (publishing, xqueue callbacks, rebinding) are closures, which only do any work
+    when they're called.
+    """
+    def __init__(self, user, course_id):
+        self.user = user
+        self.course_id = course_id
+        self.jump_to_id_base_url = reverse(
+            'jump_to_id', kwargs={'course_id': course_id.to_deprecated_string(), 'module_id': ''}
+        )
+        self.services = {
+            'i18n': ModuleI18nService(),
+            'fs': FSService(),
+            'reverification': ReverificationService(),
+            'proctoring': ProctoringService(),
+            'credit': CreditService(),
+            'bookmarks': BookmarksService(user=user),
+        }
+        self._user_services = {}
+        self._user_is_admin = None
+        self._user_is_beta_tester = None
+
+    def user_service(self, user_is_staff):
+        """
+        Return the 'user' service of the modules, for which the user has staff access or not.
+        """
+        if user_is_staff not in self._user_services:
+            self._user_services[user_is_staff] = DjangoXBlockUserService(self.user, user_is_staff=user_is_staff)
+        return self._user_services[user_is_staff]
+
+    @property
+    def user_is_admin(self):
+        """
+        Whether the user has global staff access.
+        """
+        if self._user_is_admin is None:
+            self._user_is_admin = bool(has_access(self.user, u'staff', 'global'))
+        return self._user_is_admin
+
+    @property
+    def user_is_beta_tester(self):
+        """
+        Whether the user is a beta tester of the course.
+        """
+        if self._user_is_beta_tester is None:
+            self._user_is_beta_tester = CourseBetaTesterRole(self.course_id).has_user(self.user)
+        return self._user_is_beta_tester
+
+
+def get_shared_runtime_state(user, course_id):
+    """
+    Return the SharedRuntimeState of ``user`` in the course ``course_id``, which is created once
+    per request if FEATURES['ENABLE_SHARED_MODULE_RUNTIME'] is set, and on each call otherwise.
+
+    The state is only shared within requests handled by the RequestCache middleware, which clears
+    it at their end. Outside of them (e.g. in celery tasks grading or rescoring many students), the
+    request cache is never cleared, so the state isn't kept.
+    """
+    if not settings.FEATURES.get('ENABLE_SHARED_MODULE_RUNTIME', False) or request_cache.get_request() is None:
+        return SharedRuntimeState(user, course_id)
+
+    # The state is only shared between modules bound to the same user instance, as users
+    # masquerading as a student are bound to a copy of the student's user.
+    cache_key = (user.id, unicode(course_id))
+    shared_runtimes = request_cache.get_cache(SHARED_RUNTIME_CACHE)
+    shared_runtime = shared_runtimes.get(cache_key)
+    if shared_runtime is None or shared_runtime.user is not user:
+        shared_runtime = shared_runtimes[cache_key] = SharedRuntimeState(user, course_id)
+    return shared_runtime
+
+
 def make_track_function(request):
     '''
     Make a tracking function that logs what happened.
@@ -364,6 +450,36 @@ def get_module_for_descriptor(user, request, descriptor, field_data_cache, cours
     )
 
 
+def get_fragment_cache(descriptor, content_wrappers):
+    """
+    Return the FragmentCache to cache the student_view fragments of ``descriptor`` in, after
+    applying ``content_wrappers`` to them, if FEATURES['ENABLE_XBLOCK_FRAGMENT_CACHE'] is set
+    and the block is of one of the XBLOCK_FRAGMENT_CACHE_BLOCK_TYPES. Otherwise, return None.
+
+    The fragments are keyed by the time the block was last edited, so that they're cached
+    for each published version of its content.
+    """
+    if not settings.FEATURES.get('ENABLE_XBLOCK_FRAGMENT_CACHE', False):
+        return None
+    if descriptor.scope_ids.block_type not in settings.XBLOCK_FRAGMENT_CACHE_BLOCK_TYPES:
+        return None
+
+    edited_on = getattr(descriptor, 'edited_on', None)
+    if edited_on is None:
+        # Blocks of XML courses aren't versioned.
+        return None
+    if '%%USER_ID%%' in (getattr(descriptor, 'data', None) or ''):
+        # The anonymous id of the user is substituted into the content.
+        return None
+
+    key_parts = (
+        descriptor.location,
+        edited_on.isoformat(),
+        translation.get_language(),
+    )
+    return FragmentCache(cache, key_parts, content_wrappers, timeout=settings.XBLOCK_FRAGMENT_CACHE_TIMEOUT)
+
+
 def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=too-many-statements
                                # Arguments preceding this comment have user binding, those following don't
                                descriptor, course_id, track_function, xqueue_callback_url_prefix,
@@ -410,6 +526,8 @@ def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=to
     # TODO: Queuename should be derived from 'course_settings.json' of each course
     xqueue_default_queuename = descriptor.location.org + '-' + descriptor.location.course
 
+    shared_runtime = get_shared_runtime_state(user, course_id)
+
     xqueue = {
         'interface': XQUEUE_INTERFACE,
         'construct_callback': make_xqueue_callback,
@@ -612,7 +730,9 @@ def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=to
     # prefix is going to have to be specific to the module, not the directory
     # that the xml was loaded from
 
-    # Rewrite urls beginning in /static to point to course-specific content
+    # Rewrite urls beginning in /static to point to course-specific content. The rewritten
+    # urls depend on the locking of the assets and on the CDN configuration, so they're
+    # rewritten each time the Fragment is rendered, even if it's cached.
     block_wrappers.append(partial(
         replace_static_urls,
         getattr(descriptor, 'data_dir', None),
@@ -620,21 +740,29 @@ def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=to
         static_asset_path=static_asset_path or descriptor.static_asset_path
     ))
 
+    # The wrappers rewriting the other urls in the content of the Fragment, whose output only
+    # depends on the content, and which are applied before the Fragment is cached if it is.
+    content_wrappers = []
+
     # Allow URLs of the form '/course/' refer to the root of multicourse directory
     #   hierarchy of this course
-    block_wrappers.append(partial(replace_course_urls, course_id))
+    content_wrappers.append(partial(replace_course_urls, course_id))
 
     # this will rewrite intra-courseware links (/jump_to_id/<id>). This format
     # is an improvement over the /course/... format for studio authored courses,
     # because it is agnostic to course-hierarchy.
     # NOTE: module_id is empty string here. The 'module_id' will get assigned in the replacement
     # function, we just need to specify something to get the reverse() to work.
-    block_wrappers.append(partial(
+    content_wrappers.append(partial(
         replace_jump_to_id_urls,
         course_id,
-        reverse('jump_to_id', kwargs={'course_id': course_id.to_deprecated_string(), 'module_id': ''}),
+        shared_runtime.jump_to_id_base_url,
     ))
 
+    fragment_cache = get_fragment_cache(descriptor, content_wrappers)
+    if fragment_cache is None:
+        block_wrappers.extend(content_wrappers)
+
     if settings.FEATURES.get('DISPLAY_DEBUG_INFO_TO_STAFF'):
         if is_masquerading_as_specific_student(user, course_id):
             # When masquerading as a specific student, we want to show the debug button
@@ -672,6 +800,10 @@ def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=to
 
     user_is_staff = bool(has_access(user, u'staff', descriptor.location, course_id))
 
+    services = dict(shared_runtime.services)
+    services['field-data'] = field_data
+    services['user'] = shared_runtime.user_service(user_is_staff)
+
     system = LmsModuleSystem(
         track_function=track_function,
         render_template=render_to_string,
@@ -699,7 +831,7 @@ def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=to
         replace_jump_to_id_urls=partial(
             static_replace.replace_jump_to_id_urls,
             course_id=course_id,
-            jump_to_id_base_url=reverse('jump_to_id', kwargs={'course_id': course_id.to_deprecated_string(), 'module_id': ''})
+            jump_to_id_base_url=shared_runtime.jump_to_id_base_url,
         ),
         node_path=settings.NODE_PATH,
         publish=publish,
@@ -712,21 +844,13 @@ def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=to
         mixins=descriptor.runtime.mixologist._mixins,  # pylint: disable=protected-access
         wrappers=block_wrappers,
         get_real_user=user_by_anonymous_id,
-        services={
-            'i18n': ModuleI18nService(),
-            'fs': FSService(),
-            'field-data': field_data,
-            'user': DjangoXBlockUserService(user, user_is_staff=user_is_staff),
-            "reverification": ReverificationService(),
-            'proctoring': ProctoringService(),
-            'credit': CreditService(),
-            'bookmarks': BookmarksService(user=user),
-        },
+        services=services,
         get_user_role=lambda: get_user_role(user, course_id),
         descriptor_runtime=descriptor._runtime,  # pylint: disable=protected-access
         rebind_noauth_module_to_user=rebind_noauth_module_to_user,
         user_location=user_location,
         request_token=request_token,
+        fragment_cache=fragment_cache,
     )
 
     # pass position specified in URL to module through ModuleSystem
@@ -740,12 +864,12 @@ def get_module_system_for_user(user, student_data,  # TODO  # pylint: disable=to
     system.set('position', position)
 
     system.set(u'user_is_staff', user_is_staff)
-    system.set(u'user_is_admin', bool(has_access(user, u'staff', 'global')))
-    system.set(u'user_is_beta_tester', CourseBetaTesterRole(course_id).has_user(user))
+    system.set(u'user_is_admin', shared_runtime.user_is_admin)
+    system.set(u'user_is_beta_tester', shared_runtime.user_is_beta_tester)
     system.set(u'days_early_for_beta', descriptor.days_early_for_beta)
 
     # make an ErrorDescriptor -- assuming that the descriptor's system is ok
-    if has_access(user, u'staff', descriptor.location, course_id):
+    if user_is_staff:
         system.error_descriptor_class = ErrorDescriptor
     else:
         system.error_descriptor_class = NonStaffErrorDescriptor
@@ -1,9 +1,13 @@
 """
 Test grade calculation.
 """
+from datetime import datetime
+
+from django.conf import settings
 from django.http import Http404
 from django.test import TestCase
 from django.test.client import RequestFactory
+from django.utils.timezone import UTC
 
 from mock import patch, MagicMock
 from nose.plugins.attrib import attr
@@ -16,10 +20,12 @@ from courseware.grades import (
     iterate_grades_for,
     MaxScoresCache,
     ProgressSummary,
-    get_module_score
+    get_module_score,
+    _persist_subsection_grades,
 )
 from courseware.module_render import get_module
-from courseware.model_data import FieldDataCache, set_score
+from courseware.model_data import FieldDataCache, ScoresClient, set_score, user_states_for_users
+from courseware.models import PersistentSubsectionGrade
 from courseware.tests.helpers import (
     LoginEnrollmentTestCase,
     get_request_for_user
@@ -31,7 +37,7 @@ from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore.tests.django_utils import SharedModuleStoreTestCase
 
 
-def _grade_with_errors(student, request, course, keep_raw_scores=False):
+def _grade_with_errors(student, request, course, keep_raw_scores=False, **kwargs):
     """This fake grade method will throw exceptions for student3 and
     student4, but allow any other students to go through normal grading.
 
@@ -42,7 +48,7 @@ def _grade_with_errors(student, request, course, keep_raw_scores=False):
     if student.username in ['student3', 'student4']:
         raise Exception("I don't like {}".format(student.username))
 
-    return grade(student, request, course, keep_raw_scores=keep_raw_scores)
+    return grade(student, request, course, keep_raw_scores=keep_raw_scores, **kwargs)
 
 
 @attr('shard_1')
@@ -483,6 +489,174 @@ class TestGetModuleScore(LoginEnrollmentTestCase, SharedModuleStoreTestCase):
         self.assertEqual(score, 1.0)
 
 
+class TestBatchGrading(SharedModuleStoreTestCase):
+    """
+    Test that grading students in batches gives the same results as grading
+    them one at a time.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super(TestBatchGrading, cls).setUpClass()
+        cls.course = CourseFactory.create()
+        chapter = ItemFactory.create(parent=cls.course, category="chapter")
+        sequential = ItemFactory.create(parent=chapter, category='sequential', graded=True, format='Homework')
+        vertical = ItemFactory.create(parent=sequential, category='vertical')
+        problem_xml = MultipleChoiceResponseXMLFactory().build_xml(
+            question_text='The correct answer is Choice 3',
+            choices=[False, False, True, False],
+            choice_names=['choice_0', 'choice_1', 'choice_2', 'choice_3']
+        )
+        cls.problems = [
+            ItemFactory.create(parent=vertical, category="problem", data=problem_xml)
+            for __ in xrange(2)
+        ]
+
+    def setUp(self):
+        super(TestBatchGrading, self).setUp()
+        self.students = [UserFactory.create() for __ in xrange(5)]
+        for index, student in enumerate(self.students):
+            CourseEnrollment.enroll(student, self.course.id)
+            for problem in self.problems[:index % 3]:
+                set_score(student.id, problem.location, 1, 1)
+
+    def test_batches_match_single_grades(self):
+        batch_gradesets = {
+            student: gradeset
+            for student, gradeset, __ in iterate_grades_for(self.course, self.students, batch_size=2)
+        }
+        for student in self.students:
+            request = get_request_for_user(student)
+            request.session = {}
+            self.assertEqual(batch_gradesets[student], grade(student, request, self.course))
+
+    def test_scores_fetched_once_per_batch(self):
+        with patch('courseware.grades.ScoresClient.create_for_users', wraps=ScoresClient.create_for_users) as mock:
+            list(iterate_grades_for(self.course, self.students, batch_size=2))
+        self.assertEqual(mock.call_count, 3)
+
+    def test_states_fetched_once_per_batch(self):
+        with patch('courseware.grades.user_states_for_users', wraps=user_states_for_users) as mock:
+            list(iterate_grades_for(self.course, self.students, batch_size=2))
+        self.assertEqual(mock.call_count, 3)
+
+
+@patch.dict(settings.FEATURES, {'ENABLE_PERSISTENT_GRADES': True})
+class TestPersistentGrades(LoginEnrollmentTestCase, SharedModuleStoreTestCase):
+    """
+    Test that grades are stored per subsection, updated as scores change and
+    served from the store.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super(TestPersistentGrades, cls).setUpClass()
+        cls.course = CourseFactory.create()
+        chapter = ItemFactory.create(parent=cls.course, category="chapter")
+        cls.sequentials = []
+        cls.problems = []
+        problem_xml = MultipleChoiceResponseXMLFactory().build_xml(
+            question_text='The correct answer is Choice 3',
+            choices=[False, False, True, False],
+            choice_names=['choice_0', 'choice_1', 'choice_2', 'choice_3']
+        )
+        for __ in xrange(2):
+            sequential = ItemFactory.create(parent=chapter, category='sequential', graded=True, format='Homework')
+            vertical = ItemFactory.create(parent=sequential, category='vertical')
+            cls.sequentials.append(sequential)
+            cls.problems.append(ItemFactory.create(parent=vertical, category="problem", data=problem_xml))
+
+    def setUp(self):
+        super(TestPersistentGrades, self).setUp()
+        self.request = get_request_for_user(UserFactory())
+        self.client.login(username=self.request.user.username, password="test")
+        CourseEnrollment.enroll(self.request.user, self.course.id)
+
+    def _stored_grades(self):
+        """
+        Returns the stored subsection grades of the test user, keyed by subsection.
+        """
+        return {
+            subsection_grade.usage_key: subsection_grade
+            for subsection_grade in PersistentSubsectionGrade.objects.filter(user=self.request.user)
+        }
+
+    def test_grade_is_stored(self):
+        answer_problem(self.course, self.request, self.problems[0])
+        grade_summary = grade(self.request.user, self.request, self.course)
+
+        stored_grades = self._stored_grades()
+        self.assertEqual(
+            set(stored_grades),
+            set(sequential.location for sequential in self.sequentials)
+        )
+        self.assertIsNone(stored_grades[self.sequentials[1].location].get_scores())
+        scores = stored_grades[self.sequentials[0].location].get_scores()
+        self.assertEqual([(score.earned, score.possible) for score in scores], [(1, 1)])
+
+        with patch('courseware.grades._grade') as mock_grade:
+            self.assertEqual(grade(self.request.user, self.request, self.course), grade_summary)
+            self.assertFalse(mock_grade.called)
+
+    def test_score_change_updates_store(self):
+        answer_problem(self.course, self.request, self.problems[0])
+        grade(self.request.user, self.request, self.course)
+
+        answer_problem(self.course, self.request, self.problems[0], score=0)
+        scores = self._stored_grades()[self.sequentials[0].location].get_scores()
+        self.assertEqual([(score.earned, score.possible) for score in scores], [(0, 1)])
+
+        with patch('courseware.grades._grade') as mock_grade:
+            self.assertEqual(grade(self.request.user, self.request, self.course)['percent'], 0)
+            self.assertFalse(mock_grade.called)
+
+    def test_score_change_in_unattempted_subsection(self):
+        grade(self.request.user, self.request, self.course)
+        self.assertEqual(len(self._stored_grades()), 2)
+
+        # The store cannot be patched without knowing the other scores of
+        # the subsection, so it is discarded and rebuilt on the next read.
+        answer_problem(self.course, self.request, self.problems[1])
+        self.assertEqual(self._stored_grades(), {})
+
+        grade(self.request.user, self.request, self.course)
+        scores = self._stored_grades()[self.sequentials[1].location].get_scores()
+        self.assertEqual([(score.earned, score.possible) for score in scores], [(1, 1)])
+
+    def test_release_invalidates_store(self):
+        answer_problem(self.course, self.request, self.problems[0])
+        grade_summary = grade(self.request.user, self.request, self.course)
+
+        # Content released since the grade was stored may hold problems the
+        # grade left out, so the grade is computed again.
+        with patch('courseware.grades._latest_release', return_value=datetime.now(UTC())):
+            with patch('courseware.grades._grade', return_value=grade_summary) as mock_grade:
+                grade(self.request.user, self.request, self.course)
+            self.assertTrue(mock_grade.called)
+
+    def test_group_change_invalidates_store(self):
+        answer_problem(self.course, self.request, self.problems[0])
+        grade_summary = grade(self.request.user, self.request, self.course)
+
+        with patch('courseware.grades._user_partition_groups', return_value=[(0, 1)]):
+            with patch('courseware.grades._grade', return_value=grade_summary) as mock_grade:
+                grade(self.request.user, self.request, self.course)
+            self.assertTrue(mock_grade.called)
+
+    def test_concurrently_stored_grades(self):
+        answer_problem(self.course, self.request, self.problems[0])
+        grade(self.request.user, self.request, self.course)
+        PersistentSubsectionGrade.objects.filter(user=self.request.user).update(course_version='')
+
+        # Storing the grades again fails on the rows stored concurrently, which are updated instead.
+        with patch.object(PersistentSubsectionGrade.objects, 'filter'):
+            _persist_subsection_grades(self.request.user, self.course, [
+                ('Homework', sequential, None) for sequential in self.sequentials
+            ])
+        stored_grades = self._stored_grades()
+        self.assertEqual(len(stored_grades), 2)
+        self.assertTrue(all(stored_grade.course_version for stored_grade in stored_grades.itervalues()))
+        self.assertTrue(all(stored_grade.get_scores() is None for stored_grade in stored_grades.itervalues()))
+
+
 def answer_problem(course, request, problem, score=1):
     """
     Records a correct answer for the given problem.
@@ -0,0 +1,94 @@
+"""
+Tests of the writing of StudentModuleHistory entries.
+"""
+import json
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import patch
+from opaque_keys.edx.locator import CourseLocator
+
+from courseware.history import DatabaseHistorySink, HistorySink, LogHistorySink, batch_history
+from courseware.models import StudentModule, StudentModuleHistory
+from courseware.tests.factories import StudentModuleFactory, UserFactory
+
+
+class TestHistory(TestCase):
+    """
+    Tests of the writing of StudentModuleHistory entries, right away and in bulk.
+    """
+    def setUp(self):
+        super(TestHistory, self).setUp()
+        self.user = UserFactory.create()
+        course_key = CourseLocator('org', 'course', 'run')
+        self.problem_keys = [course_key.make_usage_key('problem', 'problem{}'.format(index)) for index in range(3)]
+
+    def _save_modules(self):
+        """
+        Save a problem StudentModule for each of the problem keys, and update each of them.
+        """
+        student_modules = [
+            StudentModuleFactory.create(student=self.user, module_state_key=usage_key, course_id=usage_key.course_key)
+            for usage_key in self.problem_keys
+        ]
+        for student_module in student_modules:
+            student_module.state = json.dumps({'attempts': 0})
+            student_module.save()
+        return student_modules
+
+    def test_write_on_save(self):
+        usage_key = self.problem_keys[0]
+        StudentModuleFactory.create(student=self.user, module_state_key=usage_key, course_id=usage_key.course_key)
+        self.assertEqual(StudentModuleHistory.objects.count(), 1)
+
+    def test_batch_history(self):
+        with patch.object(DatabaseHistorySink, 'write', autospec=True) as mock_write:
+            with batch_history() as batch:
+                self._save_modules()
+                self.assertEqual(len(batch.entries), 6)
+                self.assertFalse(mock_write.called)
+        self.assertEqual(mock_write.call_count, 1)
+        self.assertEqual(len(mock_write.call_args[0][1]), 6)
+
+    def test_nested_batch_history(self):
+        with patch.object(DatabaseHistorySink, 'write', autospec=True) as mock_write:
+            with batch_history() as outer_batch:
+                with batch_history() as batch:
+                    self._save_modules()
+                self.assertEqual(mock_write.call_count, 1)
+                self.assertEqual(len(mock_write.call_args[0][1]), 6)
+                self.assertEqual(outer_batch.entries, [])
+        self.assertEqual(mock_write.call_count, 1)
+        self.assertEqual(batch.entries, [])
+
+    def test_batch_history_writes(self):
+        with batch_history(batch_size=4):
+            self._save_modules()
+            self.assertEqual(StudentModuleHistory.objects.count(), 4)
+        self.assertEqual(StudentModuleHistory.objects.count(), 6)
+        student_module = StudentModule.objects.get(module_state_key=self.problem_keys[0])
+        history_entries = StudentModuleHistory.objects.filter(student_module=student_module).order_by('id')
+        self.assertEqual([entry.state for entry in history_entries], [None, json.dumps({'attempts': 0})])
+
+    def test_batch_history_drops_on_error(self):
+        with self.assertRaises(ValueError):
+            with batch_history():
+                self._save_modules()
+                raise ValueError()
+        self.assertEqual(StudentModuleHistory.objects.count(), 0)
+
+    @override_settings(STUDENT_MODULE_HISTORY={'STORAGE_TYPE': 'log', 'LOGGER': 'test_history'})
+    def test_log_sink(self):
+        sink = HistorySink.from_config()
+        self.assertIsInstance(sink, LogHistorySink)
+        with patch.object(sink.logger, 'info') as mock_info:
+            with batch_history(sink=sink):
+                self._save_modules()
+        self.assertEqual(mock_info.call_count, 6)
+        self.assertEqual(json.loads(mock_info.call_args[0][0])['state'], json.dumps({'attempts': 0}))
+        self.assertEqual(StudentModuleHistory.objects.count(), 0)
+
+    @override_settings(STUDENT_MODULE_HISTORY={'STORAGE_TYPE': 'unknown'})
+    def test_unknown_sink(self):
+        with self.assertRaises(ValueError):
+            HistorySink.from_config()
@@ -3,13 +3,20 @@ Tests for courseware middleware
 """
 
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.test import TestCase
 from django.test.client import RequestFactory
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from mock import patch
 from nose.plugins.attrib import attr
+from opaque_keys.edx.locator import CourseLocator
 
 import courseware.courses as courses
-from courseware.middleware import RedirectUnenrolledMiddleware
+from courseware.middleware import RedirectUnenrolledMiddleware, UserStateWriteBufferMiddleware
+from courseware.models import StudentModule
+from courseware.tests.factories import UserFactory
+from courseware.user_state_client import DjangoXBlockUserStateClient, get_write_buffer
+from request_cache.middleware import RequestCache
 from xmodule.modulestore.tests.django_utils import SharedModuleStoreTestCase
 from xmodule.modulestore.tests.factories import CourseFactory
 
@@ -55,3 +62,53 @@ class CoursewareMiddlewareTestCase(SharedModuleStoreTestCase):
             request, Http404()
         )
         self.assertIsNone(response)
+
+
+@attr('shard_1')
+class UserStateWriteBufferMiddlewareTestCase(TestCase):
+    """Tests that the buffered user state writes of a request are saved at its end"""
+
+    def setUp(self):
+        super(UserStateWriteBufferMiddlewareTestCase, self).setUp()
+        self.addCleanup(RequestCache.clear_request_cache)
+        self.middleware = UserStateWriteBufferMiddleware()
+        self.request = RequestFactory().get("dummy_url")
+        self.user = UserFactory.create()
+        self.usage_key = CourseLocator('org', 'course', 'run').make_usage_key('video', 'video')
+
+    def _set_state(self):
+        """Start buffering, and write the state of the video"""
+        self.middleware.process_request(self.request)
+        DjangoXBlockUserStateClient(self.user).set(self.user.username, self.usage_key, {'position': 1})
+
+    def _is_saved(self):
+        """Whether the state of the video is saved"""
+        return StudentModule.objects.filter(student=self.user, module_state_key=self.usage_key).exists()
+
+    def test_disabled(self):
+        self._set_state()
+        self.assertIsNone(get_write_buffer())
+        self.assertTrue(self._is_saved())
+
+    @patch.dict("django.conf.settings.FEATURES", {"ENABLE_USER_STATE_WRITE_BEHIND": True})
+    def test_flush_on_response(self):
+        self._set_state()
+        self.assertFalse(self._is_saved())
+        response = HttpResponse()
+        self.assertIs(self.middleware.process_response(self.request, response), response)
+        self.assertTrue(self._is_saved())
+
+    @patch.dict("django.conf.settings.FEATURES", {"ENABLE_USER_STATE_WRITE_BEHIND": True})
+    def test_drop_on_exception(self):
+        self._set_state()
+        self.middleware.process_view(self.request, lambda request: None, (), {})
+        self.assertIsNone(self.middleware.process_exception(self.request, ValueError()))
+        self.middleware.process_response(self.request, HttpResponse())
+        self.assertFalse(self._is_saved())
+
+    @patch.dict("django.conf.settings.FEATURES", {"ENABLE_USER_STATE_WRITE_BEHIND": True})
+    def test_flush_on_exception_in_non_atomic_view(self):
+        self._set_state()
+        self.middleware.process_view(self.request, transaction.non_atomic_requests(lambda request: None), (), {})
+        self.assertIsNone(self.middleware.process_exception(self.request, ValueError()))
+        self.assertTrue(self._is_saved())
@@ -6,7 +6,9 @@ from mock import Mock, patch
 from nose.plugins.attrib import attr
 from functools import partial
 
-from courseware.model_data import DjangoKeyValueStore, FieldDataCache, InvalidScopeError
+from courseware.model_data import (
+    DjangoKeyValueStore, FieldDataCache, InvalidScopeError, block_structure_descendents, user_states_for_users
+)
 from courseware.models import StudentModule, XModuleUserStateSummaryField
 from courseware.models import XModuleStudentInfoField, XModuleStudentPrefsField
 
@@ -18,6 +20,7 @@ from courseware.tests.factories import StudentPrefsFactory, StudentInfoFactory
 from xblock.fields import Scope, BlockScope, ScopeIds
 from xblock.exceptions import KeyValueMultiSaveError
 from xblock.core import XBlock
+from opaque_keys.edx.block_types import BlockTypeKeyV1
 from django.test import TestCase
 from django.db import DatabaseError
 
@@ -415,3 +418,84 @@ class TestStudentInfoStorage(OtherUserFailureTestMixin, StorageTestBase, TestCas
     storage_class = XModuleStudentInfoField
     other_key_factory = partial(DjangoKeyValueStore.Key, Scope.user_info, 2, 'mock_problem')  # user_id=2, not 1
     existing_field_name = "existing_field"
+
+
+@attr('shard_1')
+class TestPrefetchUsageKeys(TestCase):
+    """Tests for caching field data from usage keys, rather than descriptors"""
+
+    def setUp(self):
+        super(TestPrefetchUsageKeys, self).setUp()
+        student_module = StudentModuleFactory(state=json.dumps({'a_field': 'a_value'}))
+        self.user = student_module.student
+        UserStateSummaryFactory(field_name='summary_field')
+        StudentPrefsFactory(
+            student=self.user,
+            field_name='prefs_field',
+            module_type=BlockTypeKeyV1(XBlock.entry_point, 'problem'),
+        )
+        StudentInfoFactory(student=self.user, field_name='info_field')
+
+    def test_prefetch_usage_keys(self):
+        field_data_cache = FieldDataCache([], course_id, self.user)
+        # One query per scope, for any number of blocks
+        with self.assertNumQueries(4):
+            field_data_cache.prefetch_usage_keys([location('usage_id'), location('other_id')])
+        with self.assertNumQueries(0):
+            field_data_cache.prefetch_usage_keys([location('usage_id')])
+            field_data_cache.add_descriptors_to_cache([mock_descriptor([
+                mock_field(Scope.user_state, 'a_field'),
+                mock_field(Scope.user_state_summary, 'summary_field'),
+            ])])
+
+        kvs = DjangoKeyValueStore(field_data_cache)
+        self.assertEquals('a_value', kvs.get(user_state_key('a_field')))
+        self.assertEquals('old_value', kvs.get(user_state_summary_key('summary_field')))
+        self.assertEquals(
+            'old_value',
+            kvs.get(DjangoKeyValueStore.Key(Scope.preferences, self.user.id, 'problem', 'prefs_field'))
+        )
+        self.assertEquals('old_value', kvs.get(user_info_key('info_field')))
+        self.assertFalse(kvs.has(user_state_key('b_field')))
+
+    def test_add_user_states(self):
+        other_user = UserFactory.create()
+        usage_keys = [location('usage_id'), location('other_id')]
+        with self.assertNumQueries(1):
+            user_states = user_states_for_users(course_id, [self.user.id, other_user.id], usage_keys)
+        self.assertEquals(
+            user_states,
+            {self.user.id: {location('usage_id'): {'a_field': 'a_value'}}, other_user.id: {}}
+        )
+
+        field_data_cache = FieldDataCache([], course_id, self.user)
+        field_data_cache.add_user_states(usage_keys, user_states[self.user.id])
+        # Only the other scopes are queried
+        with self.assertNumQueries(3):
+            field_data_cache.add_descriptors_to_cache([mock_descriptor([
+                mock_field(Scope.user_state, 'a_field'),
+                mock_field(Scope.user_state_summary, 'summary_field'),
+                mock_field(Scope.preferences, 'prefs_field'),
+                mock_field(Scope.user_info, 'info_field'),
+            ])])
+        kvs = DjangoKeyValueStore(field_data_cache)
+        self.assertEquals('a_value', kvs.get(user_state_key('a_field')))
+
+    def test_block_structure_descendents(self):
+        children = {
+            'course': ['chapter1', 'chapter2'],
+            'chapter1': ['sequential1'],
+            'sequential1': ['vertical1', 'vertical2'],
+            'vertical1': ['problem1'],
+        }
+        block_structure = Mock()
+        block_structure.get_children.side_effect = lambda usage_key: children.get(usage_key, [])
+
+        self.assertEquals(
+            block_structure_descendents(block_structure, 'course', depth=2),
+            ['course', 'chapter1', 'chapter2', 'sequential1'],
+        )
+        self.assertEquals(
+            block_structure_descendents(block_structure, 'sequential1'),
+            ['sequential1', 'vertical1', 'vertical2', 'problem1'],
+        )
@@ -12,6 +12,7 @@ from bson import ObjectId
 from django.http import Http404, HttpResponse
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.core.cache import cache
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from django.contrib.auth.models import AnonymousUser
@@ -19,6 +20,7 @@ from mock import MagicMock, patch, Mock
 from opaque_keys.edx.keys import UsageKey, CourseKey
 from opaque_keys.edx.locations import SlashSeparatedCourseKey
 from pyquery import PyQuery
+from request_cache.middleware import RequestCache
 from courseware.module_render import hash_resource
 from xblock.field_data import FieldData
 from xblock.runtime import Runtime
@@ -1268,6 +1270,70 @@ class TestHtmlModifiers(ModuleStoreTestCase):
             result_fragment.content
         )
 
+    def _render_student_view(self):
+        """
+        Render the student_view of the html block in a new request.
+        """
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = {}
+        module = render.get_module(self.user, request, self.location, self.field_data_cache)
+        return module.render(STUDENT_VIEW).content
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_XBLOCK_FRAGMENT_CACHE': True})
+    def test_fragment_cache(self):
+        self.addCleanup(cache.clear)
+        content = self._render_student_view()
+        with patch('xmodule.html_module.HtmlBlock.get_html') as mock_get_html:
+            cached_content = self._render_student_view()
+        self.assertFalse(mock_get_html.called)
+        self.assertIn('/courses/{}/bar/content'.format(self.course.id.to_deprecated_string()), cached_content)
+        self.assertEqual(len(PyQuery(cached_content)('div.xblock.xblock-student_view.xmodule_HtmlModule')), 1)
+        # The wrappers depending on the request are applied to the cached fragment.
+        self.assertNotEqual(
+            PyQuery(content)('div.xblock').attr('data-request-token'),
+            PyQuery(cached_content)('div.xblock').attr('data-request-token'),
+        )
+
+        # Editing the block renders it again.
+        self.descriptor.data = self.content_string
+        self.store.update_item(self.descriptor, self.user.id)
+        self.store.publish(self.location, self.user.id)
+        self.assertNotIn('Test course rewrite', self._render_student_view())
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_XBLOCK_FRAGMENT_CACHE': True})
+    def test_fragment_cache_static_urls(self):
+        self.addCleanup(cache.clear)
+        self._render_student_view()
+        with patch('xmodule.html_module.HtmlBlock.get_html') as mock_get_html:
+            with patch('static_replace.replace_static_urls', return_value='<p>replaced</p>') as mock_replace:
+                cached_content = self._render_student_view()
+        self.assertFalse(mock_get_html.called)
+        # The static urls are rewritten on each render, as they depend on the locking of the assets.
+        self.assertTrue(mock_replace.called)
+        self.assertIn('<p>replaced</p>', cached_content)
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_XBLOCK_FRAGMENT_CACHE': True})
+    def test_fragment_cache_metrics(self):
+        self.addCleanup(cache.clear)
+        self._render_student_view()
+        with patch('xmodule.x_module.dog_stats_api.increment') as mock_increment:
+            self._render_student_view()
+        self.assertTrue(any(
+            'action:render' in call_kwargs['tags'] for __, call_kwargs in mock_increment.call_args_list
+        ))
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_XBLOCK_FRAGMENT_CACHE': True})
+    def test_fragment_cache_user_id(self):
+        self.addCleanup(cache.clear)
+        self.descriptor.data = '<p>%%USER_ID%%</p>'
+        self.store.update_item(self.descriptor, self.user.id)
+        self.store.publish(self.location, self.user.id)
+        self._render_student_view()
+        with patch('xmodule.html_module.HtmlBlock.get_html', return_value='') as mock_get_html:
+            self._render_student_view()
+        self.assertTrue(mock_get_html.called)
+
 
 class XBlockWithJsonInitData(XBlock):
     """
@@ -2017,6 +2083,59 @@ class LMSXBlockServiceBindingTest(SharedModuleStoreTestCase):
         self.assertFalse(runtime.user_is_beta_tester)
         self.assertEqual(runtime.days_early_for_beta, 5)
 
+    def _get_runtime_services(self):
+        """
+        Return the services of the module systems of two modules bound to the user.
+        """
+        runtimes = [
+            render.get_module_system_for_user(
+                self.user,
+                self.student_data,
+                ItemFactory(category="html", parent=self.course),
+                self.course.id,
+                self.track_function,
+                self.xqueue_callback_url_prefix,
+                self.request_token,
+                course=self.course
+            )[0]
+            for __ in range(2)
+        ]
+        self.assertIsNot(runtimes[0], runtimes[1])
+        return [runtime._services for runtime in runtimes]  # pylint: disable=protected-access
+
+    @ddt.data("user", "i18n", "bookmarks")
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_SHARED_MODULE_RUNTIME': True})
+    def test_shared_runtime_services(self, service_name):
+        """
+        Tests that the modules rendered in a request share services, but not their field data.
+        """
+        self.addCleanup(RequestCache.clear_request_cache)
+        RequestCache().process_request(RequestFactory().get('/'))
+        services, other_services = self._get_runtime_services()
+        self.assertIs(services[service_name], other_services[service_name])
+        self.assertIsNot(services['field-data'], other_services['field-data'])
+
+        RequestCache().process_request(RequestFactory().get('/'))
+        next_services = self._get_runtime_services()[0]
+        self.assertIsNot(services[service_name], next_services[service_name])
+
+    def test_unshared_runtime_services(self):
+        """
+        Tests that the modules don't share services without FEATURES['ENABLE_SHARED_MODULE_RUNTIME'].
+        """
+        self.addCleanup(RequestCache.clear_request_cache)
+        RequestCache().process_request(RequestFactory().get('/'))
+        services, other_services = self._get_runtime_services()
+        self.assertIsNot(services['user'], other_services['user'])
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_SHARED_MODULE_RUNTIME': True})
+    def test_unshared_runtime_services_outside_request(self):
+        """
+        Tests that the modules don't share services outside of a request, e.g. in celery tasks.
+        """
+        services, other_services = self._get_runtime_services()
+        self.assertIsNot(services['user'], other_services['user'])
+
 
 class PureXBlockWithChildren(PureXBlock):
     """
@@ -3,14 +3,19 @@ Black-box tests of the DjangoUserStateClient against the semantics
 defined in edx_user_state_client.
 """
 
+import json
 from collections import defaultdict
 from unittest import skip
 
 from django.test import TestCase
+from opaque_keys.edx.locator import CourseLocator
 
 from edx_user_state_client.tests import UserStateClientTestBase
-from courseware.user_state_client import DjangoXBlockUserStateClient
+from courseware.model_data import set_score
+from courseware.models import StudentModule
+from courseware.user_state_client import DjangoXBlockUserStateClient, get_write_buffer, start_write_buffer
 from courseware.tests.factories import UserFactory
+from request_cache.middleware import RequestCache
 
 
 class TestDjangoUserStateClient(UserStateClientTestBase, TestCase):
@@ -65,3 +70,83 @@ class TestDjangoUserStateClient(UserStateClientTestBase, TestCase):
     @skip("Not supported by DjangoXBlockUserStateClient")
     def test_iter_course_many_users(self):
         pass
+
+
+class TestUserStateWriteBuffer(TestCase):
+    """
+    Tests of the buffering of user state writes by the DjangoXBlockUserStateClient.
+    """
+    def setUp(self):
+        super(TestUserStateWriteBuffer, self).setUp()
+        self.user = UserFactory.create()
+        self.client = DjangoXBlockUserStateClient(self.user)
+        course_key = CourseLocator('org', 'course', 'run')
+        self.video_keys = [course_key.make_usage_key('video', 'video{}'.format(index)) for index in range(3)]
+        self.problem_key = course_key.make_usage_key('problem', 'problem')
+        self.addCleanup(RequestCache.clear_request_cache)
+        self.write_buffer = start_write_buffer(['video', 'problem'])
+
+    def _stored_state(self, usage_key):
+        """
+        Return the state of ``usage_key`` stored in the database, or None if there isn't any.
+        """
+        try:
+            return json.loads(StudentModule.objects.get(student=self.user, module_state_key=usage_key).state)
+        except StudentModule.DoesNotExist:
+            return None
+
+    def test_not_buffering(self):
+        RequestCache.clear_request_cache()
+        self.assertIsNone(get_write_buffer())
+        self.client.set(self.user.username, self.video_keys[0], {'position': 1})
+        self.assertEqual(self._stored_state(self.video_keys[0]), {'position': 1})
+
+    def test_history_saving_types_not_buffered(self):
+        self.assertFalse(self.write_buffer.buffers(self.problem_key))
+        self.client.set(self.user.username, self.problem_key, {'answer': 1})
+        self.assertEqual(len(self.write_buffer), 0)
+        self.assertEqual(self._stored_state(self.problem_key), {'answer': 1})
+
+    def test_writes_are_coalesced(self):
+        for position in range(5):
+            self.client.set_many(
+                self.user.username,
+                {usage_key: {'position': position} for usage_key in self.video_keys},
+            )
+        self.client.set(self.user.username, self.video_keys[0], {'speed': 2})
+        self.assertEqual(len(self.write_buffer), 3)
+        self.assertIsNone(self._stored_state(self.video_keys[0]))
+
+        self.write_buffer.flush()
+        self.assertEqual(len(self.write_buffer), 0)
+        self.assertEqual(self._stored_state(self.video_keys[0]), {'position': 4, 'speed': 2})
+        for usage_key in self.video_keys[1:]:
+            self.assertEqual(self._stored_state(usage_key), {'position': 4})
+
+    def test_flush_updates_state_only(self):
+        set_score(self.user.id, self.video_keys[0], 1, 2)
+        self.client.set(self.user.username, self.video_keys[0], {'position': 1})
+        self.write_buffer.flush()
+        self.client.set(self.user.username, self.video_keys[0], {'speed': 2})
+        self.write_buffer.flush()
+
+        student_module = StudentModule.objects.get(student=self.user, module_state_key=self.video_keys[0])
+        self.assertEqual(json.loads(student_module.state), {'position': 1, 'speed': 2})
+        self.assertEqual((student_module.grade, student_module.max_grade), (1, 2))
+
+    def test_reads_flush_writes(self):
+        self.client.set(self.user.username, self.video_keys[0], {'position': 1})
+        self.client.set(self.user.username, self.video_keys[1], {'position': 2})
+        self.assertEqual(self.client.get(self.user.username, self.video_keys[0]).state, {'position': 1})
+        self.assertEqual(len(self.write_buffer), 1)
+
+        self.client.delete(self.user.username, self.video_keys[1], fields=['position'])
+        self.assertEqual(len(self.write_buffer), 0)
+        self.assertEqual(self._stored_state(self.video_keys[1]), {})
+
+    def test_set_score_flushes_writes(self):
+        self.client.set(self.user.username, self.video_keys[0], {'position': 1})
+        self.client.set(self.user.username, self.video_keys[1], {'position': 2})
+        set_score(self.user.id, self.video_keys[0], 1, 1)
+        self.assertEqual(len(self.write_buffer), 1)
+        self.assertEqual(self._stored_state(self.video_keys[0]), {'position': 1})
@@ -4,6 +4,8 @@ data in a Django ORM model.
 """
 
 import itertools
+import logging
+from collections import OrderedDict, defaultdict
 from operator import attrgetter
 from time import time
 
@@ -14,9 +16,150 @@ except ImportError:
 
 import dogstats_wrapper as dog_stats_api
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from xblock.fields import Scope, ScopeBase
 from courseware.models import StudentModule, StudentModuleHistory
 from edx_user_state_client.interface import XBlockUserStateClient, XBlockUserState
+import request_cache
+
+log = logging.getLogger(__name__)
+
+# The name of the request cache holding the UserStateWriteBuffer of the request.
+WRITE_BUFFER_CACHE = 'courseware.user_state_write_buffer'
+
+
+def get_write_buffer():
+    """
+    Return the :class:`UserStateWriteBuffer` of the current request, or None if
+    user state writes aren't buffered.
+    """
+    return request_cache.get_cache(WRITE_BUFFER_CACHE).get('buffer')
+
+
+def start_write_buffer(block_types):
+    """
+    Buffer the user state writes of blocks of ``block_types`` made during the current
+    request, returning the :class:`UserStateWriteBuffer` they're buffered in.
+    """
+    write_buffer = UserStateWriteBuffer(block_types)
+    request_cache.get_cache(WRITE_BUFFER_CACHE)['buffer'] = write_buffer
+    return write_buffer
+
+
+class UserStateWriteBuffer(object):
+    """
+    Coalesces Scope.user_state writes per user and block, to save them in bulk (with :meth:`flush`),
+    instead of saving each write as it's made.
+
+    Only the writes of blocks of the given types are buffered, except for the types whose state
+    history is saved (as it's saved on each write).
+    """
+    def __init__(self, block_types):
+        self.block_types = frozenset(block_types) - StudentModuleHistory.HISTORY_SAVING_TYPES
+        # Whether the buffered writes are dropped, rather than saved, if the request raises an
+        # exception, as the other writes of the request are rolled back with its transaction.
+        self.drop_on_exception = True
+        self._pending = OrderedDict()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def buffers(self, usage_key):
+        """
+        Whether writes to the state of ``usage_key`` are buffered.
+        """
+        return usage_key.block_type in self.block_types
+
+    def add(self, user_id, usage_key, state):
+        """
+        Buffer the write of the fields in ``state`` to the state of ``usage_key`` for the user
+        with id ``user_id``, overlaying any writes already buffered for them.
+        """
+        self._pending.setdefault((user_id, usage_key), {}).update(state)
+
+    def clear(self):
+        """
+        Drop the buffered writes, without saving them.
+        """
+        self._pending.clear()
+
+    def flush(self, user_id=None, usage_keys=None):
+        """
+        Save the buffered writes, in a single transaction. Only the writes for the user with
+        id ``user_id``, and to the state of ``usage_keys``, are saved, if given.
+        """
+        if usage_keys is not None:
+            usage_keys = set(usage_keys)
+        to_save = defaultdict(dict)
+        for pending_key in self._pending.keys():
+            pending_user_id, usage_key = pending_key
+            if user_id is not None and pending_user_id != user_id:
+                continue
+            if usage_keys is not None and usage_key not in usage_keys:
+                continue
+            to_save[(pending_user_id, usage_key.course_key)][usage_key] = self._pending.pop(pending_key)
+
+        if to_save:
+            with transaction.atomic():
+                for (pending_user_id, course_key), states in to_save.iteritems():
+                    self._save(pending_user_id, course_key, states)
+
+    def _save(self, user_id, course_key, states):
+        """
+        Save ``states`` (a dict mapping usage keys to state updates) for the user with id ``user_id``
+        in the course ``course_key``, updating the existing StudentModules one by one, and creating
+        the missing ones at once.
+        """
+        states = dict(states)
+        modified = timezone.now()
+        existing = StudentModule.objects.chunked_filter(
+            'module_state_key__in',
+            states.keys(),
+            student_id=user_id,
+            course_id=course_key,
+        )
+        for student_module in existing:
+            state = states.pop(student_module.module_state_key.map_into_course(course_key), None)
+            if state is None:
+                continue
+            current_state = json.loads(student_module.state) if student_module.state else {}
+            current_state.update(state)
+            # An update, rather than a save, which leaves the grade as it is in the database.
+            StudentModule.objects.filter(id=student_module.id).update(
+                state=json.dumps(current_state),
+                modified=modified,
+            )
+
+        if not states:
+            return
+        new_modules = [
+            StudentModule(
+                student_id=user_id,
+                course_id=course_key,
+                module_state_key=usage_key,
+                module_type=usage_key.block_type,
+                state=json.dumps(state),
+            )
+            for usage_key, state in states.iteritems()
+        ]
+        try:
+            with transaction.atomic():
+                StudentModule.objects.bulk_create(new_modules)
+        except IntegrityError:
+            # Some of the StudentModules were created since they were looked up, so save them one by one.
+            for usage_key, state in states.iteritems():
+                __, created = StudentModule.objects.get_or_create(
+                    student_id=user_id,
+                    course_id=course_key,
+                    module_state_key=usage_key,
+                    defaults={
+                        'state': json.dumps(state),
+                        'module_type': usage_key.block_type,
+                    },
+                )
+                if not created:
+                    self._save(user_id, course_key, {usage_key: state})
 
 
 class DjangoXBlockUserStateClient(XBlockUserStateClient):
@@ -116,6 +259,15 @@ class DjangoXBlockUserStateClient(XBlockUserStateClient):
             sample_rate=self.API_DATADOG_SAMPLE_RATE,
         )
 
+    def _flush_buffered_writes(self, block_keys):
+        """
+        Save any buffered writes to the state of ``block_keys``, so that they're read from
+        (or deleted from) the database.
+        """
+        write_buffer = get_write_buffer()
+        if write_buffer:
+            write_buffer.flush(usage_keys=block_keys)
+
     def get_many(self, username, block_keys, scope=Scope.user_state, fields=None):
         """
         Retrieve the stored XBlock state for the specified XBlock usages.
@@ -138,6 +290,7 @@ class DjangoXBlockUserStateClient(XBlockUserStateClient):
 
         self._ddog_histogram(evt_time, 'get_many.blks_requested', len(block_keys))
 
+        self._flush_buffered_writes(block_keys)
         modules = self._get_student_modules(username, block_keys)
         for module, usage_key in modules:
             if module.state is None:
@@ -180,6 +333,9 @@ class DjangoXBlockUserStateClient(XBlockUserStateClient):
                 are overlaid over the stored state. To delete fields, use
                 :meth:`delete` or :meth:`delete_many`.
             scope (Scope): The scope to load data from
+
+        The writes to blocks whose writes are buffered in the request (see
+        :class:`UserStateWriteBuffer`) are saved when the buffer is flushed.
         """
         if scope != Scope.user_state:
             raise ValueError("Only Scope.user_state is supported")
@@ -195,6 +351,14 @@ class DjangoXBlockUserStateClient(XBlockUserStateClient):
 
         evt_time = time()
 
+        write_buffer = get_write_buffer()
+        if write_buffer is not None:
+            block_keys_to_state = dict(block_keys_to_state)
+            for usage_key in block_keys_to_state.keys():
+                if write_buffer.buffers(usage_key):
+                    write_buffer.add(user.id, usage_key, block_keys_to_state.pop(usage_key))
+                    self._ddog_increment(evt_time, 'set_many.state_buffered')
+
         for usage_key, state in block_keys_to_state.items():
             student_module, created = StudentModule.objects.get_or_create(
                 student=user,
@@ -266,6 +430,7 @@ class DjangoXBlockUserStateClient(XBlockUserStateClient):
 
         self._ddog_histogram(evt_time, 'delete_many.block_count', len(block_keys))
 
+        self._flush_buffered_writes(block_keys)
         student_modules = self._get_student_modules(username, block_keys)
         for student_module, _ in student_modules:
             if fields is None:
@@ -304,6 +469,7 @@ class DjangoXBlockUserStateClient(XBlockUserStateClient):
 
         if scope != Scope.user_state:
             raise ValueError("Only Scope.user_state is supported")
+        self._flush_buffered_writes([block_key])
         student_modules = list(
             student_module
             for student_module, usage_id
@@ -58,7 +58,7 @@ from courseware.courses import (
     UserNotEnrolled
 )
 from courseware.masquerade import setup_masquerade
-from courseware.model_data import FieldDataCache, ScoresClient
+from courseware.model_data import FieldDataCache, ScoresClient, block_structure_descendents
 from courseware.models import StudentModuleHistory
 from courseware.url_helpers import get_redirect_url
 from courseware.user_state_client import DjangoXBlockUserStateClient
@@ -87,6 +87,7 @@ from xmodule.modulestore.exceptions import ItemNotFoundError, NoPathToItem
 from xmodule.tabs import CourseTabList
 from xmodule.x_module import STUDENT_VIEW
 from lms.djangoapps.ccx.custom_exception import CCXLocatorValidationException
+from lms.djangoapps.course_blocks.api import get_course_if_in_cache
 from .entrance_exams import (
     course_has_entrance_exam,
     get_entrance_exam_content,
@@ -360,6 +361,35 @@ def index(request, course_id, chapter=None, section=None,
         return _index_bulk_op(request, course_key, chapter, section, position)
 
 
+def _prefetch_field_data_cache(course, user, chapter, section):
+    """
+    Returns a FieldDataCache with the field data of the course and 2 levels of its
+    descendants, and of the requested section and all of its descendants, read with
+    one (chunked) query per scope. The blocks are found in the cached course block
+    structure, so no descriptors are loaded to build the cache.
+
+    The block structure is only used if it's already in the cache, as collecting it
+    would cost far more than it saves. Otherwise, and for blocks missing from the
+    structure (e.g. if it's outdated), the field data is cached from the descriptors,
+    as they are added to the cache for rendering.
+    """
+    field_data_cache = FieldDataCache([], course.id, user)
+    block_structure = get_course_if_in_cache(course.id)
+    if block_structure is not None and course.location in block_structure:
+        usage_keys = block_structure_descendents(block_structure, course.location, depth=2)
+        if chapter and section:
+            for chapter_key in block_structure.get_children(course.location):
+                if chapter_key.block_id != chapter:
+                    continue
+                for section_key in block_structure.get_children(chapter_key):
+                    if section_key.block_id == section:
+                        usage_keys.extend(block_structure_descendents(block_structure, section_key))
+        field_data_cache.prefetch_usage_keys(usage_keys)
+
+    field_data_cache.add_descriptor_descendents(course, depth=2)
+    return field_data_cache
+
+
 # pylint: disable=too-many-statements
 def _index_bulk_op(request, course_key, chapter, section, position):
     """
@@ -418,8 +448,11 @@ def _index_bulk_op(request, course_key, chapter, section, position):
     bookmarks_api_url = reverse('bookmarks')
 
     try:
-        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
-            course_key, user, course, depth=2)
+        if settings.FEATURES.get('ENABLE_FIELD_DATA_CACHE_PREFETCH'):
+            field_data_cache = _prefetch_field_data_cache(course, user, chapter, section)
+        else:
+            field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+                course_key, user, course, depth=2)
 
         course_module = get_module_for_descriptor(
             user, request, course, field_data_cache, course_key, course=course
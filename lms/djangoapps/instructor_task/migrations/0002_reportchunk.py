@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instructor_task', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportChunk',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('task_id', models.CharField(max_length=255, db_index=True)),
+                ('subtask_id', models.CharField(unique=True, max_length=255)),
+                ('rows', models.TextField(blank=True)),
+                ('err_rows', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
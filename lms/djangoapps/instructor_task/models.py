@@ -179,6 +179,38 @@ class InstructorTask(models.Model):
         return json.dumps({'message': 'Task revoked before running'})
 
 
+class ReportChunk(models.Model):
+    """
+    Holds the CSV rows computed by one subtask of a report that is generated
+    by several subtasks in parallel, until the last subtask to finish merges
+    them into a single report.
+
+    `task_id` is the celery task id of the parent InstructorTask, and
+    `subtask_id` the id of the subtask that produced the rows. `rows` and
+    `err_rows` are JSON-serialized lists of rows; the first row of `rows` is
+    the header, if any student could be processed.
+    """
+    class Meta(object):
+        app_label = "instructor_task"
+
+    task_id = models.CharField(max_length=255, db_index=True)
+    subtask_id = models.CharField(max_length=255, unique=True)
+    rows = models.TextField(blank=True)
+    err_rows = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def rows_for_task(cls, task_id):
+        """
+        Returns a list of (rows, err_rows) tuples, one for each chunk stored
+        for the given parent task.
+        """
+        return [
+            (json.loads(chunk.rows), json.loads(chunk.err_rows))
+            for chunk in cls.objects.filter(task_id=task_id).order_by('id')
+        ]
+
+
 class ReportStore(object):
     """
     Simple abstraction layer that can fetch and store CSV files for reports
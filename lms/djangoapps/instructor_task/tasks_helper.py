@@ -5,6 +5,7 @@ running state of a course.
 """
 import json
 import re
+import sys
 from collections import OrderedDict
 from datetime import datetime
 from django.conf import settings
@@ -15,8 +16,14 @@ import unicodecsv
 import logging
 
 from celery import Task, current_task
-from celery.states import SUCCESS, FAILURE
+from celery.states import SUCCESS, FAILURE, READY_STATES
+from capa.capa_problem import LoncapaProblem, LoncapaSystem
+from capa.correctmap import CorrectMap
+from capa.responsetypes import (
+    LoncapaProblemError, ResponseError, StudentInputError, registry as response_registry
+)
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.files.storage import DefaultStorage
 from django.db import transaction, reset_queries
 from django.db.models import Q
@@ -25,6 +32,7 @@ from pytz import UTC
 from StringIO import StringIO
 from edxmako.shortcuts import render_to_string
 from instructor.paidcourse_enrollment_report import PaidCourseEnrollmentReportProvider
+from lxml import etree
 from shoppingcart.models import (
     PaidCourseRegistration, CourseRegCodeItem, InvoiceTransaction,
     Invoice, CouponRedemption, RegistrationCodeRedemption, CourseRegistrationCode
@@ -32,10 +40,11 @@ from shoppingcart.models import (
 from survey.models import SurveyAnswer
 
 from track.views import task_track
+from util import milestones_helpers
 from util.db import outer_atomic
 from util.file import course_filename_prefix_generator, UniversalNewlineIterator
 from xblock.runtime import KvsFieldData
-from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.django import modulestore, ModuleI18nService
 from xmodule.split_test_module import get_split_user_partitions
 from django.utils.translation import ugettext as _
 from certificates.models import (
@@ -47,9 +56,10 @@ from certificates.models import (
 from certificates.api import generate_user_certificates
 from courseware.courses import get_course_by_id, get_problems_in_section
 from courseware.grades import iterate_grades_for
-from courseware.models import StudentModule
+from courseware.history import batch_history, record_history
+from courseware.models import StudentModule, StudentModuleHistory, SCORE_CHANGED
 from courseware.model_data import DjangoKeyValueStore, FieldDataCache
-from courseware.module_render import get_module_for_descriptor_internal
+from courseware.module_render import get_module_for_descriptor_internal, get_score_bucket
 from instructor_analytics.basic import (
     enrolled_students_features,
     get_proctored_exam_results,
@@ -57,7 +67,14 @@ from instructor_analytics.basic import (
     list_problem_responses
 )
 from instructor_analytics.csvs import format_dictlist
-from instructor_task.models import ReportStore, InstructorTask, PROGRESS
+from instructor_task.models import ReportChunk, ReportStore, InstructorTask, PROGRESS
+from instructor_task.subtasks import (
+    SUBTASK_LOCK_EXPIRE,
+    SubtaskStatus,
+    check_subtask_is_valid,
+    queue_subtasks_for_query,
+    update_subtask_status,
+)
 from lms.djangoapps.lms_xblock.runtime import LmsPartitionService
 from openedx.core.djangoapps.course_groups.cohorts import get_cohort
 from openedx.core.djangoapps.course_groups.models import CourseUserGroup
@@ -79,6 +96,22 @@ UPDATE_STATUS_SUCCEEDED = 'succeeded'
 UPDATE_STATUS_FAILED = 'failed'
 UPDATE_STATUS_SKIPPED = 'skipped'
 
+# Number of StudentModules read and updated in one transaction by perform_module_state_update
+MODULE_STATE_UPDATE_BATCH_SIZE = 100
+# Number of StudentModules read, rescored and written together when bulk rescoring
+BULK_RESCORE_BATCH_SIZE = 100
+# Response types whose grading depends only on the problem definition, the seed and
+# the student's stored answers, so that they can be bulk rescored
+BULK_RESCORE_RESPONSE_TYPES = frozenset([
+    'choiceresponse',
+    'formularesponse',
+    'multiplechoiceresponse',
+    'numericalresponse',
+    'optionresponse',
+    'stringresponse',
+    'truefalseresponse',
+])
+
 # The setting name used for events when "settings" (account settings, preferences, profile information) change.
 REPORT_REQUESTED_EVENT_NAME = u'edx.instructor.report.requested'
 
@@ -308,7 +341,8 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     If a `filter_fcn` is not None, it is applied to the query that has been constructed.  It takes one
     argument, which is the query being filtered, and returns the filtered version of the query.
 
-    The `update_fcn` is called on each StudentModule that passes the resulting filtering.
+    The `update_fcn` is called on each StudentModule that passes the resulting filtering, in
+    transactions of MODULE_STATE_UPDATE_BATCH_SIZE StudentModules each.
     It is passed three arguments:  the module_descriptor for the module pointed to by the
     module_state_key, the particular StudentModule to update, and the xmodule_instance_args being
     passed through.  If the value returned by the update function evaluates to a boolean True,
@@ -332,6 +366,65 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
 
     """
     start_time = time()
+    problems, modules_to_update = _get_modules_to_update(course_id, task_input, filter_fcn)
+
+    task_progress = TaskProgress(action_name, modules_to_update.count(), start_time)
+    task_progress.update_task_state()
+
+    for batch in _iterate_in_batches(modules_to_update, MODULE_STATE_UPDATE_BATCH_SIZE):
+        # Each batch is updated in one transaction, in which the history entries of its
+        # StudentModules are written in bulk.
+        with outer_atomic(), batch_history():
+            for module_to_update in batch:
+                module_descriptor = problems[unicode(module_to_update.module_state_key)]
+                # There is no try here:  if there's an error, we let it throw, and the task will
+                # be marked as FAILED, with a stack trace.
+                with dog_stats_api.timer(
+                    'instructor_tasks.module.time.step', tags=[u'action:{name}'.format(name=action_name)]
+                ):
+                    update_status = update_fcn(module_descriptor, module_to_update)
+                    _record_update_status(task_progress, update_status)
+
+    return task_progress.update_task_state()
+
+
+def perform_bulk_rescore(xmodule_instance_args, filter_fcn, _entry_id, course_id, task_input, action_name):
+    """
+    Rescores the StudentModule instances that `perform_module_state_update` would visit, in batches.
+
+    The StudentModules are read BULK_RESCORE_BATCH_SIZE at a time, rather than all at once, and
+    each batch is rescored by a BulkProblemRescorer, which writes the new states and scores of
+    the batch together.  Task progress is updated after each batch.
+
+    The return value is a dict containing the task's results, as for `perform_module_state_update`.
+    """
+    start_time = time()
+    problems, modules_to_update = _get_modules_to_update(course_id, task_input, filter_fcn)
+
+    task_progress = TaskProgress(action_name, modules_to_update.count(), start_time)
+    task_progress.update_task_state()
+
+    rescorer = BulkProblemRescorer(xmodule_instance_args)
+    modules_to_update = modules_to_update.select_related('student')
+    for batch in _iterate_in_batches(modules_to_update, BULK_RESCORE_BATCH_SIZE):
+        with dog_stats_api.timer(
+            'instructor_tasks.module.time.batch', tags=[u'action:{name}'.format(name=action_name)]
+        ):
+            update_statuses = rescorer.rescore_batch(problems, batch)
+        for update_status in update_statuses:
+            _record_update_status(task_progress, update_status)
+        task_progress.update_task_state()
+
+    return task_progress.update_task_state()
+
+
+def _get_modules_to_update(course_id, task_input, filter_fcn):
+    """
+    Returns the problem descriptors and the query for the StudentModules to be visited for `task_input`.
+
+    The problem descriptors are returned as a dict keyed by the string form of their usage keys.
+    See `perform_module_state_update` for how the StudentModules are selected.
+    """
     usage_keys = []
     problem_url = task_input.get('problem_url')
     entrance_exam_url = task_input.get('entrance_exam_url')
@@ -372,28 +465,39 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     if filter_fcn is not None:
         modules_to_update = filter_fcn(modules_to_update)
 
-    task_progress = TaskProgress(action_name, modules_to_update.count(), start_time)
-    task_progress.update_task_state()
+    return problems, modules_to_update
 
-    for module_to_update in modules_to_update:
-        task_progress.attempted += 1
-        module_descriptor = problems[unicode(module_to_update.module_state_key)]
-        # There is no try here:  if there's an error, we let it throw, and the task will
-        # be marked as FAILED, with a stack trace.
-        with dog_stats_api.timer('instructor_tasks.module.time.step', tags=[u'action:{name}'.format(name=action_name)]):
-            update_status = update_fcn(module_descriptor, module_to_update)
-            if update_status == UPDATE_STATUS_SUCCEEDED:
-                # If the update_fcn returns true, then it performed some kind of work.
-                # Logging of failures is left to the update_fcn itself.
-                task_progress.succeeded += 1
-            elif update_status == UPDATE_STATUS_FAILED:
-                task_progress.failed += 1
-            elif update_status == UPDATE_STATUS_SKIPPED:
-                task_progress.skipped += 1
-            else:
-                raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
 
-    return task_progress.update_task_state()
+def _iterate_in_batches(queryset, batch_size):
+    """
+    Yields lists of the objects in `queryset`, in id order, `batch_size` objects at a time.
+
+    Each batch is a separate query, so the objects are never all in memory at once.
+    """
+    queryset = queryset.order_by('id')
+    last_id = None
+    while True:
+        batch_queryset = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        batch = list(batch_queryset[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def _record_update_status(task_progress, update_status):
+    """Counts an `update_status` returned by an update function in `task_progress`."""
+    task_progress.attempted += 1
+    if update_status == UPDATE_STATUS_SUCCEEDED:
+        # If the update_fcn returns true, then it performed some kind of work.
+        # Logging of failures is left to the update_fcn itself.
+        task_progress.succeeded += 1
+    elif update_status == UPDATE_STATUS_FAILED:
+        task_progress.failed += 1
+    elif update_status == UPDATE_STATUS_SKIPPED:
+        task_progress.skipped += 1
+    else:
+        raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
 
 
 def _get_task_id_from_xmodule_args(xmodule_instance_args):
@@ -468,7 +572,6 @@ def _get_module_instance_for_task(course_id, student, module_descriptor, xmodule
     )
 
 
-@outer_atomic
 def rescore_problem_module_state(xmodule_instance_args, module_descriptor, student_module):
     '''
     Takes an XModule descriptor and a corresponding StudentModule object, and
@@ -557,7 +660,279 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
             return UPDATE_STATUS_SUCCEEDED
 
 
-@outer_atomic
+class _RescoreModule(object):
+    """
+    Stands in for the capa module of a LoncapaProblem used by BulkProblemRescorer.
+
+    Responses only use the module's location, and its runtime's track function
+    (which is set to the track function of each student being rescored).
+    """
+    def __init__(self, location):
+        self.location = location
+        self.runtime = self
+        self.track_function = None
+
+
+class BulkProblemRescorer(object):
+    """
+    Rescores StudentModules of capa problems in batches.
+
+    A problem without scripts whose responses are all of BULK_RESCORE_RESPONSE_TYPES
+    is graded the same way for every student with the same seed.  Such problems are
+    rescored by one LoncapaProblem per problem and seed, loaded with each student's
+    stored state in turn, instead of a module instance (and its runtime and field
+    data cache) per student.  The new states and scores of a batch are then written
+    in one transaction, along with their history entries.
+
+    Other problems are rescored one StudentModule at a time by `rescore_problem_module_state`,
+    each StudentModule being saved with its history entry in a transaction of its own.
+    """
+    # Maximum number of LoncapaProblems (one per problem and seed) kept for reuse
+    MAX_PROBLEMS = 100
+
+    def __init__(self, xmodule_instance_args):
+        self.xmodule_instance_args = xmodule_instance_args
+        self.entrance_exams_enabled = milestones_helpers.is_entrance_exams_enabled()
+        self._bulk_rescorable = {}
+        self._problems = OrderedDict()
+
+    def rescore_batch(self, module_descriptors, student_modules):
+        """
+        Rescores `student_modules`, and returns their update statuses.
+
+        `module_descriptors` is a dict of the problem descriptors keyed by the string
+        form of their usage keys.
+        """
+        update_statuses = []
+        rescored_modules = []
+        modules_to_rescore_individually = []
+        for student_module in student_modules:
+            module_descriptor = module_descriptors[unicode(student_module.module_state_key)]
+            state = json.loads(student_module.state) if student_module.state else {}
+            problem = None
+            if state.get('done') and state.get('seed') is not None:
+                problem = self._get_problem(module_descriptor, state['seed'])
+
+            if problem is None:
+                modules_to_rescore_individually.append((module_descriptor, student_module))
+                continue
+
+            update_status = self._rescore(problem, student_module, state)
+            if update_status == UPDATE_STATUS_SUCCEEDED:
+                rescored_modules.append((student_module, state, problem.get_score()))
+            update_statuses.append(update_status)
+
+        self._save(rescored_modules)
+
+        for module_descriptor, student_module in modules_to_rescore_individually:
+            with outer_atomic():
+                update_statuses.append(
+                    rescore_problem_module_state(self.xmodule_instance_args, module_descriptor, student_module)
+                )
+        return update_statuses
+
+    def _get_problem(self, module_descriptor, seed):
+        """
+        Returns the LoncapaProblem for rescoring `module_descriptor` with `seed`, or None
+        if the problem can't be bulk rescored.
+        """
+        location = module_descriptor.location
+        if location not in self._bulk_rescorable:
+            self._bulk_rescorable[location] = self._is_bulk_rescorable(module_descriptor)
+        if not self._bulk_rescorable[location]:
+            return None
+
+        key = (location, seed)
+        if key in self._problems:
+            return self._problems[key]
+
+        capa_system = LoncapaSystem(
+            ajax_url=None,
+            anonymous_student_id=None,
+            cache=cache,
+            can_execute_unsafe_code=lambda: False,
+            get_python_lib_zip=lambda: None,
+            DEBUG=settings.DEBUG,
+            filestore=module_descriptor.runtime.resources_fs,
+            i18n=ModuleI18nService(),
+            node_path=settings.NODE_PATH,
+            render_template=render_to_string,
+            seed=None,
+            STATIC_URL=settings.STATIC_URL,
+            xqueue=None,
+            matlab_api_key=module_descriptor.matlab_api_key,
+        )
+        try:
+            problem = LoncapaProblem(
+                problem_text=module_descriptor.data,
+                id=location.html_id(),
+                capa_system=capa_system,
+                capa_module=_RescoreModule(location),
+                seed=seed,
+            )
+        except Exception:  # pylint: disable=broad-except
+            # Leave it to the module instance to report the error.
+            TASK_LOG.warning(u"Cannot bulk rescore problem %s", location, exc_info=True)
+            problem = None
+
+        if problem is not None and any(
+                responder.has_mask() or responder.has_shuffle() or responder.has_answerpool()
+                for responder in problem.responders.values()
+        ):
+            # Tracking events for permuted choices are translated by the capa module.
+            problem = None
+
+        if problem is None:
+            self._bulk_rescorable[location] = False
+            return None
+
+        self._problems[key] = problem
+        while len(self._problems) > self.MAX_PROBLEMS:
+            self._problems.popitem(last=False)
+        return problem
+
+    def _is_bulk_rescorable(self, module_descriptor):
+        """
+        Returns whether the problem of `module_descriptor` grades the same way for every student with the same seed.
+        """
+        if module_descriptor.location.category != 'problem':
+            return False
+        if self.entrance_exams_enabled and getattr(module_descriptor, 'in_entrance_exam', False):
+            # Rescoring can fulfill entrance exam milestones, which needs the module instance.
+            return False
+        try:
+            tree = etree.XML(module_descriptor.data)
+        except etree.XMLSyntaxError:
+            return False
+        tags = set(node.tag for node in tree.iter() if isinstance(node.tag, basestring))
+        if 'script' in tags or 'include' in tags:
+            return False
+        response_types = tags.intersection(response_registry.registered_tags())
+        return bool(response_types) and response_types <= BULK_RESCORE_RESPONSE_TYPES
+
+    def _rescore(self, problem, student_module, state):
+        """
+        Rescores the stored answers of `student_module` with `problem`, as CapaModule.rescore_problem does.
+
+        On success, updates `state` with the new state of the problem and returns
+        UPDATE_STATUS_SUCCEEDED.
+        """
+        course_id = student_module.course_id
+        student = student_module.student
+        usage_key = student_module.module_state_key
+        track_function = _get_track_function_for_task(student, self.xmodule_instance_args)
+        problem.capa_module.runtime.track_function = track_function
+
+        problem.student_answers = state.get('student_answers', {})
+        problem.correct_map = CorrectMap()
+        problem.correct_map.set_dict(state.get('correct_map', {}))
+        problem.done = state['done']
+        problem.input_state = state.get('input_state', {})
+
+        event_info = {'state': problem.get_state(), 'problem_id': usage_key.to_deprecated_string()}
+        orig_score = problem.get_score()
+        event_info['orig_score'] = orig_score['score']
+        event_info['orig_total'] = orig_score['total']
+
+        try:
+            correct_map = problem.rescore_existing_answers()
+        except (StudentInputError, ResponseError, LoncapaProblemError) as err:
+            event_info['failure'] = 'input_error'
+            track_function('problem_rescore_fail', event_info)
+            TASK_LOG.warning(
+                u"error processing rescore call for course %(course)s, problem %(loc)s "
+                u"and student %(student)s: %(msg)s",
+                dict(
+                    msg=u"Error: {0}".format(err.message),
+                    course=course_id,
+                    loc=usage_key,
+                    student=student
+                )
+            )
+            return UPDATE_STATUS_FAILED
+        except Exception:
+            event_info['failure'] = 'unexpected'
+            track_function('problem_rescore_fail', event_info)
+            raise
+
+        new_score = problem.get_score()
+        event_info['new_score'] = new_score['score']
+        event_info['new_total'] = new_score['total']
+
+        # success = correct if ALL questions in this problem are correct
+        success = 'correct'
+        for answer_id in correct_map:
+            if not correct_map.is_correct(answer_id):
+                success = 'incorrect'
+
+        event_info['correct_map'] = correct_map.get_dict()
+        event_info['success'] = success
+        event_info['attempts'] = state.get('attempts', 0)
+        track_function('problem_rescore', event_info)
+
+        state.update(problem.get_state())
+        TASK_LOG.debug(
+            u"successfully processed rescore call for course %(course)s, problem %(loc)s "
+            u"and student %(student)s: %(msg)s",
+            dict(
+                msg=success,
+                course=course_id,
+                loc=usage_key,
+                student=student
+            )
+        )
+        return UPDATE_STATUS_SUCCEEDED
+
+    def _save(self, rescored_modules):
+        """
+        Writes the new states and scores of `rescored_modules`, a list of
+        (StudentModule, state, score) tuples, and announces the score changes.
+        """
+        if not rescored_modules:
+            return
+
+        modified = datetime.now(UTC)
+        # The history entries are written in bulk, in the same transaction as the states.
+        with outer_atomic(), batch_history():
+            for student_module, state, score in rescored_modules:
+                student_module.state = json.dumps(state)
+                student_module.grade = score['score']
+                student_module.max_grade = score['total']
+                student_module.modified = modified
+                StudentModule.objects.filter(id=student_module.id).update(
+                    state=student_module.state,
+                    grade=student_module.grade,
+                    max_grade=student_module.max_grade,
+                    modified=modified,
+                )
+                if student_module.module_type in StudentModuleHistory.HISTORY_SAVING_TYPES:
+                    record_history(StudentModuleHistory(
+                        student_module=student_module,
+                        version=None,
+                        created=modified,
+                        state=student_module.state,
+                        grade=student_module.grade,
+                        max_grade=student_module.max_grade,
+                    ))
+
+        for student_module, _state, score in rescored_modules:
+            course_id = student_module.course_id
+            dog_stats_api.increment("lms.courseware.question_answered", tags=[
+                u"org:{}".format(course_id.org),
+                u"course:{}".format(course_id),
+                u"score_bucket:{0}".format(get_score_bucket(score['score'], score['total'])),
+                u"type:rescore",
+            ])
+            SCORE_CHANGED.send(
+                sender=None,
+                points_possible=score['total'],
+                points_earned=score['score'],
+                user_id=student_module.student_id,
+                course_id=unicode(course_id),
+                usage_id=unicode(student_module.module_state_key)
+            )
+
+
 def reset_attempts_module_state(xmodule_instance_args, _module_descriptor, student_module):
     """
     Resets problem attempts to zero for specified `student_module`.
@@ -584,7 +959,6 @@ def reset_attempts_module_state(xmodule_instance_args, _module_descriptor, stude
     return update_status
 
 
-@outer_atomic
 def delete_problem_module_state(xmodule_instance_args, _module_descriptor, student_module):
     """
     Delete the StudentModule entry.
@@ -656,7 +1030,7 @@ def upload_exec_summary_to_store(data_dict, report_name, course_id, generated_at
     tracker.emit(REPORT_REQUESTED_EVENT_NAME, {"report_type": report_name})
 
 
-def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):  # pylint: disable=too-many-statements
+def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name, chunk_subtask=None):
     """
     For a given `course_id`, generate a grades CSV file for all students that
     are enrolled, and store using a `ReportStore`. Once created, the files can
@@ -665,15 +1039,28 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
     buffered, so we'll never write part of a CSV file to S3 -- i.e. any files
     that are visible in ReportStore will be complete ones.
 
+    If `chunk_subtask` is provided and more than
+    `settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK` students are enrolled, the
+    students are instead split into chunks that are graded in parallel by
+    `chunk_subtask` subtasks (see `upload_grades_csv_chunk`), and the last of
+    them to complete uploads the merged report.
+
     As we start to add more CSV downloads, it will probably be worthwhile to
     make a more general CSVDoc class instead of building out the rows like we
     do here.
     """
     start_time = time()
     start_date = datetime.now(UTC)
-    status_interval = 100
     enrolled_students = CourseEnrollment.objects.users_enrolled_in(course_id)
-    task_progress = TaskProgress(action_name, enrolled_students.count(), start_time)
+    total_enrolled_students = enrolled_students.count()
+
+    students_per_task = settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK
+    if chunk_subtask is not None and students_per_task and total_enrolled_students > students_per_task:
+        return _queue_grades_csv_subtasks(
+            _entry_id, action_name, chunk_subtask, enrolled_students, total_enrolled_students, students_per_task
+        )
+
+    task_progress = TaskProgress(action_name, total_enrolled_students, start_time)
 
     fmt = u'Task: {task_id}, InstructorTask ID: {entry_id}, Course: {course_id}, Input: {task_input}'
     task_info_string = fmt.format(
@@ -685,6 +1072,35 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
     TASK_LOG.info(u'%s, Task type: %s, Starting task execution', task_info_string, action_name)
 
     course = get_course_by_id(course_id)
+    rows, err_rows = _compute_grade_report_rows(
+        course, enrolled_students, total_enrolled_students, task_progress, task_info_string, action_name
+    )
+
+    # By this point, we've got the rows we're going to stuff into our CSV files.
+    current_step = {'step': 'Uploading CSVs'}
+    task_progress.update_task_state(extra_meta=current_step)
+    TASK_LOG.info(u'%s, Task type: %s, Current step: %s', task_info_string, action_name, current_step)
+
+    # Perform the actual upload
+    _upload_grade_report(rows, err_rows, course_id, start_date)
+
+    # One last update before we close out...
+    TASK_LOG.info(u'%s, Task type: %s, Finalizing grade task', task_info_string, action_name)
+    return task_progress.update_task_state(extra_meta=current_step)
+
+
+def _compute_grade_report_rows(  # pylint: disable=too-many-statements
+        course, students, total_students, task_progress, task_info_string, action_name):
+    """
+    Grade the given `students` and build the rows of the grade report for them.
+
+    Returns a tuple `(rows, err_rows)`. The first row of `rows` is the header,
+    provided at least one student could be graded. `err_rows` contains an
+    `[id, username, error_msg]` row for each student that could not be graded.
+    `task_progress` is updated as students are graded.
+    """
+    course_id = course.id
+    status_interval = 100
     course_is_cohorted = is_course_cohorted(course.id)
     teams_enabled = course.teams_enabled
     cohorts_header = ['Cohort Name'] if course_is_cohorted else []
@@ -700,10 +1116,9 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
     # Loop over all our students and build our CSV lists in memory
     header = None
     rows = []
-    err_rows = [["id", "username", "error_msg"]]
+    err_rows = []
     current_step = {'step': 'Calculating Grades'}
 
-    total_enrolled_students = enrolled_students.count()
     student_counter = 0
     TASK_LOG.info(
         u'%s, Task type: %s, Current step: %s, Starting grade calculation for total students: %s',
@@ -711,9 +1126,9 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
         action_name,
         current_step,
 
-        total_enrolled_students
+        total_students
     )
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
+    for student, gradeset, err_msg in iterate_grades_for(course, students):
         # Periodically update task status (this is a cache write)
         if task_progress.attempted % status_interval == 0:
             task_progress.update_task_state(extra_meta=current_step)
@@ -728,7 +1143,7 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
             action_name,
             current_step,
             student_counter,
-            total_enrolled_students
+            total_students
         )
 
         if gradeset:
@@ -802,24 +1217,199 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
         action_name,
         current_step,
         student_counter,
-        total_enrolled_students
+        total_students
     )
+    return rows, err_rows
 
-    # By this point, we've got the rows we're going to stuff into our CSV files.
-    current_step = {'step': 'Uploading CSVs'}
-    task_progress.update_task_state(extra_meta=current_step)
-    TASK_LOG.info(u'%s, Task type: %s, Current step: %s', task_info_string, action_name, current_step)
 
-    # Perform the actual upload
-    upload_csv_to_report_store(rows, 'grade_report', course_id, start_date)
+def _upload_grade_report(rows, err_rows, course_id, timestamp):
+    """
+    Upload the grade report, and the report of students that could not be
+    graded if there are any.
+    """
+    upload_csv_to_report_store(rows, 'grade_report', course_id, timestamp)
 
-    # If there are any error rows (don't count the header), write them out as well
-    if len(err_rows) > 1:
-        upload_csv_to_report_store(err_rows, 'grade_report_err', course_id, start_date)
+    # If there are any error rows, write them out as well
+    if err_rows:
+        upload_csv_to_report_store(
+            [["id", "username", "error_msg"]] + err_rows, 'grade_report_err', course_id, timestamp
+        )
 
-    # One last update before we close out...
-    TASK_LOG.info(u'%s, Task type: %s, Finalizing grade task', task_info_string, action_name)
-    return task_progress.update_task_state(extra_meta=current_step)
+
+def _queue_grades_csv_subtasks(
+        entry_id, action_name, chunk_subtask, enrolled_students, total_students, students_per_task):
+    """
+    Split the enrolled students into chunks of `students_per_task`, and queue
+    a `chunk_subtask` for each of them. Returns the task progress as stored in
+    the InstructorTask, which the subtasks will keep updated from then on.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+
+    # If the parent task was requeued (e.g. after losing the connection to the
+    # broker), the subtasks have already been defined, so don't queue them again.
+    if len(entry.subtasks) > 0 and len(entry.task_output) > 0:
+        TASK_LOG.warning(
+            u"Task %s has already queued its grade report subtasks! InstructorTask = %s", entry.task_id, entry
+        )
+        return json.loads(entry.task_output)
+
+    def _create_grades_csv_subtask(student_list, initial_subtask_status):
+        """Creates a subtask to grade the given students."""
+        return chunk_subtask.subtask(
+            (
+                entry_id,
+                [student['pk'] for student in student_list],
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+            routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+        )
+
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        _create_grades_csv_subtask,
+        [enrolled_students],
+        [],
+        students_per_task,
+        total_students,
+    )
+
+
+def upload_grades_csv_chunk(entry_id, student_ids, subtask_status_dict, action_name):
+    """
+    Grade a chunk of the students enrolled in the course of the InstructorTask
+    `entry_id`, as a subtask queued by `upload_grades_csv`, and store the
+    resulting rows as a `ReportChunk`.
+
+    The progress of the subtask is recorded in the parent InstructorTask. The
+    last subtask to complete merges the stored chunks and uploads the report.
+    Returns the final status of the subtask, as a dict.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+
+    # Reject subtasks that are unknown to the InstructorTask, already
+    # completed, or already being run by another worker.
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    entry = InstructorTask.objects.get(pk=entry_id)
+    fmt = u'Task: {task_id}, Subtask: {subtask_id}, InstructorTask ID: {entry_id}, Course: {course_id}'
+    task_info_string = fmt.format(
+        task_id=entry.task_id,
+        subtask_id=current_task_id,
+        entry_id=entry_id,
+        course_id=entry.course_id,
+    )
+    try:
+        course = get_course_by_id(entry.course_id)
+        students = User.objects.filter(id__in=student_ids)
+        task_progress = TaskProgress(action_name, len(student_ids), time())
+        rows, err_rows = _compute_grade_report_rows(
+            course, students, len(student_ids), task_progress, task_info_string, action_name
+        )
+        ReportChunk.objects.create(
+            task_id=entry.task_id,
+            subtask_id=current_task_id,
+            rows=json.dumps(rows),
+            err_rows=json.dumps(err_rows),
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        # Since we don't know how far we got, count every student of the
+        # chunk as failed, to keep the counts of the parent task consistent,
+        # and list them in the error report.
+        exc_info = sys.exc_info()
+        TASK_LOG.exception(
+            u'%s, Task type: %s, Grade report subtask failed unexpectedly', task_info_string, action_name
+        )
+        _store_failed_grades_csv_chunk(entry.task_id, current_task_id, student_ids, exc)
+        subtask_status.increment(failed=len(student_ids), state=FAILURE)
+        _complete_grades_csv_chunk(entry_id, current_task_id, subtask_status, task_info_string, action_name)
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+    subtask_status.increment(
+        succeeded=task_progress.succeeded,
+        failed=task_progress.failed,
+        skipped=len(student_ids) - task_progress.attempted,
+        state=SUCCESS,
+    )
+    _complete_grades_csv_chunk(entry_id, current_task_id, subtask_status, task_info_string, action_name)
+    return subtask_status.to_dict()
+
+
+def _store_failed_grades_csv_chunk(task_id, subtask_id, student_ids, exc):
+    """
+    Store a `ReportChunk` for a grade report subtask that failed, with an
+    error row for each of the students of its chunk.
+    """
+    err_msg = u'Grade report subtask failed: {}'.format(exc)
+    try:
+        err_rows = [
+            [student_id, username, err_msg]
+            for student_id, username in User.objects.filter(id__in=student_ids).values_list('id', 'username')
+        ]
+        ReportChunk.objects.update_or_create(
+            subtask_id=subtask_id,
+            defaults={'task_id': task_id, 'rows': json.dumps([]), 'err_rows': json.dumps(err_rows)},
+        )
+    except Exception:  # pylint: disable=broad-except
+        TASK_LOG.exception(u'Unable to store the error rows of failed grade report subtask %s', subtask_id)
+
+
+def _complete_grades_csv_chunk(entry_id, current_task_id, subtask_status, task_info_string, action_name):
+    """
+    Record the final status of a grade report subtask in the parent
+    InstructorTask, and merge the chunks and upload the report if it was the
+    last subtask to complete, whether it succeeded or failed.
+
+    The parent task is marked as failed if any of its subtasks failed.
+    """
+    update_subtask_status(entry_id, current_task_id, subtask_status, fail_on_subtask_failure=True)
+
+    entry = InstructorTask.objects.get(pk=entry_id)
+    if entry.task_state in READY_STATES:
+        _merge_grades_csv_chunks(entry, task_info_string, action_name)
+
+
+def _merge_grades_csv_chunks(entry, task_info_string, action_name):
+    """
+    Merge the rows stored by every grade report subtask of `entry` and upload
+    the resulting report.
+    """
+    # Two subtasks completing at the same time may both see the parent task
+    # as done; only let one of them upload the report.
+    lock_key = u"grade-report-merge-{}".format(entry.task_id)
+    if not cache.add(lock_key, 'true', SUBTASK_LOCK_EXPIRE):
+        return
+
+    TASK_LOG.info(u'%s, Task type: %s, Merging grade report chunks', task_info_string, action_name)
+    header = None
+    rows = []
+    err_rows = []
+    for chunk_rows, chunk_err_rows in ReportChunk.rows_for_task(entry.task_id):
+        err_rows.extend(chunk_err_rows)
+        if not chunk_rows:
+            continue
+        chunk_header, chunk_rows = chunk_rows[0], chunk_rows[1:]
+        if header is None:
+            header = chunk_header
+        elif chunk_header != header:
+            # Line up the columns with those of the first chunk.
+            chunk_rows = [
+                [dict(zip(chunk_header, row)).get(column, '') for column in header]
+                for row in chunk_rows
+            ]
+        rows.extend(chunk_rows)
+
+    # Keep the report in a stable order, whichever chunk finished first.
+    rows.sort(key=lambda row: row[0])
+    err_rows.sort(key=lambda row: row[0])
+    if header is not None:
+        rows.insert(0, header)
+
+    _upload_grade_report(rows, err_rows, entry.course_id, entry.created or datetime.now(UTC))
+    ReportChunk.objects.filter(task_id=entry.task_id).delete()
+    TASK_LOG.info(u'%s, Task type: %s, Uploaded merged grade report', task_info_string, action_name)
 
 
 def _order_problems(blocks):
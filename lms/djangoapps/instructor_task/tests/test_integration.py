@@ -11,6 +11,7 @@ from mock import patch
 import textwrap
 
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 
@@ -21,6 +22,7 @@ from xmodule.modulestore.tests.factories import ItemFactory
 from xmodule.modulestore import ModuleStoreEnum
 
 from courseware.model_data import StudentModule
+from courseware.models import StudentModuleHistory
 
 from instructor_task.api import (submit_rescore_problem_for_all_students,
                                  submit_rescore_problem_for_student,
@@ -337,6 +339,57 @@ class TestRescoringTask(TestIntegrationTask):
             self.check_state(username, descriptor, 0, 1, 2)
 
 
+class TestBulkRescoringTask(TestRescoringTask):
+    """
+    Runs the rescoring scenarios with bulk rescoring enabled.
+
+    Option problems are bulk rescored, while code and custom response problems
+    are still rescored one student at a time.
+    """
+
+    def setUp(self):
+        super(TestBulkRescoringTask, self).setUp()
+        patcher = patch.dict(settings.FEATURES, {'ENABLE_BULK_RESCORING': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rescoring_in_batches(self):
+        """Rescore an option problem in batches, without module instances"""
+        problem_url_name = 'H1P1'
+        self.define_option_problem(problem_url_name)
+        location = InstructorTaskModuleTestCase.problem_location(problem_url_name)
+        descriptor = self.module_store.get_item(location)
+
+        self.submit_student_answer('u1', problem_url_name, [OPTION_1, OPTION_1])
+        self.submit_student_answer('u2', problem_url_name, [OPTION_1, OPTION_2])
+        self.submit_student_answer('u3', problem_url_name, [OPTION_2, OPTION_1])
+        self.submit_student_answer('u4', problem_url_name, [OPTION_2, OPTION_2])
+        self.redefine_option_problem(problem_url_name)
+
+        with patch('instructor_task.tasks_helper.BULK_RESCORE_BATCH_SIZE', 3):
+            with patch('instructor_task.tasks_helper._get_module_instance_for_task') as mock_get_module_instance:
+                instructor_task = self.submit_rescore_all_student_answers('instructor', problem_url_name)
+        self.assertFalse(mock_get_module_instance.called)
+
+        instructor_task = InstructorTask.objects.get(id=instructor_task.id)
+        self.assertEqual(instructor_task.task_state, SUCCESS)
+        status = json.loads(instructor_task.task_output)
+        self.assertEqual(status['attempted'], 4)
+        self.assertEqual(status['succeeded'], 4)
+
+        self.check_state('u1', descriptor, 0, 2, 1)
+        self.check_state('u2', descriptor, 1, 2, 1)
+        self.check_state('u3', descriptor, 1, 2, 1)
+        self.check_state('u4', descriptor, 2, 2, 1)
+
+        # the rescored state is recorded in the module's history
+        history_entry = StudentModuleHistory.objects.filter(
+            student_module=self.get_student_module('u4', descriptor)
+        ).latest()
+        self.assertEqual(history_entry.grade, 2)
+        self.assertEqual(json.loads(history_entry.state)['correct_map'].values()[0]['correctness'], 'correct')
+
+
 class TestResetAttemptsTask(TestIntegrationTask):
     """
     Integration-style tests for resetting problem attempts in a background task.
@@ -7,6 +7,7 @@ Tests that CSV grade report generation works with unicode emails.
 
 """
 import ddt
+from celery.states import FAILURE
 from mock import Mock, patch
 import tempfile
 import json
@@ -32,12 +33,15 @@ from student.models import CourseEnrollment, CourseEnrollmentAllowed, ManualEnro
 from lms.djangoapps.verify_student.tests.factories import SoftwareSecurePhotoVerificationFactory
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.partitions.partitions import Group, UserPartition
-from instructor_task.models import ReportStore
+from instructor_task.models import InstructorTask, ReportChunk, ReportStore
+from instructor_task import tasks_helper
+from instructor_task.tests.factories import InstructorTaskFactory
 from survey.models import SurveyForm, SurveyAnswer
 from instructor_task.tasks_helper import (
     cohort_students_and_upload,
     upload_problem_responses_csv,
     upload_grades_csv,
+    upload_grades_csv_chunk,
     upload_problem_grade_report,
     upload_students_csv,
     upload_may_enroll_csv,
@@ -290,6 +294,102 @@ class TestInstructorGradeReport(InstructorGradeReportTestCase):
         self.assertDictContainsSubset({'attempted': 1, 'succeeded': 1, 'failed': 0}, result)
 
 
+@override_settings(GRADES_DOWNLOAD_STUDENTS_PER_TASK=2)
+class TestInstructorGradeReportSubtasks(InstructorGradeReportTestCase):
+    """
+    Tests that grade reports of large courses are generated by subtasks and merged.
+    """
+    def setUp(self):
+        super(TestInstructorGradeReportSubtasks, self).setUp()
+        self.course = CourseFactory.create()
+        self.students = [self.create_student(u'student{}'.format(index)) for index in xrange(5)]
+        self.entry = InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_type='grade_course',
+            task_id='grade-report-task',
+        )
+
+    def _chunk_subtask(self):
+        """
+        Returns a mock celery task which runs each grade report chunk as soon
+        as it is queued.
+        """
+        def run_subtask(args):
+            """Runs upload_grades_csv_chunk, leaving its exceptions to the (mock) celery worker."""
+            try:
+                upload_grades_csv_chunk(*(args + ('graded',)))
+            except ValueError:
+                pass
+
+        def create_subtask(args, task_id, routing_key):  # pylint: disable=unused-argument
+            """Creates a mock subtask running upload_grades_csv_chunk."""
+            return Mock(apply_async=lambda: run_subtask(args))
+
+        chunk_subtask = Mock()
+        chunk_subtask.subtask.side_effect = create_subtask
+        return chunk_subtask
+
+    @patch('instructor_task.tasks_helper._get_current_task')
+    def test_grade_report_subtasks(self, _mock_current_task):
+        chunk_subtask = self._chunk_subtask()
+        upload_grades_csv(None, self.entry.id, self.course.id, None, 'graded', chunk_subtask=chunk_subtask)
+        self.assertEqual(chunk_subtask.subtask.call_count, 3)
+
+        progress = json.loads(InstructorTask.objects.get(pk=self.entry.id).task_output)
+        self.assertDictContainsSubset({'attempted': 5, 'succeeded': 5, 'failed': 0, 'total': 5}, progress)
+
+        report_store = ReportStore.from_config(config_name='GRADES_DOWNLOAD')
+        links = report_store.links_for(self.course.id)
+        self.assertEqual(len(links), 1)
+        with open(report_store.path_to(self.course.id, links[0][0])) as csv_file:
+            self.assertEqual(
+                [row['username'] for row in unicodecsv.DictReader(csv_file)],
+                [student.username for student in sorted(self.students, key=lambda student: student.id)]
+            )
+        self.assertFalse(ReportChunk.objects.filter(task_id=self.entry.task_id).exists())
+
+    @patch('instructor_task.tasks_helper._get_current_task')
+    def test_failed_grade_report_subtask(self, _mock_current_task):
+        compute_grade_report_rows = tasks_helper._compute_grade_report_rows  # pylint: disable=protected-access
+
+        def compute_grade_report_rows_or_fail(course, students, total_students, *args):
+            """Fails to grade the last chunk, which has a single student."""
+            if total_students == 1:
+                raise ValueError('Grading failed')
+            return compute_grade_report_rows(course, students, total_students, *args)
+
+        with patch(
+            'instructor_task.tasks_helper._compute_grade_report_rows', side_effect=compute_grade_report_rows_or_fail
+        ):
+            upload_grades_csv(None, self.entry.id, self.course.id, None, 'graded', chunk_subtask=self._chunk_subtask())
+
+        entry = InstructorTask.objects.get(pk=self.entry.id)
+        self.assertEqual(entry.task_state, FAILURE)
+        progress = json.loads(entry.task_output)
+        self.assertDictContainsSubset({'attempted': 5, 'succeeded': 4, 'failed': 1}, progress)
+        self.assertEqual(progress['message'], u'1 of 3 subtasks failed')
+
+        # The report is still merged, with the students of the failed chunk in the error report.
+        report_store = ReportStore.from_config(config_name='GRADES_DOWNLOAD')
+        names = [name for name, __ in report_store.links_for(self.course.id)]
+        self.assertEqual(len(names), 2)
+        report_name = next(name for name in names if 'grade_report_err' not in name)
+        err_report_name = next(name for name in names if 'grade_report_err' in name)
+        with open(report_store.path_to(self.course.id, report_name)) as csv_file:
+            self.assertEqual(len(list(unicodecsv.DictReader(csv_file))), 4)
+        with open(report_store.path_to(self.course.id, err_report_name)) as csv_file:
+            err_rows = list(unicodecsv.DictReader(csv_file))
+        self.assertEqual(len(err_rows), 1)
+        self.assertIn(err_rows[0]['username'], [student.username for student in self.students])
+        self.assertFalse(ReportChunk.objects.filter(task_id=self.entry.task_id).exists())
+
+    @patch('instructor_task.tasks_helper._get_current_task')
+    def test_no_subtasks_without_chunk_subtask(self, _mock_current_task):
+        result = upload_grades_csv(None, self.entry.id, self.course.id, None, 'graded')
+        self.assertDictContainsSubset({'attempted': 5, 'succeeded': 5, 'failed': 0}, result)
+        self.assertEqual(InstructorTask.objects.get(pk=self.entry.id).subtasks, '')
+
+
 class TestTeamGradeReport(InstructorGradeReportTestCase):
     """ Test that teams appear correctly in the grade report when it is enabled for the course. """
 
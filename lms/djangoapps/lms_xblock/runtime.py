@@ -212,8 +212,32 @@ class LmsModuleSystem(ModuleSystem):  # pylint: disable=abstract-method
         services['fs'] = xblock.reference.plugins.FSService()
         services['settings'] = SettingsService()
         self.request_token = kwargs.pop('request_token', None)
+        self.fragment_cache = kwargs.pop('fragment_cache', None)
         super(LmsModuleSystem, self).__init__(**kwargs)
 
+    def render(self, block, view_name, context=None):
+        """
+        Render a view of the block, or serve its fragment from the fragment cache
+        (see :class:`openedx.core.lib.xblock_utils.FragmentCache`), if the module system has one.
+        """
+        if self.fragment_cache is not None:
+            frag = self.fragment_cache.get(view_name)
+            if frag is not None:
+                with self._render_metrics(block, view_name):
+                    context = context or {}
+                    frag = super(LmsModuleSystem, self).wrap_xblock(block, view_name, frag, context)
+                    return self.render_asides(block, view_name, frag, context)
+        return super(LmsModuleSystem, self).render(block, view_name, context)
+
+    def wrap_xblock(self, block, view, frag, context):
+        """
+        Apply the wrappers to the fragment rendered by a view of the block, after the
+        content wrappers of the fragment cache (which caches the fragment), if there's one.
+        """
+        if self.fragment_cache is not None:
+            frag = self.fragment_cache.wrap(block, view, frag, context)
+        return super(LmsModuleSystem, self).wrap_xblock(block, view, frag, context)
+
     def handler_url(self, *args, **kwargs):
         """
         Implement the XBlock runtime handler_url interface.
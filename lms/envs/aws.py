@@ -524,12 +524,26 @@ VERIFY_STUDENT = AUTH_TOKENS.get("VERIFY_STUDENT", VERIFY_STUDENT)
 
 # Grades download
 GRADES_DOWNLOAD_ROUTING_KEY = HIGH_MEM_QUEUE
+GRADES_DOWNLOAD_STUDENTS_PER_TASK = ENV_TOKENS.get(
+    'GRADES_DOWNLOAD_STUDENTS_PER_TASK',
+    GRADES_DOWNLOAD_STUDENTS_PER_TASK
+)
 
 GRADES_DOWNLOAD = ENV_TOKENS.get("GRADES_DOWNLOAD", GRADES_DOWNLOAD)
 
 # financial reports
 FINANCIAL_REPORTS = ENV_TOKENS.get("FINANCIAL_REPORTS", FINANCIAL_REPORTS)
 
+# StudentModuleHistory sink
+STUDENT_MODULE_HISTORY = ENV_TOKENS.get("STUDENT_MODULE_HISTORY", STUDENT_MODULE_HISTORY)
+
+# XBlock fragment cache
+XBLOCK_FRAGMENT_CACHE_BLOCK_TYPES = ENV_TOKENS.get(
+    "XBLOCK_FRAGMENT_CACHE_BLOCK_TYPES",
+    XBLOCK_FRAGMENT_CACHE_BLOCK_TYPES
+)
+XBLOCK_FRAGMENT_CACHE_TIMEOUT = ENV_TOKENS.get("XBLOCK_FRAGMENT_CACHE_TIMEOUT", XBLOCK_FRAGMENT_CACHE_TIMEOUT)
+
 ##### ORA2 ######
 # Prefix for uploads of example-based assessment AI classifiers
 # This can be used to separate uploads for different environments
@@ -642,6 +656,11 @@ COURSE_ABOUT_VISIBILITY_PERMISSION = ENV_TOKENS.get(
 # Enrollment API Cache Timeout
 ENROLLMENT_COURSE_DETAILS_CACHE_TIMEOUT = ENV_TOKENS.get('ENROLLMENT_COURSE_DETAILS_CACHE_TIMEOUT', 60)
 
+BLOCK_STRUCTURE_LOCAL_CACHE_SIZE = ENV_TOKENS.get(
+    'BLOCK_STRUCTURE_LOCAL_CACHE_SIZE',
+    BLOCK_STRUCTURE_LOCAL_CACHE_SIZE
+)
+
 # PDF RECEIPT/INVOICE OVERRIDES
 PDF_RECEIPT_TAX_ID = ENV_TOKENS.get('PDF_RECEIPT_TAX_ID', PDF_RECEIPT_TAX_ID)
 PDF_RECEIPT_FOOTER_TEXT = ENV_TOKENS.get('PDF_RECEIPT_FOOTER_TEXT', PDF_RECEIPT_FOOTER_TEXT)
@@ -171,6 +171,10 @@ FEATURES = {
     # Enable instructor dash to submit background tasks
     'ENABLE_INSTRUCTOR_BACKGROUND_TASKS': True,
 
+    # Rescore problems for all students in batches, without building a module
+    # instance per student for problems that don't need one
+    'ENABLE_BULK_RESCORING': False,
+
     # Enable instructor to assign individual due dates
     # Note: In order for this feature to work, you must also add
     # 'courseware.student_field_overrides.IndividualStudentOverrideProvider' to
@@ -358,6 +362,36 @@ FEATURES = {
     # Enable the max score cache to speed up grading
     'ENABLE_MAX_SCORE_CACHE': True,
 
+    # Store subsection grades and serve course grades from them, updating
+    # them as scores change instead of recomputing them on every read.
+    'ENABLE_PERSISTENT_GRADES': False,
+
+    # Cache collected course block structures in a compact, array-backed
+    # representation to reduce their memory and (un)pickling costs.
+    'ENABLE_COMPACT_BLOCK_STRUCTURES': False,
+
+    # On course publish, recollect only the parts of the cached course block
+    # structure that changed, instead of clearing and recollecting all of it.
+    # The cached structure is served until the update task completes.
+    'ENABLE_INCREMENTAL_BLOCK_STRUCTURE_COLLECTION': False,
+
+    # Buffer the Scope.user_state writes of the block types in
+    # USER_STATE_WRITE_BEHIND_BLOCK_TYPES during a request, and save them in
+    # bulk at the end of the request, instead of saving each write as it's made.
+    'ENABLE_USER_STATE_WRITE_BEHIND': False,
+
+    # Build the field data cache of courseware pages from the block keys in the
+    # cached course block structure, with one query per field scope.
+    'ENABLE_FIELD_DATA_CACHE_PREFETCH': False,
+
+    # Build the services and the user's access flags of the module systems once per
+    # request, for all the modules rendered for the user, instead of once per module.
+    'ENABLE_SHARED_MODULE_RUNTIME': False,
+
+    # Cache the student_view fragments of the blocks of the types in
+    # XBLOCK_FRAGMENT_CACHE_BLOCK_TYPES, for each published version of them.
+    'ENABLE_XBLOCK_FRAGMENT_CACHE': False,
+
     # Enable LTI Provider feature.
     'ENABLE_LTI_PROVIDER': False,
 
@@ -1136,6 +1170,9 @@ MIDDLEWARE_CLASSES = (
     # to redirected unenrolled students to the course info page
     'courseware.middleware.RedirectUnenrolledMiddleware',
 
+    # saves the buffered user state writes, if FEATURES['ENABLE_USER_STATE_WRITE_BEHIND'] is set
+    'courseware.middleware.UserStateWriteBufferMiddleware',
+
     'course_wiki.middleware.WikiAccessMiddleware',
 
     # This must be last
@@ -2211,6 +2248,10 @@ BADGR_ISSUER_SLUG = "example-issuer"
 ###################### Grade Downloads ######################
 GRADES_DOWNLOAD_ROUTING_KEY = HIGH_MEM_QUEUE
 
+# If set, grade reports for courses with more enrolled students than this are
+# split into subtasks that each grade this many students in parallel.
+GRADES_DOWNLOAD_STUDENTS_PER_TASK = None
+
 GRADES_DOWNLOAD = {
     'STORAGE_TYPE': 'localfs',
     'BUCKET': 'edx-grades',
@@ -2517,6 +2558,11 @@ COURSE_ABOUT_VISIBILITY_PERMISSION = 'see_exists'
 # Enrollment API Cache Timeout
 ENROLLMENT_COURSE_DETAILS_CACHE_TIMEOUT = 60
 
+# Maximum total size, in bytes, of the serialized course block structures
+# that each process keeps in memory in front of the cache.  If 0, course
+# block structures are always read from the cache.
+BLOCK_STRUCTURE_LOCAL_CACHE_SIZE = 0
+
 # for Student Notes we would like to avoid too frequent token refreshes (default is 30 seconds)
 if FEATURES['ENABLE_EDXNOTES']:
     OAUTH_ID_TOKEN_EXPIRATION = 60 * 60
@@ -2767,6 +2813,25 @@ DEPRECATED_ADVANCED_COMPONENT_TYPES = []
 
 AUDIT_CERT_CUTOFF_DATE = None
 
+# The block types whose Scope.user_state writes are buffered until the end of the request,
+# if FEATURES['ENABLE_USER_STATE_WRITE_BEHIND'] is set. These should only be blocks whose
+# state isn't graded (e.g. positions), as the writes are lost if saving them fails.
+USER_STATE_WRITE_BEHIND_BLOCK_TYPES = ('course', 'chapter', 'sequential', 'vertical', 'video')
+
+# The block types whose student_view fragments are cached, if FEATURES['ENABLE_XBLOCK_FRAGMENT_CACHE']
+# is set. These should only be blocks whose student_view only depends on their content.
+XBLOCK_FRAGMENT_CACHE_BLOCK_TYPES = ('html', 'static_tab', 'about')
+
+# The number of seconds the student_view fragments of blocks are cached for.
+XBLOCK_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Where StudentModuleHistory entries are written: to the StudentModuleHistory table
+# ('STORAGE_TYPE': 'database', optionally of another 'DATABASE' alias), or as json
+# lines to a logger ('STORAGE_TYPE': 'log', optionally with a 'LOGGER' name).
+STUDENT_MODULE_HISTORY = {
+    'STORAGE_TYPE': 'database',
+}
+
 ################################ Settings for Credentials Service ################################
 
 CREDENTIALS_SERVICE_USERNAME = 'credentials_service_user'
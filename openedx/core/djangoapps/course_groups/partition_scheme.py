@@ -25,16 +25,16 @@ class CohortPartitionScheme(object):
 
     # pylint: disable=unused-argument
     @classmethod
-    def get_group_for_user(cls, course_key, user, user_partition, track_function=None, use_cached=True):
+    def get_group_for_user(cls, course_key, user, user_partition, track_function=None, use_cached=True, assign=True):
         """
         Returns the Group from the specified user partition to which the user
         is assigned, via their cohort membership and any mappings from cohorts
         to partitions / groups that might exist.
 
         If the user has not yet been assigned to a cohort, an assignment *might*
-        be created on-the-fly, as determined by the course's cohort config.
-        Any such side-effects will be triggered inside the call to
-        cohorts.get_cohort().
+        be created on-the-fly, as determined by the course's cohort config,
+        unless assign is False. Any such side-effects will be triggered inside
+        the call to cohorts.get_cohort().
 
         If the user has no cohort mapping, or there is no (valid) cohort ->
         partition group mapping found, the function returns None.
@@ -54,7 +54,7 @@ class CohortPartitionScheme(object):
             # The user is masquerading as a generic student. We can't show any particular group.
             return None
 
-        cohort = get_cohort(user, course_key, use_cached=use_cached)
+        cohort = get_cohort(user, course_key, assign=assign, use_cached=use_cached)
         if cohort is None:
             # student doesn't have a cohort
             return None
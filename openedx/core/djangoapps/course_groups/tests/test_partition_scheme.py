@@ -21,7 +21,7 @@ from openedx.core.djangoapps.user_api.partition_schemes import RandomUserPartiti
 from ..partition_scheme import CohortPartitionScheme, get_cohorted_user_partition
 from ..models import CourseUserGroupPartitionGroup
 from ..views import link_cohort_to_partition_group, unlink_cohort_partition_group
-from ..cohorts import add_user_to_cohort, remove_user_from_cohort, get_course_cohorts
+from ..cohorts import add_user_to_cohort, remove_user_from_cohort, get_course_cohorts, get_cohort
 from .helpers import CohortFactory, config_course_cohorts
 
 
@@ -165,6 +165,29 @@ class TestCohortPartitionScheme(ModuleStoreTestCase):
         # call to cohorts.get_cohort.
         self.assert_student_in_group(self.groups[0])
 
+    def test_student_not_assigned(self):
+        """
+        Test that students aren't assigned to a cohort when asking for their
+        group without assigning.
+        """
+        cohort = get_course_cohorts(self.course)[0]
+        link_cohort_to_partition_group(
+            cohort,
+            self.user_partition.id,
+            self.groups[0].id,
+        )
+
+        self.assertIsNone(
+            CohortPartitionScheme.get_group_for_user(
+                self.course_key,
+                self.student,
+                self.user_partition,
+                use_cached=False,
+                assign=False,
+            )
+        )
+        self.assertIsNone(get_cohort(self.student, self.course_key, assign=False))
+
     def setup_student_in_group_0(self):
         """
         Utility to set up a cohort, add our student to the cohort, and link
@@ -7,11 +7,15 @@ Module with family of classes for block structures.
 The following internal data structures are implemented:
     _BlockRelations - Data structure for a single block's relations.
     _BlockData - Data structure for a single block's data.
+    _CompactBlockRelations - Array-backed map of all blocks' relations.
+    _CompactBlockDataMap - Array-backed map of all blocks' data.
 """
+from array import array
 from collections import defaultdict
+import copy
 from logging import getLogger
 
-from openedx.core.lib.graph_traversals import traverse_topologically, traverse_post_order
+from openedx.core.lib.graph_traversals import traverse_topologically, traverse_post_order, traverse_pre_order
 
 from .exceptions import TransformerException
 
@@ -143,6 +147,31 @@ class BlockStructure(object):
         """
         return self._block_relations.iterkeys()
 
+    def compact(self):
+        """
+        Replaces the internal map of block relations with a compact,
+        array-backed equivalent.  This reduces the memory and
+        serialization footprint of large structures, such as when they
+        are cached after the Collect phase, without changing the
+        structure's interface.
+        """
+        if not isinstance(self._block_relations, _CompactBlockRelations):
+            self._block_relations = _CompactBlockRelations(self._block_relations)
+
+    def copy(self):
+        """
+        Returns a compact copy (see compact) of this block structure
+        that can be modified independently of it.  This block structure
+        is left unchanged; if it is already compact, the copy cheaply
+        shares its packed data.
+        """
+        block_structure = copy.copy(self)
+        if isinstance(self._block_relations, _CompactBlockRelations):
+            block_structure._block_relations = self._block_relations.copy()
+        else:
+            block_structure._block_relations = _CompactBlockRelations(self._block_relations)
+        return block_structure
+
     #--- Block structure traversal methods ---#
 
     def topological_traversal(
@@ -282,6 +311,293 @@ class _BlockData(object):
         self.transformer_data = defaultdict(dict)
 
 
+class _CompactBlockMap(object):
+    """
+    Base class for the array-backed alternatives to the per-block
+    defaultdicts of a block structure (see BlockStructure.compact).
+
+    The usage keys of the blocks are interned to integer indices and
+    subclasses store the blocks' values in flat arrays or columns
+    addressed by those indices, which are much cheaper to keep in memory
+    and to (un)pickle than a dict of small objects per block.
+
+    A block's value object is materialized from the compact storage the
+    first time the block is accessed, after which it is returned as is.
+    This keeps the mapping interface used by the block structure
+    methods, including in-place modification of the returned objects
+    during the Transform phase.
+    """
+    def __init__(self, block_map=None):
+        """
+        Arguments:
+            block_map ({UsageKey: object}) - Map whose contents are to
+                be compacted.
+        """
+        block_map = block_map or {}
+
+        # List of the interned usage keys, in index order.
+        # list [UsageKey]
+        self._keys = list(block_map)
+
+        self._build_index()
+        self._reset()
+        self._pack(block_map)
+
+    def _build_index(self):
+        """
+        Builds the map of usage keys to their interned indices.
+        """
+        # Map of a usage key to its interned index.
+        # dict {UsageKey: int}
+        self._index = {usage_key: index for index, usage_key in enumerate(self._keys)}
+
+    def _reset(self):
+        """
+        Resets the state of the blocks modified after compaction.
+        """
+        # Map of a usage key to its materialized value, including blocks
+        # added after compaction.
+        # dict {UsageKey: object}
+        self._materialized = {}
+
+        # Indices of blocks that were removed after compaction.
+        # set(int)
+        self._removed = set()
+
+    def _pack(self, block_map):
+        """
+        Stores the values of the given map in compact form.
+        """
+        raise NotImplementedError
+
+    def _unpack(self, index):
+        """
+        Returns a newly created value object for the block at the given
+        index.
+        """
+        raise NotImplementedError
+
+    def _create(self):
+        """
+        Returns an empty value object for a newly added block.
+        """
+        raise NotImplementedError
+
+    def get(self, usage_key, default=None):
+        """
+        Returns the value for the given usage_key; returns default if
+        the block is not in the map.
+        """
+        value = self._materialized.get(usage_key)
+        if value is None:
+            index = self._index.get(usage_key)
+            if index is None or index in self._removed:
+                return default
+            value = self._materialized[usage_key] = self._unpack(index)
+        return value
+
+    def __getitem__(self, usage_key):
+        value = self.get(usage_key)
+        if value is None:
+            value = self._materialized[usage_key] = self._create()
+        return value
+
+    def __setitem__(self, usage_key, value):
+        self._materialized[usage_key] = value
+
+    def __contains__(self, usage_key):
+        if usage_key in self._materialized:
+            return True
+        index = self._index.get(usage_key)
+        return index is not None and index not in self._removed
+
+    def pop(self, usage_key, default=None):
+        """
+        Removes the given usage_key from the map and returns its value;
+        returns default if the block is not in the map.
+        """
+        value = self.get(usage_key, default)
+        self._materialized.pop(usage_key, None)
+        index = self._index.get(usage_key)
+        if index is not None:
+            self._removed.add(index)
+        return value
+
+    def __iter__(self):
+        for index, usage_key in enumerate(self._keys):
+            if index not in self._removed or usage_key in self._materialized:
+                yield usage_key
+        # Iterate over a copy since accessing blocks materializes them.
+        for usage_key in [key for key in self._materialized if key not in self._index]:
+            yield usage_key
+
+    iterkeys = __iter__
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __getstate__(self):
+        if self._materialized or self._removed:
+            # Materialized values may have been modified, so compact
+            # the current contents afresh.
+            return self.__class__({usage_key: self[usage_key] for usage_key in self}).__getstate__()
+        state = self.__dict__.copy()
+        for attr in ('_index', '_materialized', '_removed'):
+            del state[attr]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_index()
+        self._reset()
+
+    def copy(self):
+        """
+        Returns a copy of this map that can be modified independently
+        of it.  The packed storage, which is never modified, is shared
+        with the copy unless blocks have already been accessed.
+        """
+        block_map = self.__class__.__new__(self.__class__)
+        if self._materialized or self._removed:
+            block_map.__setstate__(self.__getstate__())
+        else:
+            block_map.__dict__.update(self.__dict__)
+            block_map._reset()
+        return block_map
+
+
+class _CompactBlockRelations(_CompactBlockMap):
+    """
+    Array-backed alternative to the map of usage keys to
+    _BlockRelations.
+
+    The children and the parents of all blocks are stored as two flat
+    arrays of block indices, with an array of offsets for each that
+    delimits the entries of each block.
+    """
+    def _pack(self, block_map):
+        self._child_offsets, self._child_indices = self._pack_edges(
+            block_map[usage_key].children for usage_key in self._keys
+        )
+        self._parent_offsets, self._parent_indices = self._pack_edges(
+            block_map[usage_key].parents for usage_key in self._keys
+        )
+
+    def _pack_edges(self, edge_lists):
+        """
+        Returns a tuple of the offsets and indices arrays for the given
+        lists of usage keys, one list per block.
+        """
+        offsets = array('l', [0])
+        indices = array('l')
+        for edges in edge_lists:
+            indices.extend(self._index[usage_key] for usage_key in edges)
+            offsets.append(len(indices))
+        return offsets, indices
+
+    def _unpack(self, index):
+        relations = _BlockRelations()
+        relations.children = self._unpack_edges(self._child_offsets, self._child_indices, index)
+        relations.parents = self._unpack_edges(self._parent_offsets, self._parent_indices, index)
+        return relations
+
+    def _unpack_edges(self, offsets, indices, index):
+        """
+        Returns the list of usage keys stored for the block at the given
+        index.
+        """
+        return [self._keys[edge] for edge in indices[offsets[index]:offsets[index + 1]]]
+
+    def _create(self):
+        return _BlockRelations()
+
+
+class _CompactBlockDataMap(_CompactBlockMap):
+    """
+    Array-backed alternative to the map of usage keys to _BlockData.
+
+    The xBlock fields and the block-specific transformer data are stored
+    column-wise: a list of values per field name (or per transformer
+    data key) with an entry for each block index, along with a bytearray
+    flagging which of the blocks have a value set.
+    """
+    # Whether the packed values are shared with another map, in which
+    # case they are deep-copied when a block is unpacked so that they
+    # can be modified in place.
+    _copy_values = False
+
+    def _pack(self, block_map):
+        # Map of xBlock field name to its column.
+        # dict {string: (bytearray, list)}
+        self._xblock_field_columns = {}
+
+        # Map of transformer name to the columns of its data keys.
+        # dict {string: {string: (bytearray, list)}}
+        self._transformer_data_columns = {}
+
+        for index, usage_key in enumerate(self._keys):
+            block_data = block_map[usage_key]
+            for field_name, value in block_data.xblock_fields.iteritems():
+                self._set_column_value(self._xblock_field_columns, field_name, index, value)
+            for transformer_name, transformer_data in block_data.transformer_data.iteritems():
+                columns = self._transformer_data_columns.setdefault(transformer_name, {})
+                for key, value in transformer_data.iteritems():
+                    self._set_column_value(columns, key, index, value)
+
+    def _set_column_value(self, columns, name, index, value):
+        """
+        Sets the value for the block at the given index in the column
+        with the given name, creating the column if needed.
+        """
+        if name not in columns:
+            columns[name] = (bytearray(len(self._keys)), [None] * len(self._keys))
+        is_set, values = columns[name]
+        is_set[index] = 1
+        values[index] = value
+
+    @staticmethod
+    def _get_column_values(columns, index):
+        """
+        Returns a dict of the values set for the block at the given
+        index in the given columns.
+        """
+        return {
+            name: values[index]
+            for name, (is_set, values) in columns.iteritems()
+            if is_set[index]
+        }
+
+    def _unpack(self, index):
+        block_data = _BlockData()
+        block_data.xblock_fields = self._get_column_values(self._xblock_field_columns, index)
+        for transformer_name, columns in self._transformer_data_columns.iteritems():
+            transformer_data = self._get_column_values(columns, index)
+            if transformer_data:
+                block_data.transformer_data[transformer_name] = transformer_data
+        return copy.deepcopy(block_data) if self._copy_values else block_data
+
+    def _create(self):
+        return _BlockData()
+
+    def __getstate__(self):
+        state = super(_CompactBlockDataMap, self).__getstate__()
+        state.pop('_copy_values', None)
+        return state
+
+    def copy(self):
+        """
+        Returns a copy of this map that can be modified independently
+        of it, including the collected values of its blocks.  The packed
+        storage is shared with the copy unless blocks have already been
+        accessed, in which case their current values are deep-copied.
+        """
+        if self._materialized or self._removed:
+            return self.__class__(copy.deepcopy({usage_key: self[usage_key] for usage_key in self}))
+        block_map = super(_CompactBlockDataMap, self).copy()
+        block_map._copy_values = True
+        return block_map
+
+
 class BlockStructureBlockData(BlockStructure):
     """
     Subclass of BlockStructure that is responsible for managing block
@@ -299,6 +615,46 @@ class BlockStructureBlockData(BlockStructure):
         # defaultdict {string: dict}
         self._transformer_data = defaultdict(dict)
 
+        # Callable returning the collected xBlock fields of the blocks
+        # that are yet to be merged into _block_data_map, if any.  Set
+        # when the block structure is read from the cache so the data
+        # is only decoded when first accessed.
+        # callable () -> {UsageKey: dict}
+        self._unloaded_xblock_fields = None
+
+        # Map of a transformer's name to a callable returning its
+        # block-specific data that is yet to be merged into
+        # _block_data_map.  See _unloaded_xblock_fields.
+        # dict {string: callable () -> {UsageKey: dict}}
+        self._unloaded_transformer_block_data = {}
+
+    def compact(self):
+        """
+        Replaces the internal maps of block relations and block data
+        with compact, array-backed equivalents.  See
+        BlockStructure.compact.
+        """
+        super(BlockStructureBlockData, self).compact()
+        self._load_block_data()
+        if not isinstance(self._block_data_map, _CompactBlockDataMap):
+            self._block_data_map = _CompactBlockDataMap(self._block_data_map)
+
+    def copy(self):
+        """
+        Returns a compact copy of this block structure that can be
+        modified independently of it, including its collected values.
+        See BlockStructure.copy.
+        """
+        self._load_block_data()
+        block_structure = super(BlockStructureBlockData, self).copy()
+        if isinstance(self._block_data_map, _CompactBlockDataMap):
+            block_structure._block_data_map = self._block_data_map.copy()
+        else:
+            block_structure._block_data_map = _CompactBlockDataMap(copy.deepcopy(dict(self._block_data_map)))
+        block_structure._transformer_data = copy.deepcopy(self._transformer_data)
+        block_structure._unloaded_transformer_block_data = {}
+        return block_structure
+
     def get_xblock_field(self, usage_key, field_name, default=None):
         """
         Returns the collected value of the xBlock field for the
@@ -315,6 +671,8 @@ class BlockStructureBlockData(BlockStructure):
             default (any type) - The value to return if a field value is
                 not found.
         """
+        if self._unloaded_xblock_fields:
+            self._load_xblock_fields()
         block_data = self._block_data_map.get(usage_key)
         return block_data.xblock_fields.get(field_name, default) if block_data else default
 
@@ -388,6 +746,7 @@ class BlockStructureBlockData(BlockStructure):
                 given key for the given transformer's data for the
                 requested block.
         """
+        self._load_transformer_block_data(transformer.name())
         self._block_data_map[usage_key].transformer_data[transformer.name()][key] = value
 
     def get_transformer_block_data(self, usage_key, transformer):
@@ -407,6 +766,7 @@ class BlockStructureBlockData(BlockStructure):
                 that is requested.
         """
         default = {}
+        self._load_transformer_block_data(transformer.name())
         block_data = self._block_data_map.get(usage_key)
         if not block_data:
             return default
@@ -507,6 +867,99 @@ class BlockStructureBlockData(BlockStructure):
     #--- Internal methods ---#
     # To be used within the block_structure framework or by tests.
 
+    def _update_subtrees(self, subtree_structure, subtree_root_keys):
+        """
+        Replaces the subtrees of this block structure starting at the
+        given subtree_root_keys with those of the given block structure,
+        along with their blocks' data.  The data of the subtrees'
+        ancestors and the structure-wide transformer data collected in
+        the given block structure are merged into those of this block
+        structure, since the ancestors are only partially included in it.
+
+        Arguments:
+            subtree_structure (BlockStructureBlockData) - A collected
+                block structure with the new subtrees and their
+                ancestors, as created by
+                BlockStructureFactory.create_subtrees_from_modulestore.
+
+            subtree_root_keys ([UsageKey]) - The usage keys of the roots
+                of the subtrees to replace.
+        """
+        self._load_block_data()
+
+        # Remove the old descendants of the subtree roots.
+        for subtree_root_key in subtree_root_keys:
+            for block_key in list(traverse_pre_order(subtree_root_key, self.get_children)):
+                if block_key != subtree_root_key:
+                    self._block_relations.pop(block_key, None)
+                    self._block_data_map.pop(block_key, None)
+
+        # Add the new subtrees, keeping the subtree roots' parents.
+        for subtree_root_key in subtree_root_keys:
+            for block_key in traverse_pre_order(subtree_root_key, subtree_structure.get_children):
+                if block_key == subtree_root_key:
+                    self._block_relations[block_key].children = list(subtree_structure.get_children(block_key))
+                else:
+                    relations = self._block_relations[block_key] = _BlockRelations()
+                    relations.children = list(subtree_structure.get_children(block_key))
+                    relations.parents = list(subtree_structure.get_parents(block_key))
+
+        # Replace the data of the subtrees' blocks and merge the data
+        # of their ancestors.
+        subtree_structure._load_block_data()
+        subtree_block_keys = set()
+        for subtree_root_key in subtree_root_keys:
+            subtree_block_keys.update(traverse_pre_order(subtree_root_key, subtree_structure.get_children))
+        for block_key in subtree_structure.get_block_keys():
+            block_data = subtree_structure._block_data_map.get(block_key, _BlockData())
+            if block_key in subtree_block_keys:
+                self._block_data_map[block_key] = block_data
+            else:
+                ancestor_data = self._block_data_map[block_key]
+                ancestor_data.xblock_fields.update(block_data.xblock_fields)
+                for transformer_name, transformer_data in block_data.transformer_data.iteritems():
+                    ancestor_data.transformer_data[transformer_name].update(transformer_data)
+        for transformer_name, transformer_data in subtree_structure._transformer_data.iteritems():
+            self._transformer_data[transformer_name].update(transformer_data)
+
+    def _load_block_data(self):
+        """
+        Merges all block data that is yet to be loaded into the block
+        data map.
+        """
+        self._load_xblock_fields()
+        for transformer_name in self._unloaded_transformer_block_data.keys():
+            self._load_transformer_block_data(transformer_name)
+
+    def _load_xblock_fields(self):
+        """
+        Merges the xBlock fields that are yet to be loaded, if any, into
+        the block data map.
+        """
+        load_xblock_fields, self._unloaded_xblock_fields = self._unloaded_xblock_fields, None
+        if load_xblock_fields:
+            for usage_key, xblock_fields in self._iter_loaded_block_data(load_xblock_fields):
+                self._block_data_map[usage_key].xblock_fields = xblock_fields
+
+    def _load_transformer_block_data(self, transformer_name):
+        """
+        Merges the given transformer's block-specific data that is yet
+        to be loaded, if any, into the block data map.
+        """
+        load_transformer_block_data = self._unloaded_transformer_block_data.pop(transformer_name, None)
+        if load_transformer_block_data:
+            for usage_key, transformer_data in self._iter_loaded_block_data(load_transformer_block_data):
+                self._block_data_map[usage_key].transformer_data[transformer_name] = transformer_data
+
+    def _iter_loaded_block_data(self, load_block_data):
+        """
+        Calls the given loader and yields its (usage key, data) items for
+        the blocks that are still in the block structure.
+        """
+        for usage_key, data in load_block_data().iteritems():
+            if usage_key in self:
+                yield usage_key, data
+
     def _get_transformer_data_version(self, transformer):
         """
         Returns the version number stored for the given transformer.
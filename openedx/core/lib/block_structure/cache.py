@@ -2,7 +2,12 @@
 Module for the Cache class for BlockStructure objects.
 """
 # pylint: disable=protected-access
+import cPickle as pickle
+from collections import defaultdict, namedtuple, OrderedDict
+from functools import partial
 from logging import getLogger
+from threading import Lock
+from uuid import uuid4
 
 from openedx.core.lib.cache_utils import zpickle, zunpickle
 
@@ -12,46 +17,145 @@ from .block_structure import BlockStructureModulestoreData
 logger = getLogger(__name__)  # pylint: disable=C0103
 
 
+# Version of the layout in which block structures are serialized into
+# the cache.  It is part of the cache key so that processes running with
+# different layouts (such as during a deploy) do not read each other's
+# entries.  Increment it whenever the layout changes.
+SERIALIZATION_VERSION = 1
+
+
+# An entry of the BlockStructureLocalCache.
+_LocalCacheEntry = namedtuple('_LocalCacheEntry', 'version block_structure size')
+
+
+class BlockStructureLocalCache(object):
+    """
+    In-process, least-recently-used cache of BlockStructure objects,
+    used in front of a BlockStructureCache so that frequently accessed
+    structures are neither fetched from the cache backend nor
+    deserialized on every request.
+
+    Entries are keyed by the usage key of the structure's root block
+    along with the version with which the structure was stored in the
+    cache backend.  The cache is bounded by the total serialized size
+    of its entries.
+
+    Structures are copied (see BlockStructureBlockData.copy) both when
+    they are stored and when they are returned, so that neither the
+    caller's structure nor the cached entry is affected by changes to
+    the other, including in-place changes to collected values.
+    """
+    def __init__(self, max_size):
+        """
+        Arguments:
+            max_size (int) - The maximum total size, in bytes, of the
+                serialized block structures kept in the cache.
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def get(self, root_block_usage_key, version):
+        """
+        Returns a copy of the block structure stored for the given
+        root_block_usage_key and version, or None if not found.
+        """
+        with self._lock:
+            entry = self._entries.get(root_block_usage_key)
+            if entry is None or entry.version != version:
+                return None
+            # Move the entry to the end as the most recently used.
+            del self._entries[root_block_usage_key]
+            self._entries[root_block_usage_key] = entry
+        return entry.block_structure.copy()
+
+    def set(self, version, block_structure, size):
+        """
+        Stores a copy of the given block structure with the given
+        version, evicting the least recently used entries as needed.
+
+        Arguments:
+            version (string) - The version of the block structure.
+
+            block_structure (BlockStructureBlockData) - The block
+                structure to store.
+
+            size (int) - The serialized size of the block structure.
+        """
+        if size > self.max_size:
+            return
+        entry = _LocalCacheEntry(version, block_structure.copy(), size)
+        with self._lock:
+            self._remove(block_structure.root_block_usage_key)
+            self._entries[block_structure.root_block_usage_key] = entry
+            self._size += size
+            while self._size > self.max_size:
+                __, evicted_entry = self._entries.popitem(last=False)
+                self._size -= evicted_entry.size
+
+    def delete(self, root_block_usage_key):
+        """
+        Removes the block structure for the given root_block_usage_key
+        from the cache.
+        """
+        with self._lock:
+            self._remove(root_block_usage_key)
+
+    def _remove(self, root_block_usage_key):
+        """
+        Removes the entry for the given root_block_usage_key, if any.
+        Must be called with the lock held.
+        """
+        entry = self._entries.pop(root_block_usage_key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+
 class BlockStructureCache(object):
     """
     Cache for BlockStructure objects.
     """
-    def __init__(self, cache):
+    def __init__(self, cache, local_cache=None):
         """
         Arguments:
             cache (django.core.cache.backends.base.BaseCache) - The
                 cache into which cacheable data of the block structure
                 is to be serialized.
+
+            local_cache (BlockStructureLocalCache) - Optional
+                in-process cache to use in front of the given cache.
         """
         self._cache = cache
+        self._local_cache = local_cache
 
     def add(self, block_structure):
         """
-        Store a compressed and pickled serialization of the given
-        block structure into the given cache.
+        Store a serialization of the given block structure into the
+        given cache.
 
-        The key in the cache is 'root.key.<root_block_usage_key>'.
-        The data stored in the cache includes the structure's
-        block relations, transformer data, and block data.
+        The key in the cache is 'root.key.v<SERIALIZATION_VERSION>.<root_block_usage_key>'.
+        See the serialize method for the data stored in the cache.  A
+        newly generated version for the stored data is also written to
+        the cache, under 'root.version.<root_block_usage_key>', for
+        validating the entries of local caches.
 
         Arguments:
             block_structure (BlockStructure) - The block structure
                 that is to be serialized to the given cache.
         """
-        data_to_cache = (
-            block_structure._block_relations,
-            block_structure._transformer_data,
-            block_structure._block_data_map
-        )
-        zp_data_to_cache = zpickle(data_to_cache)
-        self._cache.set(
-            self._encode_root_cache_key(block_structure.root_block_usage_key),
-            zp_data_to_cache
-        )
+        data_to_cache = self.serialize(block_structure)
+        version = uuid4().hex
+        self._cache.set_many({
+            self._encode_root_cache_key(block_structure.root_block_usage_key): data_to_cache,
+            self._encode_version_cache_key(block_structure.root_block_usage_key): version,
+        })
+        if self._local_cache:
+            self._local_cache.set(version, block_structure, len(data_to_cache))
         logger.debug(
             "Wrote BlockStructure %s to cache, size: %s",
             block_structure.root_block_usage_key,
-            len(zp_data_to_cache),
+            len(data_to_cache),
         )
 
     def get(self, root_block_usage_key):
@@ -74,9 +178,23 @@ class BlockStructureCache(object):
             NoneType - If the root_block_usage_key is not found in the cache.
         """
 
+        root_cache_key = self._encode_root_cache_key(root_block_usage_key)
+        version_cache_key = self._encode_version_cache_key(root_block_usage_key)
+
+        if self._local_cache:
+            version = self._cache.get(version_cache_key)
+            block_structure = self._local_cache.get(root_block_usage_key, version) if version else None
+            if block_structure is not None:
+                logger.debug(
+                    "Read BlockStructure %r from local cache.",
+                    root_block_usage_key,
+                )
+                return block_structure
+
         # Find root_block_usage_key in the cache.
-        zp_data_from_cache = self._cache.get(self._encode_root_cache_key(root_block_usage_key))
-        if not zp_data_from_cache:
+        data_from_cache = self._cache.get_many([root_cache_key, version_cache_key])
+        serialized_data = data_from_cache.get(root_cache_key)
+        if not serialized_data:
             logger.debug(
                 "Did not find BlockStructure %r in the cache.",
                 root_block_usage_key,
@@ -86,16 +204,89 @@ class BlockStructureCache(object):
             logger.debug(
                 "Read BlockStructure %r from cache, size: %s",
                 root_block_usage_key,
-                len(zp_data_from_cache),
+                len(serialized_data),
             )
 
-        # Deserialize and construct the block structure.
-        block_relations, transformer_data, block_data_map = zunpickle(zp_data_from_cache)
-        block_structure = BlockStructureModulestoreData(root_block_usage_key)
-        block_structure._block_relations = block_relations
-        block_structure._transformer_data = transformer_data
-        block_structure._block_data_map = block_data_map
+        block_structure = self.deserialize(root_block_usage_key, serialized_data)
+        version = data_from_cache.get(version_cache_key)
+        if self._local_cache and block_structure is not None and version:
+            self._local_cache.set(version, block_structure, len(serialized_data))
+        return block_structure
+
+    @classmethod
+    def serialize(cls, block_structure):
+        """
+        Returns a serialization of the given block structure.
+
+        The serialization is a pickled header with the format version
+        and a map of separately compressed and pickled sections: the
+        block relations, the transformer data, the blocks' xBlock
+        fields and the blocks' data of each transformer.  This allows
+        the sections with block data to be decoded only when they are
+        first accessed.
+
+        Arguments:
+            block_structure (BlockStructure) - The block structure
+                that is to be serialized.
+        """
+        block_structure._load_block_data()
+
+        xblock_fields = {}
+        transformer_block_data = defaultdict(dict)
+        for usage_key in block_structure._block_data_map:
+            block_data = block_structure._block_data_map[usage_key]
+            if block_data.xblock_fields:
+                xblock_fields[usage_key] = block_data.xblock_fields
+            for transformer_name, transformer_data in block_data.transformer_data.iteritems():
+                transformer_block_data[transformer_name][usage_key] = transformer_data
+
+        return pickle.dumps(
+            {
+                'version': SERIALIZATION_VERSION,
+                'block_relations': zpickle(block_structure._block_relations),
+                'transformer_data': zpickle(block_structure._transformer_data),
+                'xblock_fields': zpickle(xblock_fields),
+                'transformer_block_data': {
+                    transformer_name: zpickle(block_data)
+                    for transformer_name, block_data in transformer_block_data.iteritems()
+                },
+            },
+            pickle.HIGHEST_PROTOCOL,
+        )
+
+    @classmethod
+    def deserialize(cls, root_block_usage_key, serialized_data):
+        """
+        Returns the block structure starting at root_block_usage_key
+        from the given serialization, or None if it was serialized in
+        a different format version.
+
+        The blocks' xBlock fields and transformer data are decoded
+        lazily, when first accessed.
+
+        Arguments:
+            root_block_usage_key (UsageKey) - The usage_key for the root
+                of the serialized block structure.
+
+            serialized_data (str) - Data returned by serialize.
+        """
+        header = pickle.loads(serialized_data)
+        if header.get('version') != SERIALIZATION_VERSION:
+            logger.warning(
+                "Ignoring BlockStructure %r serialized with unsupported version %r.",
+                root_block_usage_key,
+                header.get('version'),
+            )
+            return None
 
+        block_structure = BlockStructureModulestoreData(root_block_usage_key)
+        block_structure._block_relations = zunpickle(header['block_relations'])
+        block_structure._transformer_data = zunpickle(header['transformer_data'])
+        block_structure._unloaded_xblock_fields = partial(zunpickle, header['xblock_fields'])
+        block_structure._unloaded_transformer_block_data = {
+            transformer_name: partial(zunpickle, block_data)
+            for transformer_name, block_data in header['transformer_block_data'].iteritems()
+        }
         return block_structure
 
     def delete(self, root_block_usage_key):
@@ -108,7 +299,12 @@ class BlockStructureCache(object):
                 of the block structure that is to be removed from
                 the cache.
         """
-        self._cache.delete(self._encode_root_cache_key(root_block_usage_key))
+        self._cache.delete_many([
+            self._encode_root_cache_key(root_block_usage_key),
+            self._encode_version_cache_key(root_block_usage_key),
+        ])
+        if self._local_cache:
+            self._local_cache.delete(root_block_usage_key)
         logger.debug(
             "Deleted BlockStructure %r from the cache.",
             root_block_usage_key,
@@ -120,4 +316,12 @@ class BlockStructureCache(object):
         Returns the cache key to use for storing the block structure
         for the given root_block_usage_key.
         """
-        return "root.key." + unicode(root_block_usage_key)
+        return u"root.key.v{}.{}".format(SERIALIZATION_VERSION, unicode(root_block_usage_key))
+
+    @classmethod
+    def _encode_version_cache_key(cls, root_block_usage_key):
+        """
+        Returns the cache key to use for storing the version of the
+        block structure for the given root_block_usage_key.
+        """
+        return u"root.version." + unicode(root_block_usage_key)
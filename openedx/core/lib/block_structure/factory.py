@@ -1,6 +1,8 @@
 """
 Module for factory class for BlockStructure objects.
 """
+from openedx.core.lib.graph_traversals import traverse_pre_order
+
 from .block_structure import BlockStructureModulestoreData
 
 
@@ -8,6 +10,10 @@ class BlockStructureFactory(object):
     """
     Factory class for BlockStructure objects.
     """
+    # Names of the xBlock fields that are collected for each block to
+    # find the blocks that changed since the structure was collected.
+    EDIT_INFO_FIELDS = ('edited_on', 'subtree_edited_on')
+
     @classmethod
     def create_from_modulestore(cls, root_block_usage_key, modulestore):
         """
@@ -32,30 +38,138 @@ class BlockStructureFactory(object):
                 root_block_usage_key is not found in the modulestore.
         """
         block_structure = BlockStructureModulestoreData(root_block_usage_key)
+        root_xblock = modulestore.get_item(root_block_usage_key, depth=None)
+        cls._add_subtree(block_structure, root_xblock, set())
+        return block_structure
+
+    @classmethod
+    def create_subtrees_from_modulestore(cls, block_structure, subtree_root_keys, modulestore):
+        """
+        Creates and returns a block structure from the modulestore with
+        the subtrees starting at the given subtree_root_keys, along with
+        all of their ancestors in the given block structure.  The
+        ancestors are connected only to the blocks leading to the
+        subtrees.
+
+        Collecting the returned structure yields the same data for the
+        subtrees as collecting the entire structure would, since the
+        data that transformers collect for a block depends only on the
+        block and its ancestors.
+
+        Arguments:
+            block_structure (BlockStructure) - The block structure in
+                which the ancestors of the subtrees are looked up.
+
+            subtree_root_keys ([UsageKey]) - The usage keys of the roots
+                of the subtrees to create.
+
+            modulestore (ModuleStoreRead) - The modulestore that
+                contains the data for the xBlocks.
+
+        Returns:
+            BlockStructureModulestoreData - The created block structure,
+                starting at the root of the given block structure.
+        """
+        subtree_structure = BlockStructureModulestoreData(block_structure.root_block_usage_key)
         blocks_visited = set()
+        for subtree_root_key in subtree_root_keys:
+            subtree_root_xblock = modulestore.get_item(subtree_root_key, depth=None)
+            cls._add_subtree(subtree_structure, subtree_root_xblock, blocks_visited)
+
+        # Add the ancestors of the subtrees, linked only to the blocks
+        # that lead to the subtrees.
+        blocks_to_link = list(subtree_root_keys)
+        while blocks_to_link:
+            block_key = blocks_to_link.pop()
+            for parent_key in block_structure.get_parents(block_key):
+                subtree_structure._add_relation(parent_key, block_key)  # pylint: disable=protected-access
+                if parent_key not in blocks_visited:
+                    blocks_visited.add(parent_key)
+                    subtree_structure._add_xblock(  # pylint: disable=protected-access
+                        parent_key, modulestore.get_item(parent_key, depth=0)
+                    )
+                    blocks_to_link.append(parent_key)
+        return subtree_structure
 
-        def build_block_structure(xblock):
-            """
-            Recursively update the block structure with the given xBlock
-            and its descendants.
-            """
-            # Check if the xblock was already visited (can happen in
-            # DAGs).
-            if xblock.location in blocks_visited:
-                return
-
-            # Add the xBlock.
-            blocks_visited.add(xblock.location)
-            block_structure._add_xblock(xblock.location, xblock)  # pylint: disable=protected-access
-
-            # Add relations with its children and recurse.
-            for child in xblock.get_children():
-                block_structure._add_relation(xblock.location, child.location)  # pylint: disable=protected-access
-                build_block_structure(child)
+    @classmethod
+    def find_changed_subtrees(cls, block_structure, modulestore):
+        """
+        Returns the usage keys of the roots of the smallest subtrees of
+        the given collected block structure that contain all changes
+        made in the modulestore since the structure was collected, or
+        None if they cannot be determined.
+
+        Changes are found by comparing the EDIT_INFO_FIELDS collected
+        for the blocks with their current values, descending only into
+        the blocks whose subtrees were edited.  A block whose own
+        content, settings or children were edited is the root of a
+        changed subtree, since its edits may be inherited by all of its
+        descendants.
 
-        root_xblock = modulestore.get_item(root_block_usage_key, depth=None)
-        build_block_structure(root_xblock)
-        return block_structure
+        Arguments:
+            block_structure (BlockStructureBlockData) - A block structure
+                collected with the EDIT_INFO_FIELDS.
+
+            modulestore (ModuleStoreRead) - The modulestore that
+                contains the current data for the xBlocks.
+        """
+        changed_subtree_root_keys = []
+        xblocks_to_check = [modulestore.get_item(block_structure.root_block_usage_key, depth=0)]
+        while xblocks_to_check:
+            xblock = xblocks_to_check.pop()
+            subtree_edited_on = getattr(xblock, 'subtree_edited_on', None)
+            if subtree_edited_on is None:
+                return None
+            if subtree_edited_on == block_structure.get_xblock_field(xblock.location, 'subtree_edited_on'):
+                continue
+
+            children = xblock.get_children()
+            edited_on = block_structure.get_xblock_field(xblock.location, 'edited_on')
+            if (
+                    getattr(xblock, 'edited_on', None) != edited_on or
+                    [child.location for child in children] != block_structure.get_children(xblock.location)
+            ):
+                if cls._has_multiple_parents(block_structure, xblock.location):
+                    # Blocks in a DAG may have ancestors outside of the
+                    # subtree's ancestors, so the changes cannot be
+                    # recollected separately.
+                    return None
+                changed_subtree_root_keys.append(xblock.location)
+            else:
+                xblocks_to_check.extend(children)
+        return changed_subtree_root_keys
+
+    @classmethod
+    def _has_multiple_parents(cls, block_structure, subtree_root_key):
+        """
+        Returns whether any of the descendants of the given block in the
+        given block structure has more than one parent.
+        """
+        return any(
+            len(block_structure.get_parents(block_key)) > 1
+            for block_key in traverse_pre_order(subtree_root_key, block_structure.get_children)
+            if block_key != subtree_root_key
+        )
+
+    @classmethod
+    def _add_subtree(cls, block_structure, xblock, blocks_visited):
+        """
+        Recursively updates the given block structure with the given
+        xBlock and its descendants.
+        """
+        # Check if the xblock was already visited (can happen in
+        # DAGs).
+        if xblock.location in blocks_visited:
+            return
+
+        # Add the xBlock.
+        blocks_visited.add(xblock.location)
+        block_structure._add_xblock(xblock.location, xblock)  # pylint: disable=protected-access
+
+        # Add relations with its children and recurse.
+        for child in xblock.get_children():
+            block_structure._add_relation(xblock.location, child.location)  # pylint: disable=protected-access
+            cls._add_subtree(block_structure, child, blocks_visited)
 
     @classmethod
     def create_from_cache(cls, root_block_usage_key, block_structure_cache):
@@ -2,18 +2,25 @@
 Top-level module for the Block Structure framework with a class for managing
 BlockStructures.
 """
+from logging import getLogger
+
+from openedx.core.lib.graph_traversals import traverse_pre_order
+
 from .cache import BlockStructureCache
 from .factory import BlockStructureFactory
 from .exceptions import UsageKeyNotInBlockStructure
 from .transformers import BlockStructureTransformers
 
 
+logger = getLogger(__name__)  # pylint: disable=invalid-name
+
+
 class BlockStructureManager(object):
     """
     Top-level class for managing Block Structures.
     """
 
-    def __init__(self, root_block_usage_key, modulestore, cache):
+    def __init__(self, root_block_usage_key, modulestore, cache, compact=False, local_cache=None):
         """
         Arguments:
             root_block_usage_key (UsageKey) - The usage_key for the root
@@ -26,10 +33,18 @@ class BlockStructureManager(object):
             cache (django.core.cache.backends.base.BaseCache) - The
                 cache to use for storing/retrieving the block structure's
                 collected data.
+
+            compact (bool) - Whether newly collected block structures
+                are compacted (see BlockStructure.compact) before they
+                are cached.
+
+            local_cache (BlockStructureLocalCache) - Optional in-process
+                cache to use in front of the given cache.
         """
         self.root_block_usage_key = root_block_usage_key
         self.modulestore = modulestore
-        self.block_structure_cache = BlockStructureCache(cache)
+        self.block_structure_cache = BlockStructureCache(cache, local_cache)
+        self.compact = compact
 
     def get_transformed(self, transformers, starting_block_usage_key=None):
         """
@@ -81,27 +96,62 @@ class BlockStructureManager(object):
                 starting at root_block_usage_key, with collected data
                 from each registered transformer.
         """
-        block_structure = BlockStructureFactory.create_from_cache(
-            self.root_block_usage_key,
-            self.block_structure_cache
-        )
-        cache_miss = block_structure is None
-        if cache_miss or BlockStructureTransformers.is_collected_outdated(block_structure):
+        block_structure = self.get_collected_if_cached()
+        if block_structure is None:
             block_structure = BlockStructureFactory.create_from_modulestore(
                 self.root_block_usage_key,
                 self.modulestore
             )
-            BlockStructureTransformers.collect(block_structure)
-            self.block_structure_cache.add(block_structure)
+            self._collect(block_structure)
+            self._add_to_cache(block_structure)
+        return block_structure
+
+    def get_collected_if_cached(self):
+        """
+        Returns the collected Block Structure for the root_block_usage_key
+        if an up-to-date one is in the cache, without accessing the
+        modulestore otherwise.
+
+        Returns:
+            BlockStructureBlockData - A collected block structure,
+                starting at root_block_usage_key, with collected data
+                from each registered transformer.
+
+            NoneType - If the block structure is not in the cache or
+                its collected data is outdated.
+        """
+        block_structure = BlockStructureFactory.create_from_cache(
+            self.root_block_usage_key,
+            self.block_structure_cache
+        )
+        if block_structure is None or BlockStructureTransformers.is_collected_outdated(block_structure):
+            return None
         return block_structure
 
-    def update_collected(self):
+    def update_collected(self, incremental=False):
         """
         Updates the collected Block Structure for the root_block_usage_key.
 
         Details: The cache is cleared and updated by collecting transformers
         data from the modulestore.
+
+        Arguments:
+            incremental (bool) - If True and an up-to-date block
+                structure is in the cache, only the subtrees that
+                changed in the modulestore since it was collected are
+                recollected and updated in the cached structure.
         """
+        if incremental:
+            try:
+                if self._update_collected_incrementally():
+                    return
+            except Exception:  # pylint: disable=broad-except
+                # Recollect in full rather than keep serving the
+                # outdated structure.
+                logger.exception(
+                    "Failed to incrementally update the collected BlockStructure %s.",
+                    self.root_block_usage_key,
+                )
         self.clear()
         self.get_collected()
 
@@ -111,3 +161,75 @@ class BlockStructureManager(object):
         root block key.
         """
         self.block_structure_cache.delete(self.root_block_usage_key)
+
+    def _update_collected_incrementally(self):
+        """
+        Recollects the changed subtrees of the cached Block Structure for
+        the root_block_usage_key and updates the cache with the result.
+
+        Returns:
+            bool - Whether the cached block structure was updated, as
+                opposed to it not being found, being outdated or having
+                changes that cannot be recollected separately.
+        """
+        if not BlockStructureTransformers.supports_incremental_collect():
+            return False
+
+        block_structure = self.get_collected_if_cached()
+        if block_structure is None:
+            return False
+
+        changed_subtree_root_keys = BlockStructureFactory.find_changed_subtrees(block_structure, self.modulestore)
+        if changed_subtree_root_keys is None or self.root_block_usage_key in changed_subtree_root_keys:
+            return False
+        if not changed_subtree_root_keys:
+            return True
+        if self._has_excluded_ancestor(block_structure, changed_subtree_root_keys):
+            return False
+
+        subtree_structure = BlockStructureFactory.create_subtrees_from_modulestore(
+            block_structure,
+            changed_subtree_root_keys,
+            self.modulestore,
+        )
+        self._collect(subtree_structure)
+        block_structure._update_subtrees(  # pylint: disable=protected-access
+            subtree_structure,
+            changed_subtree_root_keys,
+        )
+        self._add_to_cache(block_structure)
+        return True
+
+    def _has_excluded_ancestor(self, block_structure, subtree_root_keys):
+        """
+        Returns whether any ancestor of the given subtree roots in the
+        given block structure is of a type whose children cannot be
+        recollected separately (see
+        BlockStructureTransformer.INCREMENTAL_COLLECT_EXCLUDED_TYPES).
+        """
+        excluded_types = BlockStructureTransformers.get_incremental_collect_excluded_types()
+        if not excluded_types:
+            return False
+        return any(
+            block_key.block_type in excluded_types
+            for subtree_root_key in subtree_root_keys
+            for block_key in traverse_pre_order(subtree_root_key, block_structure.get_parents)
+            if block_key != subtree_root_key
+        )
+
+    def _collect(self, block_structure):
+        """
+        Collects the data of the registered transformers for the given
+        block structure, along with the data needed to later find its
+        changed blocks.
+        """
+        block_structure.request_xblock_fields(*BlockStructureFactory.EDIT_INFO_FIELDS)
+        BlockStructureTransformers.collect(block_structure)
+
+    def _add_to_cache(self, block_structure):
+        """
+        Stores the given collected block structure in the cache.
+        """
+        if self.compact:
+            block_structure.compact()
+        self.block_structure_cache.add(block_structure)
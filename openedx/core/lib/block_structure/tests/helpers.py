@@ -99,6 +99,28 @@ class MockCache(object):
         """
         del self.map[key]
 
+    def set_many(self, data):
+        """
+        Associates each of the keys in the given dict with its value
+        in the cache.
+        """
+        self.set_call_count += 1
+        self.map.update(data)
+
+    def get_many(self, keys):
+        """
+        Returns a dict of the given keys found in the cache and their
+        values.
+        """
+        return {key: self.map[key] for key in keys if key in self.map}
+
+    def delete_many(self, keys):
+        """
+        Deletes the given keys from the cache.
+        """
+        for key in keys:
+            self.map.pop(key, None)
+
 
 class MockModulestoreFactory(object):
     """
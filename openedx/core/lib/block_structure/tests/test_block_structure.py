@@ -6,6 +6,7 @@ from collections import namedtuple
 from copy import deepcopy
 import ddt
 import itertools
+import pickle
 from unittest import TestCase
 
 from openedx.core.lib.graph_traversals import traverse_post_order
@@ -216,3 +217,56 @@ class TestBlockStructureData(TestCase, ChildrenMapTestMixin):
         block_structure = self.create_block_structure(ChildrenMapTestMixin.LINEAR_CHILDREN_MAP)
         block_structure.remove_block_if(lambda block: block == 2)
         self.assert_block_structure(block_structure, [[1], [], [], []], missing_blocks=[2])
+
+
+@ddt.ddt
+class TestCompactBlockStructure(TestCase, ChildrenMapTestMixin):
+    """
+    Tests for compacted block structures
+    """
+    def create_compacted_structure(self, children_map):
+        """
+        Returns a compacted block structure for the given children_map,
+        with xBlock and transformer data set for each block, after a
+        round trip through pickle.
+        """
+        block_structure = self.create_block_structure(children_map, BlockStructureModulestoreData)
+        for block in range(len(children_map)):
+            block_structure._block_data_map[block].xblock_fields["field"] = block
+            if block % 2:
+                block_structure.set_transformer_block_field(block, MockTransformer, "key", str(block))
+        block_structure.compact()
+        return pickle.loads(pickle.dumps(block_structure, pickle.HIGHEST_PROTOCOL))
+
+    @ddt.data(
+        ChildrenMapTestMixin.SIMPLE_CHILDREN_MAP,
+        ChildrenMapTestMixin.LINEAR_CHILDREN_MAP,
+        ChildrenMapTestMixin.DAG_CHILDREN_MAP,
+    )
+    def test_relations_and_data(self, children_map):
+        block_structure = self.create_compacted_structure(children_map)
+        self.assert_block_structure(block_structure, children_map)
+        for block in range(len(children_map)):
+            self.assertEquals(block_structure.get_xblock_field(block, "field"), block)
+            self.assertEquals(
+                block_structure.get_transformer_block_field(block, MockTransformer, "key"),
+                str(block) if block % 2 else None,
+            )
+        self.assertIsNone(block_structure.get_xblock_field(len(children_map), "field"))
+
+    @ddt.data(True, False)
+    def test_remove_block(self, keep_descendants):
+        block_structure = self.create_compacted_structure(ChildrenMapTestMixin.DAG_CHILDREN_MAP)
+        block_structure.remove_block(3, keep_descendants)
+        block_structure.remove_transformer_block_field(1, MockTransformer, "key")
+        expected_children_map = [[1, 2], [5, 6], [4, 5, 6], [], [], [], []]
+        if not keep_descendants:
+            expected_children_map[1] = []
+            expected_children_map[2] = [4]
+
+        # The modifications are kept when the structure is pickled.
+        for structure in (block_structure, pickle.loads(pickle.dumps(block_structure, pickle.HIGHEST_PROTOCOL))):
+            self.assert_block_structure(structure, expected_children_map, missing_blocks=[3])
+            self.assertIsNone(structure.get_xblock_field(3, "field"))
+            self.assertIsNone(structure.get_transformer_block_field(1, MockTransformer, "key"))
+            self.assertEquals(len(list(structure.get_block_keys())), 6)
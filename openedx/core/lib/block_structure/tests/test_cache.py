@@ -1,9 +1,12 @@
 """
 Tests for block_structure/cache.py
 """
+# pylint: disable=protected-access
+import cPickle as pickle
 from unittest import TestCase
 
-from ..cache import BlockStructureCache
+from ..block_structure import _CompactBlockRelations
+from ..cache import BlockStructureCache, BlockStructureLocalCache, SERIALIZATION_VERSION
 from .helpers import ChildrenMapTestMixin, MockCache, MockTransformer
 
 
@@ -47,3 +50,97 @@ class TestBlockStructureCache(ChildrenMapTestMixin, TestCase):
         self.assertIsNone(
             self.cache.get(self.block_structure.root_block_usage_key)
         )
+
+    def test_lazy_block_data(self):
+        self.add_transformers()
+        self.cache.add(self.block_structure)
+        cached_value = self.cache.get(self.block_structure.root_block_usage_key)
+
+        # Block data is not decoded until it is accessed.
+        self.assertEquals(cached_value._unloaded_transformer_block_data.keys(), [MockTransformer.name()])
+        self.assertEquals(
+            cached_value.get_transformer_block_field(0, MockTransformer, 'test'),
+            '{} val'.format(MockTransformer.name()),
+        )
+        self.assertEquals(cached_value._unloaded_transformer_block_data, {})
+
+    def test_unsupported_version(self):
+        serialized_data = pickle.dumps({'version': SERIALIZATION_VERSION + 1})
+        self.assertIsNone(
+            BlockStructureCache.deserialize(self.block_structure.root_block_usage_key, serialized_data)
+        )
+
+
+class TestBlockStructureLocalCache(ChildrenMapTestMixin, TestCase):
+    """
+    Tests for BlockStructureCache with a BlockStructureLocalCache
+    """
+    def setUp(self):
+        super(TestBlockStructureLocalCache, self).setUp()
+        self.children_map = self.SIMPLE_CHILDREN_MAP
+        self.block_structure = self.create_block_structure(self.children_map)
+        self.block_structure.set_transformer_block_field(0, MockTransformer, 'test', 'val')
+        self.mock_cache = MockCache()
+        self.local_cache = BlockStructureLocalCache(max_size=10 ** 6)
+        self.cache = BlockStructureCache(self.mock_cache, self.local_cache)
+
+    def get_without_cache_backend(self):
+        """
+        Returns the block structure from the cache while failing any
+        read of its serialized data from the cache backend.
+        """
+        self.mock_cache.get_many = None
+        try:
+            return self.cache.get(self.block_structure.root_block_usage_key)
+        finally:
+            del self.mock_cache.get_many
+
+    def test_local_hit(self):
+        self.cache.add(self.block_structure)
+        cached_value = self.get_without_cache_backend()
+        self.assert_block_structure(cached_value, self.children_map)
+        self.assertEquals(cached_value.get_transformer_block_field(0, MockTransformer, 'test'), 'val')
+
+    def test_local_copies(self):
+        self.cache.add(self.block_structure)
+        cached_value = self.get_without_cache_backend()
+        cached_value.remove_block(1, keep_descendants=False)
+        cached_value.set_transformer_block_field(0, MockTransformer, 'test', 'changed')
+
+        cached_value = self.get_without_cache_backend()
+        self.assert_block_structure(cached_value, self.children_map)
+        self.assertEquals(cached_value.get_transformer_block_field(0, MockTransformer, 'test'), 'val')
+
+    def test_local_copies_collected_values(self):
+        self.block_structure.set_transformer_block_field(0, MockTransformer, 'list', [1])
+        self.cache.add(self.block_structure)
+        self.assertNotIsInstance(self.block_structure._block_relations, _CompactBlockRelations)
+        self.block_structure.get_transformer_block_field(0, MockTransformer, 'list').append(2)
+
+        self.get_without_cache_backend().get_transformer_block_field(0, MockTransformer, 'list').append(3)
+        cached_value = self.get_without_cache_backend()
+        self.assertEquals(cached_value.get_transformer_block_field(0, MockTransformer, 'list'), [1])
+
+    def test_local_miss_after_new_version(self):
+        self.cache.add(self.block_structure)
+        # Another process stores a new version of the structure.
+        other_block_structure = self.create_block_structure([[1], []])
+        BlockStructureCache(self.mock_cache).add(other_block_structure)
+
+        cached_value = self.cache.get(self.block_structure.root_block_usage_key)
+        self.assert_block_structure(cached_value, [[1], []])
+        self.assert_block_structure(self.get_without_cache_backend(), [[1], []])
+
+    def test_local_miss_after_delete(self):
+        self.cache.add(self.block_structure)
+        self.cache.delete(self.block_structure.root_block_usage_key)
+        self.assertIsNone(self.local_cache.get(self.block_structure.root_block_usage_key, None))
+        self.assertIsNone(self.cache.get(self.block_structure.root_block_usage_key))
+
+    def test_eviction(self):
+        self.local_cache.set('v1', self.block_structure, size=600000)
+        other_block_structure = self.create_block_structure([[1], []])
+        other_block_structure.root_block_usage_key = 1
+        self.local_cache.set('v1', other_block_structure, size=600000)
+        self.assertIsNone(self.local_cache.get(self.block_structure.root_block_usage_key, 'v1'))
+        self.assertIsNotNone(self.local_cache.get(1, 'v1'))
@@ -3,11 +3,16 @@ Tests for manager.py
 """
 from unittest import TestCase
 
+from mock import patch
+
+from openedx.core.lib.graph_traversals import traverse_post_order
+
 from ..exceptions import UsageKeyNotInBlockStructure
+from ..factory import BlockStructureFactory
 from ..manager import BlockStructureManager
 from ..transformers import BlockStructureTransformers
 from .helpers import (
-    MockModulestoreFactory, MockCache, MockTransformer, ChildrenMapTestMixin, mock_registered_transformers
+    MockModulestoreFactory, MockCache, MockTransformer, MockXBlock, ChildrenMapTestMixin, mock_registered_transformers
 )
 
 
@@ -16,9 +21,12 @@ class TestTransformer1(MockTransformer):
     Test Transformer class with basic functionality to verify collected and
     transformed data.
     """
+    SUPPORTS_INCREMENTAL_COLLECT = True
+
     collect_data_key = 't1.collect'
     transform_data_key = 't1.transform'
     collect_call_count = 0
+    collected_block_keys = None
 
     @classmethod
     def collect(cls, block_structure):
@@ -27,6 +35,7 @@ class TestTransformer1(MockTransformer):
         """
         cls._set_block_values(block_structure, cls.collect_data_key)
         cls.collect_call_count += 1
+        cls.collected_block_keys = set(block_structure.get_block_keys())
 
     def transform(self, usage_info, block_structure):
         """
@@ -146,14 +155,119 @@ class TestBlockStructureManager(TestCase, ChildrenMapTestMixin):
         self.collect_and_verify(expect_modulestore_called=False, expect_cache_updated=False)
         self.assertEquals(TestTransformer1.collect_call_count, 1)
 
+    def test_get_collected_compact(self):
+        self.bs_manager.compact = True
+        self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
+        self.collect_and_verify(expect_modulestore_called=False, expect_cache_updated=False)
+        self.assertEquals(TestTransformer1.collect_call_count, 1)
+
     def test_get_collected_outdated_data(self):
         self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
         TestTransformer1.VERSION += 1
         self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
         self.assertEquals(TestTransformer1.collect_call_count, 2)
 
+    def test_get_collected_if_cached(self):
+        with mock_registered_transformers(self.registered_transformers):
+            self.assertIsNone(self.bs_manager.get_collected_if_cached())
+        self.assertEquals(TestTransformer1.collect_call_count, 0)
+
+        self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
+        self.modulestore.get_items_call_count = 0
+        with mock_registered_transformers(self.registered_transformers):
+            block_structure = self.bs_manager.get_collected_if_cached()
+        self.assert_block_structure(block_structure, self.children_map)
+        self.assertEquals(self.modulestore.get_items_call_count, 0)
+
+        TestTransformer1.VERSION += 1
+        with mock_registered_transformers(self.registered_transformers):
+            self.assertIsNone(self.bs_manager.get_collected_if_cached())
+
     def test_clear(self):
         self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
         self.bs_manager.clear()
         self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
         self.assertEquals(TestTransformer1.collect_call_count, 2)
+
+    def set_edit_info(self, edited_blocks, edited_on):
+        """
+        Sets the edit info fields of the blocks in the mock modulestore,
+        marking the given blocks as edited on the given value.
+        """
+        blocks = self.modulestore.blocks
+        for block_key in traverse_post_order(0, lambda block_key: blocks[block_key].children):
+            field_map = blocks[block_key].field_map
+            if block_key in edited_blocks or 'edited_on' not in field_map:
+                field_map['edited_on'] = edited_on
+            field_map['subtree_edited_on'] = max(
+                [field_map['edited_on']] +
+                [blocks[child].field_map['subtree_edited_on'] for child in blocks[block_key].children]
+            )
+
+    def update_collected_incrementally(self):
+        """
+        Incrementally updates the collected block structure and returns it.
+        """
+        self.cache.set_call_count = 0
+        with mock_registered_transformers(self.registered_transformers):
+            self.bs_manager.update_collected(incremental=True)
+            return self.bs_manager.get_collected()
+
+    def test_update_collected_incrementally(self):
+        self.set_edit_info([], edited_on=1)
+        self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
+
+        # A leaf block is edited.
+        self.set_edit_info([3], edited_on=2)
+        block_structure = self.update_collected_incrementally()
+        self.assertEquals(self.cache.set_call_count, 1)
+        self.assertEquals(TestTransformer1.collect_call_count, 2)
+        self.assertEquals(TestTransformer1.collected_block_keys, {0, 1, 3})
+        self.assert_block_structure(block_structure, self.children_map)
+        TestTransformer1.assert_collected(block_structure)
+        self.assertEquals(block_structure.get_xblock_field(3, 'edited_on'), 2)
+        self.assertEquals(block_structure.get_xblock_field(0, 'subtree_edited_on'), 2)
+
+        # A block is added.
+        self.modulestore.blocks[5] = MockXBlock(5, modulestore=self.modulestore)
+        self.modulestore.blocks[1].children = [3, 4, 5]
+        self.set_edit_info([1, 5], edited_on=3)
+        block_structure = self.update_collected_incrementally()
+        self.assertEquals(TestTransformer1.collect_call_count, 3)
+        self.assert_block_structure(block_structure, [[1, 2], [3, 4, 5], [], [], [], []])
+        TestTransformer1.assert_collected(block_structure)
+
+    def test_update_collected_incrementally_unsupported(self):
+        self.set_edit_info([], edited_on=1)
+        self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
+        self.set_edit_info([3], edited_on=2)
+        with patch.object(TestTransformer1, 'SUPPORTS_INCREMENTAL_COLLECT', False):
+            block_structure = self.update_collected_incrementally()
+        self.assertEquals(TestTransformer1.collect_call_count, 2)
+        self.assertEquals(TestTransformer1.collected_block_keys, set(range(len(self.children_map))))
+        self.assertEquals(block_structure.get_xblock_field(3, 'edited_on'), 2)
+
+    def test_update_collected_incrementally_error(self):
+        self.set_edit_info([], edited_on=1)
+        self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
+        self.set_edit_info([3], edited_on=2)
+        with patch.object(BlockStructureFactory, 'find_changed_subtrees', side_effect=KeyError):
+            block_structure = self.update_collected_incrementally()
+        self.assertEquals(TestTransformer1.collect_call_count, 2)
+        self.assertEquals(TestTransformer1.collected_block_keys, set(range(len(self.children_map))))
+        self.assertEquals(block_structure.get_xblock_field(3, 'edited_on'), 2)
+
+    def test_update_collected_incrementally_unchanged(self):
+        self.set_edit_info([], edited_on=1)
+        self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
+        self.update_collected_incrementally()
+        self.assertEquals(self.cache.set_call_count, 0)
+        self.assertEquals(TestTransformer1.collect_call_count, 1)
+
+    def test_update_collected_incrementally_root_changed(self):
+        self.set_edit_info([], edited_on=1)
+        self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
+        self.set_edit_info([0], edited_on=2)
+        block_structure = self.update_collected_incrementally()
+        self.assertEquals(TestTransformer1.collect_call_count, 2)
+        self.assertEquals(block_structure.get_xblock_field(0, 'edited_on'), 2)
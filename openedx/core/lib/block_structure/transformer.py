@@ -28,6 +28,32 @@ class BlockStructureTransformer(object):
     #
     VERSION = 0
 
+    # Whether the transformer's data can be recollected for only the
+    # changed subtrees of a block structure (see
+    # BlockStructureManager.update_collected).  In that case, its collect
+    # method is called on a structure containing the changed subtrees
+    # and their ancestors, with each ancestor only linked to the
+    # children that lead to the subtrees.  The collected data of the
+    # subtrees' blocks replaces their previous data, while the data
+    # collected for the ancestors and the structure-wide data is merged
+    # into the previous data.
+    #
+    # Transformers should only set this to True if the data they
+    # collect for a block depends solely on the block and its ancestors,
+    # and if their structure-wide data does not depend on the blocks
+    # below the root.  Otherwise, any change to the structure is
+    # recollected in full.
+    #
+    SUPPORTS_INCREMENTAL_COLLECT = False
+
+    # The types of blocks for which the transformer's collect method
+    # reads all of their children, such as to set data on them.  Since
+    # the ancestors of changed subtrees are only linked to the children
+    # leading to the subtrees, changes below blocks of these types are
+    # recollected in full.
+    #
+    INCREMENTAL_COLLECT_EXCLUDED_TYPES = ()
+
     @classmethod
     def name(cls):
         """
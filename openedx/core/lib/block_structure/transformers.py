@@ -87,6 +87,29 @@ class BlockStructureTransformers(object):
         # Prune the block structure to remove any unreachable blocks.
         block_structure._prune_unreachable()  # pylint: disable=protected-access
 
+    @classmethod
+    def supports_incremental_collect(cls):
+        """
+        Returns whether the data of all registered transformers can be
+        recollected for only the changed subtrees of a block structure.
+        """
+        return all(
+            transformer.SUPPORTS_INCREMENTAL_COLLECT
+            for transformer in TransformerRegistry.get_registered_transformers()
+        )
+
+    @classmethod
+    def get_incremental_collect_excluded_types(cls):
+        """
+        Returns the types of blocks below which changes are not to be
+        recollected separately by any of the registered transformers.
+        """
+        return {
+            block_type
+            for transformer in TransformerRegistry.get_registered_transformers()
+            for block_type in transformer.INCREMENTAL_COLLECT_EXCLUDED_TYPES
+        }
+
     @classmethod
     def is_collected_outdated(cls, block_structure):
         """
@@ -3,6 +3,7 @@ Functions that can are used to modify XBlock fragments for use in the LMS and St
 """
 
 import datetime
+import hashlib
 import json
 import logging
 import markupsafe
@@ -23,7 +24,7 @@ from xblock.fragment import Fragment
 
 from xmodule.seq_module import SequenceModule
 from xmodule.vertical_block import VerticalBlock
-from xmodule.x_module import shim_xmodule_js, XModuleDescriptor, XModule, PREVIEW_VIEWS, STUDIO_VIEW
+from xmodule.x_module import shim_xmodule_js, XModuleDescriptor, XModule, PREVIEW_VIEWS, STUDENT_VIEW, STUDIO_VIEW
 from xmodule.modulestore import ModuleStoreEnum
 from xmodule.modulestore.django import modulestore
 
@@ -185,6 +186,58 @@ def replace_static_urls(data_dir, block, view, frag, context, course_id=None, st
     ))
 
 
+class FragmentCache(object):
+    """
+    Caches the fragments rendered by a block whose views only depend on its content.
+
+    The fragments are cached after being passed through ``content_wrappers``, the wrappers
+    which only depend on the fragment content (such as `replace_course_urls` and
+    `replace_jump_to_id_urls`), so that a cached fragment only needs the other wrappers (such
+    as `wrap_xblock`, or `replace_static_urls`, whose urls depend on the locking of the assets)
+    to be applied to it when it's rendered again.
+    """
+    def __init__(self, cache, key_parts, content_wrappers, views=(STUDENT_VIEW,), timeout=None):
+        """
+        :param cache: The django cache to cache the fragments in
+        :param key_parts: A tuple of the values the rendering of the block depends on, such as
+            its usage key and the version of its content
+        :param content_wrappers: The wrappers to apply to the fragments before they're cached
+        :param views: The names of the views whose fragments are cached
+        :param timeout: The number of seconds the fragments are cached for
+        """
+        self.cache = cache
+        self.key_parts = key_parts
+        self.content_wrappers = content_wrappers
+        self.views = views
+        self.timeout = timeout
+
+    def cache_key(self, view):
+        """
+        Return the cache key of the fragment of ``view``.
+        """
+        key = u':'.join(unicode(part) for part in self.key_parts + (view,))
+        return u'xblock_fragment.{}'.format(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def get(self, view):
+        """
+        Return the cached fragment of ``view``, or None if it isn't cached.
+        """
+        if view not in self.views:
+            return None
+        return self.cache.get(self.cache_key(view))
+
+    def wrap(self, block, view, frag, context):
+        """
+        Apply the content wrappers to ``frag``, the fragment rendered by ``view`` of ``block``,
+        and cache the result if ``view`` is one of the cached views.
+        """
+        for wrapper in self.content_wrappers:
+            frag = wrapper(block, view, frag, context)
+        if view in self.views:
+            self.cache.set(self.cache_key(view), frag, self.timeout)
+        return frag
+
+
 def grade_histogram(module_id):
     '''
     Print out a histogram of grades on a given problem in staff member debug info.